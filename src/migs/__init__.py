@@ -1,3 +1,13 @@
 """migs - CLI tool for managing Google Cloud Managed Instance Groups"""
 
-__version__ = "0.1.8"
\ No newline at end of file
+__version__ = "0.1.8"
+
+__all__ = ["Client", "AsyncClient", "VM", "MIG", "UpRequest", "Pool", "Bake", "Job", "SyncResult", "RunResult", "NetworkCheck"]
+
+
+def __getattr__(name):
+    # Imported on first use so the daemon's stdlib-only fast path stays cheap
+    if name in __all__:
+        from migs import client
+        return getattr(client, name)
+    raise AttributeError(f"module 'migs' has no attribute '{name}'")
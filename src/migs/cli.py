@@ -1,19 +1,25 @@
 import os
-import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import click
 from rich.console import Console
 from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.live import Live
+from rich.progress import BarColumn, DownloadColumn, Progress, SpinnerColumn, TextColumn, TransferSpeedColumn
 
-from migs.gcloud import GCloudWrapper, AuthenticationError
-from migs.storage import VMStorage
-from migs.ssh_config import SSHConfigManager
+from migs.gcloud import AuthenticationError
+from migs.client import Client
+from migs.readiness import wait_for_node, wait_for_nodes
+from migs import daemon as migs_daemon
+from migs import jobqueue, metrics, netcheck, netpath, transfer
+from migs import telemetry
 
 console = Console()
-gcloud = GCloudWrapper()
-storage = VMStorage()
-ssh_manager = SSHConfigManager()
+client = Client()
+gcloud = client.gcloud
+storage = client.storage
+ssh_manager = client.ssh_config
 
 
 @click.group()
@@ -23,10 +29,12 @@ def cli():
 
 
 @cli.command(name='list')
-def list_migs():
-    """List all MIGs in the current project"""
+@click.option("--project", "-p", "projects", multiple=True, help="Project to list (repeatable, defaults to config projects or the active project)")
+def list_migs(projects):
+    """List all MIGs in the current project, or across several projects"""
     try:
-        migs = gcloud.list_migs()
+        multi_project = len(client.projects(projects)) > 1
+        migs = client.list_migs(projects)
         
         if not migs:
             console.print("[yellow]No MIGs found in the current project[/yellow]")
@@ -34,16 +42,19 @@ def list_migs():
         
         table = Table(title="Managed Instance Groups")
         table.add_column("Name", style="cyan")
+        if multi_project:
+            table.add_column("Project", style="magenta")
         table.add_column("Zone", style="green")
         table.add_column("Size", style="yellow")
         table.add_column("Target Size", style="yellow")
         
         for mig in migs:
             table.add_row(
-                mig["name"],
-                mig["zone"],
-                str(mig["size"]),
-                str(mig["targetSize"])
+                mig.name,
+                *([mig.project] if multi_project else []),
+                mig.zone,
+                str(mig.size),
+                str(mig.target_size)
             )
         
         console.print(table)
@@ -54,132 +65,455 @@ def list_migs():
 
 
 @cli.command()
-@click.argument("mig-name")
+@click.argument("mig-name", required=False)
+@click.option("--mig", "-m", "extra_migs", multiple=True, help="Candidate MIG to race for capacity (repeatable, e.g. one per zone)")
 @click.option("--name", "-n", help="Custom name for your VM(s). With count>1, creates name1, name2, etc.")
 @click.option("--count", "-c", default=1, type=int, help="Number of VMs to create (default: 1)")
 @click.option("--zone", "-z", help="Zone (will auto-detect if not specified)")
 @click.option("--duration", "-d", help="Time before auto-deletion (e.g., 30m, 2h, 1d)")
 @click.option("--stable", is_flag=True, help="Use stable API (no exact instance naming)")
-def up(mig_name, name, count, zone, duration, stable):
+@click.option("--upload", "upload_paths", multiple=True, help="Upload a file or directory to each VM as soon as it is reachable (repeatable)")
+@click.option("--run", "run_script_path", help="Run a script on all VMs once every node is staged")
+@click.option("--session", default=None, help="Tmux session name for --run (defaults to script name)")
+@click.option("--torchrun", is_flag=True, help="Set up torchrun environment variables for --run")
+@click.option("--wait-ssh", is_flag=True, help="Wait until every VM accepts SSH and print a readiness table")
+@click.option("--project", "-p", help="Project the MIG(s) live in (defaults to the active project)")
+@click.option("--no-pool", is_flag=True, help="Create new VMs even if a standby pool could serve the request")
+@click.option("--baked", is_flag=True, help="Provision from the current bake of the MIG(s) (see `migs bake`)")
+@click.option("--detach", is_flag=True, help="Submit the request and return; track it later with `migs wait`")
+@click.option("--path", "ssh_path", type=click.Choice(["auto"] + netpath.PATHS), help="Network path for the SSH config (default: fastest measured)")
+@click.option("--fastest", is_flag=True, help="Only ask the candidate MIG with the best recent median time to capacity, plus any not tried yet (see `migs stats`)")
+def up(mig_name, extra_migs, name, count, zone, duration, stable, upload_paths, run_script_path, session, torchrun, wait_ssh, project, no_pool, baked, detach, ssh_path, fastest):
     """Spin up one or more VMs in the specified MIG
-    
+
     By default, auto-detects if gcloud beta is available and uses it for exact
     instance names. Without --name, generates names as: mig-username-timestamp
     With --name and --count>1, creates: name1, name2, name3, etc.
-    
+
     Use --stable to force stable API with local name mapping.
+
+    Pass several equivalent MIGs (e.g. `migs up --mig a --mig b`) to submit
+    resize requests to all of them at once. The first MIG to provide all VMs
+    wins and the other requests are cancelled.
+
+    Use --upload and --run to pipeline provisioning: each node starts its
+    upload as soon as it accepts SSH, and the script is launched on all
+    nodes once every node is staged.
+
+    If the MIG has a standby pool (see `migs pool`) with enough VMs, they
+    are claimed instantly and the pool is refilled in the background.
+
+    Use --baked to boot nodes from a VM captured with `migs bake`, so they
+    start already set up.
+
+    Every request is journaled in ~/.migs until its VMs are tracked. With
+    --detach, `up` returns right after submitting, and `migs wait` picks the
+    request up later. Interrupted runs can be resumed the same way.
+
+    With --fastest, the candidate MIGs are ranked by how quickly they provided
+    capacity recently, and only the best one is asked, along with any that
+    have no history yet.
     """
+    state = {"request": None, "host_keys": {}}
     try:
-        if not zone:
-            zone = gcloud.get_mig_zone(mig_name)
-            if not zone:
-                console.print(f"[red]Could not find zone for MIG: {mig_name}[/red]")
+        if detach and (upload_paths or run_script_path or wait_ssh):
+            console.print("[red]--detach can't be combined with --upload, --run or --wait-ssh[/red]")
+            return
+
+        for path in upload_paths + ((run_script_path,) if run_script_path else ()):
+            if not os.path.exists(path):
+                console.print(f"[red]Local path '{path}' not found[/red]")
                 return
-        
-        # Get initial instances before creating resize request (for multi-node detection)
-        initial_instances = gcloud.list_instances(mig_name, zone)
-        initial_instance_names = {inst["name"] for inst in initial_instances}
-        
-        # Determine if we should use stable API
-        use_stable = stable
-        
-        # Generate instance names
-        instance_names = None
-        if name:
-            # User provided a name
-            if count > 1:
-                instance_names = [f"{name}{i}" for i in range(1, count + 1)]
+
+        if duration:
+            console.print(f"[yellow]VMs will auto-delete after: {duration}[/yellow]")
+
+        staging = {}
+        executor = ThreadPoolExecutor(max_workers=max(count, 1)) if upload_paths or run_script_path else None
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            tasks = {}
+            node_labels = []
+            node_tasks = []
+            pending_tasks = []
+
+            def add_node_tasks(labels):
+                # One progress line per node, so early nodes show up as ready while the rest boot
+                added = [progress.add_task(f"[yellow]{label}: waiting for VM creation...", total=None) for label in labels]
+                node_labels.extend(labels)
+                node_tasks.extend(added)
+                pending_tasks.extend(added)
+
+            def on_event(event, info):
+                if event == "baked":
+                    console.print(f"[cyan]Using baked MIG(s): {', '.join(info['migs'])}[/cyan]")
+                elif event == "claimed":
+                    console.print(f"[green]Claimed {len(info['vms'])} standby VM(s) from the {info['vms'][0].mig_name} pool, refilling it in the background[/green]")
+                    add_node_tasks([vm.display_name for vm in info["vms"]])
+                elif event == "fastest":
+                    if info["best"]:
+                        ranking = ", ".join(f"{mig} {p50:.0f}s" if p50 not in (None, float("inf")) else f"{mig} -" for mig, p50 in info["p50s"].items())
+                        console.print(f"[cyan]Fastest recent MIG: {info['best']} (median time to capacity: {ranking})[/cyan]")
+                    else:
+                        console.print("[yellow]No provisioning history for these MIGs yet, asking all of them[/yellow]")
+                elif event == "submitted":
+                    request = state["request"] = info["request"]
+                    for skipped_mig, error in request.skipped.items():
+                        console.print(f"[yellow]Skipping {skipped_mig}: {error}[/yellow]")
+                    if request.instance_names and request.used_beta:
+                        console.print(f"[cyan]Using gcloud beta - Instance names: {', '.join(request.instance_names)}[/cyan]")
+                    elif request.instance_names:
+                        if not stable:
+                            console.print(f"[yellow]Note: gcloud beta not available, try installing or avoid this messages with --stable[/yellow]")
+                        console.print(f"[cyan]Using stable API - VMs will be mapped to: {', '.join(request.instance_names)}[/cyan]")
+                    for candidate in request.candidates:
+                        console.print(f"[green]Resize request created: {candidate['request_id']} ({candidate['mig_name']}, {candidate['zone']})[/green]")
+                elif event == "racing":
+                    tasks["race"] = progress.add_task(f"[yellow]Racing {len(info['request'].candidates)} MIGs for {count} VM(s)...", total=None)
+                elif event == "race_tick" and "race" in tasks:
+                    progress.advance(tasks["race"])
+                elif event == "capacity":
+                    if "race" in tasks:
+                        progress.remove_task(tasks.pop("race"))
+                    request = info["request"]
+                    if request.instance_names and request.used_beta:
+                        add_node_tasks(list(request.instance_names))
+                    elif name and count > 1:
+                        add_node_tasks([f"{name}{i}" for i in range(1, count + 1)])
+                    else:
+                        add_node_tasks([name or f"VM {i}" for i in range(1, count + 1)])
+                elif event == "waiting":
+                    for task_id in pending_tasks:
+                        progress.advance(task_id)
+                elif event == "ssh_setup":
+                    # Host keys and network paths are set up while the upload pipelines finish
+                    tasks["ssh"] = progress.add_task(f"[yellow]Setting up SSH config for {len(info['vms'])} VM(s)...", total=None)
+                elif event == "ssh_ready":
+                    progress.remove_task(tasks.pop("ssh"))
+                    state["host_keys"] = info["host_keys"]
+
+            def on_ready(vm):
+                if vm.display_name in node_labels:
+                    task_id = node_tasks[node_labels.index(vm.display_name)]
+                else:
+                    task_id = pending_tasks[0]
+                progress.update(task_id, description=f"[green]✓ {vm.display_name}: ready ({vm.external_ip or 'no external IP'})")
+                pending_tasks.remove(task_id)
+                if executor:
+                    # Start staging this node while the others are still booting
+                    staging[vm.display_name] = executor.submit(_stage_node, vm, upload_paths, progress, task_id)
+
+            try:
+                ready = client.up(
+                    mig_name, count, name, zone, duration, stable, project, extra_migs,
+                    use_pool=not no_pool, baked=baked, ssh_path=ssh_path, fastest=fastest, detach=detach,
+                    progress_callback=on_event, on_ready=on_ready
+                )
+            except ValueError as e:
+                console.print(f"[red]{e}[/red]")
+                return
+
+            # All nodes are up, now wait for the per-node upload pipelines to finish
+            staged_vms = [vm_name for vm_name, future in staging.items() if future.result()]
+
+        if executor:
+            executor.shutdown()
+
+        request = state["request"]
+        # Standby VMs claimed from a pool are ready already, so there is nothing to detach from
+        if detach and request:
+            console.print(f"[cyan]Detached. Track it with: migs wait {request.id}[/cyan]")
+            return
+
+        missing_keys = sum(1 for found in state["host_keys"].values() if not found)
+        if missing_keys:
+            console.print(f"[yellow]Host keys unavailable for {missing_keys} VM(s) (guest attributes disabled?), ssh will ask to confirm them on first connect[/yellow]")
+
+        ready_vms = [vm.display_name for vm in ready]
+        if request and len(request.candidates) > 1:
+            console.print(f"[green]Capacity found in {request.winner['mig_name']} ({request.winner['zone']}), other requests cancelled[/green]")
+
+        if len(ready_vms) == 1:
+            console.print(f"[green]✓ VM '{ready_vms[0]}' is ready![/green]")
+            console.print(f"[cyan]SSH: migs ssh {ready_vms[0]}[/cyan]")
+        elif ready_vms:
+            console.print(f"[green]✓ {len(ready_vms)} VMs are ready![/green]")
+            if not request or (request.instance_names and request.used_beta):
+                console.print(f"[cyan]VMs created: {', '.join(ready_vms)}[/cyan]")
+                for vm_name in ready_vms:
+                    console.print(f"[cyan]SSH: migs ssh {vm_name}[/cyan]")
+            elif name:
+                console.print(f"[cyan]VMs: {name}1 - {name}{len(ready_vms)}[/cyan]")
+                console.print(f"[cyan]SSH: migs ssh {name}1 (or {name}2, {name}3, etc.)[/cyan]")
             else:
-                instance_names = [name]
+                for vm_name in ready_vms:
+                    console.print(f"[cyan]SSH: migs ssh {vm_name}[/cyan]")
         else:
-            # Generate default names: <mig_name>_<username>_<id>
-            import os
-            username = os.getenv("USER", "user")
-            timestamp = int(time.time())
-            if count > 1:
-                instance_names = [f"{mig_name}-{username}-{timestamp}-{i}" for i in range(1, count + 1)]
-            else:
-                instance_names = [f"{mig_name}-{username}-{timestamp}"]
+            console.print("[red]Failed to create VM(s)[/red]")
+
+        if wait_ssh and ready and not staging:
+            _wait_for_ssh_ready([vm.to_dict() for vm in ready], timeout=600)
+
+        if staging and len(staged_vms) < len(ready_vms):
+            failed = [vm_name for vm_name in ready_vms if vm_name not in staged_vms]
+            console.print(f"[red]Staging failed on: {', '.join(failed)}[/red]")
+        elif run_script_path and ready:
+            # torchrun needs the full node set, so launch only once every node is staged
+            env_file = ".env" if os.path.exists(".env") else None
+            _launch_script(ready, run_script_path, [], session, torchrun, env_file)
+            
+    except KeyboardInterrupt:
+        request = state["request"]
+        if request and client.get_request(request.id):
+            console.print(f"\n[yellow]Interrupted. The request is still running, resume with: migs wait {request.id}[/yellow]")
+        raise
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+def _stage_node(vm, upload_paths, progress, task_id) -> bool:
+    """Wait for SSH on a freshly created VM and upload files to it"""
+    progress.update(task_id, description=f"[yellow]{vm.display_name}: waiting for SSH...")
+    if wait_for_node(gcloud, vm.to_dict())["state"] != "ready":
+        progress.update(task_id, description=f"[red]✗ {vm.display_name}: SSH not reachable")
+        return False
+    
+    for path in upload_paths:
+        progress.update(task_id, description=f"[yellow]{vm.display_name}: uploading {path}...")
+        if not client.upload([vm], path)[vm.display_name]:
+            progress.update(task_id, description=f"[red]✗ {vm.display_name}: upload of {path} failed")
+            return False
+    
+    progress.update(task_id, description=f"[green]✓ {vm.display_name}: staged")
+    return True
+
+
+def _request_label(request):
+    migs = request.winner["mig_name"] if request.winner else ", ".join(candidate["mig_name"] for candidate in request.candidates)
+    return f"{request.id} ({migs}, {request.count} VM(s))"
+
+
+@cli.command()
+@click.argument("request-id", required=False)
+def wait(request_id):
+    """Resume tracking detached or interrupted `migs up` requests
+
+    Waits on one request, every request for a MIG, or with no argument every
+    request nobody else is waiting on, all at once. VMs are added to your VM
+    list and SSH config as they come up.
+    """
+    try:
+        pending = client.pending_requests()
+        if request_id:
+            requests = [r for r in pending if r.id == request_id or request_id in (c["mig_name"] for c in r.candidates)]
+        else:
+            requests = [r for r in pending if client.is_orphaned(r)]
+        if not requests:
+            console.print(f"[red]No pending request matches '{request_id}'[/red]" if request_id else "[green]No pending requests[/green]")
+            return
         
-        console.print(f"[cyan]Creating resize request for MIG: {mig_name} (count: {count})[/cyan]")
-        if duration:
-            console.print(f"[yellow]VMs will auto-delete after: {duration}[/yellow]")
+        results = {}
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            def track(request, task_id):
+                try:
+                    vms = client.wait(request, progress_callback=lambda: progress.advance(task_id))
+                    progress.update(task_id, description=f"[green]✓ {_request_label(request)}: {', '.join(vm.display_name for vm in vms)}")
+                    results[request.id] = vms
+                except Exception as e:
+                    progress.update(task_id, description=f"[red]✗ {_request_label(request)}: {e}")
+                    results[request.id] = e
+            
+            # Daemon threads, so Ctrl+C stops waiting right away; the journal keeps every request
+            threads = []
+            for request in requests:
+                task_id = progress.add_task(f"[yellow]{_request_label(request)}: waiting...", total=None)
+                thread = threading.Thread(target=track, args=(request, task_id), daemon=True)
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        
+        for result in results.values():
+            if isinstance(result, AuthenticationError):
+                raise result
+        succeeded = [vms for vms in results.values() if isinstance(vms, list)]
+        console.print(f"[green]✓ {sum(len(vms) for vms in succeeded)} VM(s) ready from {len(succeeded)}/{len(requests)} request(s)[/green]")
+            
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Stopped waiting. Requests stay journaled, run `migs wait` again to resume[/yellow]")
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+@cli.command()
+def status():
+    """Show pending `migs up` requests, finishing any that completed while detached"""
+    try:
+        recovered, dropped, errors = client.recover()
+        for vm in recovered:
+            console.print(f"[green]✓ Recovered {vm.display_name} ({vm.instance_name})[/green]")
+        for request in dropped:
+            console.print(f"[red]Dropped {_request_label(request)}: resize request failed or was cancelled[/red]")
+        for request_id, error in errors.items():
+            console.print(f"[yellow]Could not check request {request_id}: {error}[/yellow]")
         
-        request_id, used_beta = gcloud.create_resize_request(
-            mig_name, zone, count, 
-            run_duration=duration, 
-            instance_names=instance_names, 
-            force_mode="stable" if use_stable else None
+        pending = client.pending_requests()
+        if not pending:
+            console.print("[green]No pending requests[/green]")
+            return
+        
+        table = Table(title="Pending Requests")
+        table.add_column("Request", style="cyan")
+        table.add_column("MIG", style="yellow")
+        table.add_column("Count", style="yellow")
+        table.add_column("Name", style="green")
+        table.add_column("Mode", style="dim")
+        table.add_column("State")
+        table.add_column("Waiter", style="dim")
+        table.add_column("Submitted", style="blue")
+        for request in pending:
+            states = client.request_states(request)
+            table.add_row(
+                request.id,
+                ", ".join(states),
+                str(request.count),
+                request.name or "-",
+                "beta" if request.used_beta else "stable",
+                ", ".join(state or "UNKNOWN" for state in states.values()),
+                "detached" if client.is_orphaned(request) else f"pid {request.pid}",
+                request.submitted_at or "-"
+            )
+        console.print(table)
+        console.print("[cyan]Resume with: migs wait \\[request][/cyan]")
+            
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+def _format_seconds(seconds):
+    return _format_duration(int(seconds)) if seconds is not None else "-"
+
+
+@cli.command()
+@click.option("--by", "group_by", type=click.Choice(metrics.GROUPINGS), default="mig", show_default=True, help="Group attempts by MIG, zone, machine type or hour of day")
+@click.option("--days", type=float, help="Only include attempts from the last N days")
+def stats(group_by, days):
+    """Show how long provisioning took, from the history of every resize request
+
+    Capacity is the time from submitting a resize request until its last VM
+    was created; ready is until that VM was RUNNING, for requests someone
+    waited on from the start. Lost attempts were cancelled after another MIG
+    in a race won.
+    """
+    rows = client.provisioning_stats(group_by, days)
+    if not rows:
+        console.print("[yellow]No provisioning history yet. It is recorded by every `migs up` and pool fill[/yellow]")
+        return
+    
+    table = Table(title="Provisioning History")
+    table.add_column({"mig": "MIG (zone)", "zone": "Zone", "machine-type": "Machine Type", "hour": "Hour"}[group_by], style="cyan")
+    table.add_column("Attempts", style="magenta")
+    table.add_column("OK", style="green")
+    table.add_column("Failed", style="red")
+    table.add_column("Lost", style="dim")
+    table.add_column("Capacity p50", style="yellow")
+    table.add_column("p90", style="yellow")
+    table.add_column("max", style="yellow")
+    table.add_column("Ready p50", style="blue")
+    table.add_column("p90", style="blue")
+    
+    for row in rows:
+        table.add_row(
+            row["group"], str(row["attempts"]), str(row["succeeded"]), str(row["failed"]), str(row["lost"]),
+            _format_seconds(row["capacity_p50"]), _format_seconds(row["capacity_p90"]), _format_seconds(row["capacity_max"]),
+            _format_seconds(row["ready_p50"]), _format_seconds(row["ready_p90"])
         )
+    console.print(table)
+
+
+@cli.command()
+@click.argument("mig-name", required=False)
+@click.option("--size", "-s", type=int, help="Number of SSH-ready standby VMs to keep (0 removes the pool)")
+@click.option("--zone", "-z", help="Zone (will auto-detect if not specified)")
+@click.option("--project", "-p", help="Project the MIG lives in (defaults to the active project)")
+@click.option("--stable", is_flag=True, help="Use stable API (no exact instance naming)")
+@click.option("--refill", is_flag=True, hidden=True)
+def pool(mig_name, size, zone, project, stable, refill):
+    """Keep a pool of standby VMs that `migs up` claims instantly
+
+    `migs pool my-mig --size 2` provisions VMs until two SSH-ready standby
+    VMs are waiting, and `migs up my-mig` then hands them out without
+    waiting for a resize request. Without arguments, lists pools.
+    """
+    try:
+        if refill:
+            # Background top-up after a claim; another fill already running is fine
+            try:
+                filled = client.fill_pool(mig_name, zone=zone, project=project)
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} pool {mig_name}: {len(filled.standby)}/{filled.size} standby")
+            except RuntimeError as e:
+                print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {e}")
+            return
         
-        if instance_names and used_beta:
-            console.print(f"[cyan]Using gcloud beta - Instance names: {', '.join(instance_names)}[/cyan]")
-        elif instance_names and not used_beta:
-            if not use_stable:
-                console.print(f"[yellow]Note: gcloud beta not available, try installing or avoid this messages with --stable[/yellow]")
-            console.print(f"[cyan]Using stable API - VMs will be mapped to: {', '.join(instance_names)}[/cyan]")
+        if not mig_name:
+            pools = client.pools()
+            if not pools:
+                console.print("[yellow]No standby pools, create one with: migs pool <mig> --size K[/yellow]")
+                return
+            
+            table = Table(title="Standby Pools")
+            table.add_column("MIG", style="cyan")
+            table.add_column("Zone", style="green")
+            table.add_column("Project", style="magenta")
+            table.add_column("Standby", style="yellow")
+            table.add_column("VMs", style="dim")
+            for entry in pools:
+                table.add_row(entry.mig_name, entry.zone, entry.project or "-", f"{len(entry.standby)}/{entry.size}", ", ".join(entry.standby) or "-")
+            console.print(table)
+            return
         
-        console.print(f"[green]Resize request created: {request_id}[/green]")
+        if size is None or size < 0:
+            console.print("[red]Specify the pool size with --size (0 removes the pool)[/red]")
+            return
         
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
             console=console,
         ) as progress:
-            task = progress.add_task(f"[yellow]Waiting for {count} VM(s) creation...", total=None)
-            
-            vm_info = gcloud.wait_for_vm(mig_name, zone, request_id, expected_count=count, 
-                                          progress_callback=lambda: progress.advance(task),
-                                          initial_instance_names=initial_instance_names,
-                                          target_instance_names=instance_names)
-        
-        if vm_info:
-            # Handle single VM or multiple VMs
-            if isinstance(vm_info, list):
-                # Multiple VMs created
-                group_id = f"{mig_name}-{request_id}" if count > 1 else None
-                
-                for idx, vm in enumerate(vm_info, 1):
-                    # When using beta API with instance names, the VM already has the correct name
-                    # When using stable API, we need to map custom names
-                    if instance_names and used_beta:
-                        # VM name is already what we specified
-                        vm_name = vm["name"]
-                    elif name and count > 1:
-                        # Stable API: map to user's custom name with suffix
-                        vm_name = f"{name}{idx}"
-                    else:
-                        vm_name = name or vm["name"]
-                    
-                    storage.save_vm(vm["name"], mig_name, zone, custom_name=vm_name, group_id=group_id)
-                    ssh_manager.add_vm_to_config(vm, custom_name=vm_name)
-                
-                console.print(f"[green]✓ {len(vm_info)} VMs are ready![/green]")
-                if instance_names and used_beta:
-                    console.print(f"[cyan]VMs created: {', '.join([vm['name'] for vm in vm_info])}[/cyan]")
-                    for vm in vm_info:
-                        console.print(f"[cyan]SSH: migs ssh {vm['name']}[/cyan]")
-                elif name:
-                    console.print(f"[cyan]VMs: {name}1 - {name}{len(vm_info)}[/cyan]")
-                    console.print(f"[cyan]SSH: migs ssh {name}1 (or {name}2, {name}3, etc.)[/cyan]")
-                else:
-                    for vm in vm_info:
-                        console.print(f"[cyan]SSH: migs ssh {vm['name']}[/cyan]")
-            else:
-                # Single VM created (backward compatibility)
-                if instance_names and used_beta:
-                    vm_name = vm_info["name"]
-                else:
-                    vm_name = name or vm_info["name"]
-                    
-                storage.save_vm(vm_info["name"], mig_name, zone, custom_name=vm_name)
-                ssh_manager.add_vm_to_config(vm_info, custom_name=vm_name)
-                
-                console.print(f"[green]✓ VM '{vm_name}' is ready![/green]")
-                console.print(f"[cyan]SSH: migs ssh {vm_name}[/cyan]")
+            task = progress.add_task(f"[cyan]Filling {mig_name} pool to {size} standby VM(s)...", total=None)
+            filled = client.fill_pool(
+                mig_name, size, zone=zone, project=project, stable=stable,
+                on_ready=lambda instance_name: progress.console.print(f"[green]✓ {instance_name} is standing by[/green]")
+            )
+        
+        if size == 0:
+            console.print(f"[green]✓ Pool for {mig_name} removed[/green]")
         else:
-            console.print("[red]Failed to create VM(s)[/red]")
+            console.print(f"[green]✓ {len(filled.standby)}/{filled.size} standby VM(s) in the {mig_name} pool ({filled.zone})[/green]")
             
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
     except AuthenticationError as e:
         console.print(f"[red]Authentication required[/red]")
         console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
@@ -189,63 +523,123 @@ def up(mig_name, name, count, zone, duration, stable):
 
 
 @cli.command()
-@click.argument("vm-name")
+@click.argument("vm-name", required=False)
+@click.option("--template", "-t", "template_name", help="Name for the image and instance template")
+@click.option("--mig", "mig_name", help="Name for the new MIG (defaults to the template name)")
+@click.option("--use", "use_name", help="Make an earlier bake the current one for its source MIG")
+def bake(vm_name, template_name, mig_name, use_name):
+    """Capture a set-up VM so new nodes boot already provisioned
+
+    `migs bake my-vm --template NAME` images the VM's boot disk, derives an
+    instance template and a MIG from it, and makes it the current bake of
+    the VM's MIG. Then `migs up <mig> --baked` provisions from the bake.
+    Without arguments, lists bakes.
+    """
+    try:
+        if use_name:
+            current = client.use_bake(use_name)
+            console.print(f"[green]✓ {current.name} is now the current bake of {current.source_mig}[/green]")
+            return
+        
+        if not vm_name:
+            bakes = client.bakes()
+            if not bakes:
+                console.print("[yellow]No bakes, create one with: migs bake <vm> --template NAME[/yellow]")
+                return
+            
+            table = Table(title="Bakes")
+            table.add_column("Source MIG", style="cyan")
+            table.add_column("Bake", style="green")
+            table.add_column("MIG", style="yellow")
+            table.add_column("Zone", style="yellow")
+            table.add_column("From VM", style="dim")
+            table.add_column("Created", style="blue")
+            table.add_column("Current")
+            for entry in bakes:
+                table.add_row(entry.source_mig, entry.name, entry.mig, entry.zone, entry.source_vm, entry.created_at or "-", "[green]✓[/green]" if entry.current else "")
+            console.print(table)
+            return
+        
+        if not template_name:
+            console.print("[red]Specify a name with --template[/red]")
+            return
+        
+        vm = client.get_vm(vm_name)
+        if not vm:
+            console.print(f"[red]VM '{vm_name}' not found[/red]")
+            return
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            task = progress.add_task(f"[cyan]Baking {vm_name}...", total=None)
+            result = client.bake(vm, template_name, mig_name, on_step=lambda description: progress.update(task, description=f"[cyan]{description}..."))
+        
+        console.print(f"[green]✓ Baked {vm_name} into MIG {result.mig} ({result.zone})[/green]")
+        console.print(f"[cyan]Image: {result.image}, template: {result.template}[/cyan]")
+        console.print(f"[cyan]Provision from it with: migs up {result.source_mig} --baked[/cyan]")
+            
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+@cli.command()
+@click.argument("vm-name", required=False)
 @click.option("--all", is_flag=True, help="Shut down all VMs in the group (for multi-node setups)")
-def down(vm_name, all):
-    """Spin down a VM or all VMs in a group"""
+@click.option("--mine", is_flag=True, help="Shut down every VM you are tracking")
+@click.option("--yes", "-y", is_flag=True, help="Don't ask for confirmation with --mine")
+def down(vm_name, all, mine, yes):
+    """Spin down a VM, all VMs in a group, or all your VMs
+    
+    Deletions are grouped into one API call per MIG and zone, issued concurrently.
+    """
     try:
-        # First try to find cluster VMs if --all is specified
-        if all:
-            cluster_vms = storage.get_cluster_vms(vm_name)
-            if cluster_vms:
-                vms_to_delete = cluster_vms
-                console.print(f"[yellow]Shutting down all {len(cluster_vms)} VMs in cluster '{vm_name}'[/yellow]")
-            else:
-                # Fall back to single VM lookup
-                vm_data = storage.get_vm(vm_name)
-                if not vm_data:
-                    console.print(f"[red]VM or cluster '{vm_name}' not found[/red]")
-                    return
-                
-                if vm_data.get("group_id"):
-                    # Get all VMs in the group
-                    group_vms = storage.get_vms_in_group(vm_data["group_id"])
-                    if group_vms:
-                        vms_to_delete = group_vms
-                        console.print(f"[yellow]Shutting down all {len(group_vms)} VMs in the group[/yellow]")
-                    else:
-                        vms_to_delete = [vm_data]
-                else:
-                    vms_to_delete = [vm_data]
-                    console.print(f"[yellow]Shutting down VM: {vm_name}[/yellow]")
+        if mine:
+            vms_to_delete = client.vms()
+            if not vms_to_delete:
+                console.print("[yellow]No personal VMs found[/yellow]")
+                return
+            if not yes and not click.confirm(f"Shut down all {len(vms_to_delete)} tracked VMs?"):
+                return
+            console.print(f"[yellow]Shutting down all {len(vms_to_delete)} tracked VMs[/yellow]")
+        elif not vm_name:
+            console.print("[red]Specify a VM name, or use --mine[/red]")
+            return
         else:
-            # Single VM shutdown
-            vm_data = storage.get_vm(vm_name)
-            if not vm_data:
-                console.print(f"[red]VM '{vm_name}' not found[/red]")
+            vms_to_delete = client.resolve(vm_name, all)
+            if not vms_to_delete:
+                console.print(f"[red]{'VM or cluster' if all else 'VM'} '{vm_name}' not found[/red]")
                 return
-            vms_to_delete = [vm_data]
-            console.print(f"[yellow]Shutting down VM: {vm_name}[/yellow]")
+            if len(vms_to_delete) > 1:
+                console.print(f"[yellow]Shutting down all {len(vms_to_delete)} VMs in cluster '{vm_name}'[/yellow]")
+            else:
+                console.print(f"[yellow]Shutting down VM: {vm_name}[/yellow]")
+        
+        groups = {(vm.mig_name, vm.zone) for vm in vms_to_delete}
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            progress.add_task(f"[yellow]Deleting {len(vms_to_delete)} VM(s) across {len(groups)} MIG(s)...", total=None)
+            results = client.down(vms_to_delete)
         
-        # Delete each VM
-        success_count = 0
         for vm in vms_to_delete:
-            success = gcloud.delete_vm(
-                vm["instance_name"],
-                vm["zone"],
-                vm["mig_name"]
-            )
-            
-            if success:
-                success_count += 1
-                storage.remove_vm(vm["display_name"])
-                ssh_manager.remove_vm_from_config(vm["display_name"])
-                console.print(f"[green]✓ VM '{vm['display_name']}' has been shut down[/green]")
+            if results[vm.display_name]:
+                console.print(f"[green]✓ VM '{vm.display_name}' has been shut down[/green]")
             else:
-                console.print(f"[red]Failed to shut down VM '{vm['display_name']}'[/red]")
+                console.print(f"[red]Failed to shut down VM '{vm.display_name}'[/red]")
         
         if len(vms_to_delete) > 1:
-            console.print(f"[cyan]Successfully shut down {success_count}/{len(vms_to_delete)} VMs[/cyan]")
+            console.print(f"[cyan]Successfully shut down {sum(results.values())}/{len(vms_to_delete)} VMs[/cyan]")
             
     except AuthenticationError as e:
         console.print(f"[red]Authentication required[/red]")
@@ -255,15 +649,8 @@ def down(vm_name, all):
         console.print(f"[red]Error: {e}[/red]")
 
 
-@cli.command()
-def vms():
-    """List your personal VMs"""
-    vms = storage.list_vms()
-    
-    if not vms:
-        console.print("[yellow]No personal VMs found[/yellow]")
-        return
-    
+def _vms_table(vms, states=None, transitions=None):
+    """Build the table of personal VMs, optionally with live status from GCP"""
     # Group VMs by group_id
     grouped_vms = {}
     standalone_vms = []
@@ -284,6 +671,31 @@ def vms():
     table.add_column("Zone", style="yellow")
     table.add_column("Group", style="magenta")
     table.add_column("Created", style="blue")
+    if states is not None:
+        table.add_column("Status")
+        table.add_column("External IP", style="blue")
+        table.add_column("Last Change")
+    
+    def add_row(vm, group_label):
+        row = [
+            vm["display_name"],
+            vm["instance_name"],
+            vm["mig_name"],
+            vm["zone"],
+            group_label,
+            vm["created_at"]
+        ]
+        if states is not None:
+            state = states.get(vm["instance_name"])
+            status = state["status"] if state else "..."
+            status_style = "green" if status == "RUNNING" else "red" if status in ("STOPPING", "TERMINATED", "NOT FOUND") else "yellow"
+            transition = (transitions or {}).get(vm["instance_name"])
+            row += [
+                f"[{status_style}]{status}[/{status_style}]",
+                (state or {}).get("external_ip") or "-",
+                f"[bold {status_style}]{transition}[/bold {status_style}]" if transition else "-"
+            ]
+        table.add_row(*row)
     
     # Add grouped VMs first
     for group_id, group_vms in grouped_vms.items():
@@ -291,33 +703,79 @@ def vms():
         group_vms.sort(key=lambda x: x["display_name"])
         for idx, vm in enumerate(group_vms):
             group_label = f"Group ({len(group_vms)} nodes)" if idx == 0 else "↑"
-            table.add_row(
-                vm["display_name"],
-                vm["instance_name"],
-                vm["mig_name"],
-                vm["zone"],
-                group_label,
-                vm["created_at"]
-            )
+            add_row(vm, group_label)
     
     # Add standalone VMs
     for vm in standalone_vms:
-        table.add_row(
-            vm["display_name"],
-            vm["instance_name"],
-            vm["mig_name"],
-            vm["zone"],
-            "-",
-            vm["created_at"]
-        )
+        add_row(vm, "-")
     
-    console.print(table)
+    return table
+
+
+def _watch_vms(interval, projects=None):
+    """Keep a live VM table open, refreshing all tracked VMs with one API call per project per interval"""
+    states = {}
+    transitions = {}
+    tracked = None
+    
+    with Live(_vms_table(storage.list_vms(projects), states), console=console, auto_refresh=False) as live:
+        while True:
+            vms = storage.list_vms(projects)
+            latest = client.instance_states(vms)
+            
+            # Only redraw when the inventory, a status or an IP actually changed
+            changed = tracked != [vm["instance_name"] for vm in vms]
+            tracked = [vm["instance_name"] for vm in vms]
+            if latest is not None:
+                for vm in vms:
+                    name = vm["instance_name"]
+                    new_state = latest.get(name, {"status": "NOT FOUND", "external_ip": None})
+                    old_state = states.get(name)
+                    if old_state == new_state:
+                        continue
+                    changed = True
+                    if old_state and old_state["status"] != new_state["status"]:
+                        transitions[name] = f"{old_state['status']} → {new_state['status']} at {time.strftime('%H:%M:%S')}"
+                    states[name] = new_state
+            
+            if changed:
+                live.update(_vms_table(vms, states, transitions), refresh=True)
+            
+            time.sleep(interval)
+
+
+@cli.command()
+@click.option("--watch", "-w", is_flag=True, help="Keep a live table open with status refreshed from GCP")
+@click.option("--interval", default=10, type=int, help="Seconds between refreshes with --watch (default: 10)")
+@click.option("--project", "-p", "projects", multiple=True, help="Only show VMs in this project (repeatable)")
+def vms(watch, interval, projects):
+    """List your personal VMs"""
+    projects = list(projects)
+    if watch:
+        try:
+            _watch_vms(interval, projects)
+        except KeyboardInterrupt:
+            pass
+        except AuthenticationError as e:
+            console.print(f"[red]Authentication required[/red]")
+            console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+            console.print(f"[yellow]Then try again[/yellow]")
+        return
+    
+    vms = storage.list_vms(projects)
+    
+    if not vms:
+        console.print("[yellow]No personal VMs found[/yellow]")
+        return
+    
+    console.print(_vms_table(vms))
 
 
 @cli.command(context_settings={"ignore_unknown_options": True})
 @click.argument("vm-name")
 @click.argument("ssh-args", nargs=-1, type=click.UNPROCESSED)
-def ssh(vm_name, ssh_args):
+@click.option("--refresh", is_flag=True, help="Re-upload .env even if the VM already has this version")
+def ssh(vm_name, ssh_args, refresh):
     """SSH into a VM (supports passing additional SSH arguments)"""
     try:
         vm_data = storage.get_vm(vm_name)
@@ -331,7 +789,7 @@ def ssh(vm_name, ssh_args):
             env_file = ".env"
             console.print(f"[cyan]Found .env file, will upload and source it[/cyan]")
         
-        gcloud.ssh_to_vm(vm_data["instance_name"], vm_data["zone"], list(ssh_args) or None, env_file)
+        client.gcloud_for(vm_data).ssh_to_vm(vm_data["instance_name"], vm_data["zone"], list(ssh_args) or None, env_file, refresh)
         
     except AuthenticationError as e:
         console.print(f"[red]Authentication required[/red]")
@@ -341,69 +799,64 @@ def ssh(vm_name, ssh_args):
         console.print(f"[red]Error: {e}[/red]")
 
 
+def _transfer_progress():
+    """Progress display with a byte-count bar per VM, for parallel transfers"""
+    return Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        console=console,
+    )
+
+
 @cli.command()
 @click.argument("vm-name")
 @click.argument("local-path")
 @click.argument("remote-path", required=False)
 @click.option("--all", is_flag=True, help="Upload to all VMs in the group (for multi-node setups)")
-def upload(vm_name, local_path, remote_path, all):
+@click.option("--parallel", type=int, is_flag=False, flag_value=transfer.DEFAULT_STREAMS, default=None, metavar="[N]", help=f"Send a single large file over N SSH streams (default: {transfer.DEFAULT_STREAMS}), checksummed and resumable")
+def upload(vm_name, local_path, remote_path, all, parallel):
     """Upload files or directories to a VM or all VMs in a cluster"""
     try:
         if not os.path.exists(local_path):
             console.print(f"[red]Local path '{local_path}' not found[/red]")
             return
+        if parallel and not os.path.isfile(local_path):
+            console.print("[red]--parallel is for single files[/red]")
+            return
         
-        # Determine which VMs to upload to
-        vms_to_upload = []
-        if all:
-            # First try to find cluster VMs
-            cluster_vms = storage.get_cluster_vms(vm_name)
-            if cluster_vms:
-                vms_to_upload = cluster_vms
-                console.print(f"[cyan]Uploading to all {len(cluster_vms)} VMs in cluster '{vm_name}'[/cyan]")
-            else:
-                # Fall back to single VM lookup
-                vm_data = storage.get_vm(vm_name)
-                if not vm_data:
-                    console.print(f"[red]VM or cluster '{vm_name}' not found[/red]")
-                    return
-                
-                if vm_data.get("group_id"):
-                    # Get all VMs in the group
-                    group_vms = storage.get_vms_in_group(vm_data["group_id"])
-                    if group_vms:
-                        vms_to_upload = group_vms
-                        console.print(f"[cyan]Uploading to all {len(group_vms)} VMs in the group[/cyan]")
-                    else:
-                        vms_to_upload = [vm_data]
-                else:
-                    vms_to_upload = [vm_data]
+        vms_to_upload = client.resolve(vm_name, all)
+        if not vms_to_upload:
+            console.print(f"[red]{'VM or cluster' if all else 'VM'} '{vm_name}' not found[/red]")
+            return
+        if len(vms_to_upload) > 1:
+            console.print(f"[cyan]Uploading to all {len(vms_to_upload)} VMs in cluster '{vm_name}'[/cyan]")
+        
+        if parallel:
+            with _transfer_progress() as progress:
+                tasks = {vm.display_name: progress.add_task(f"[cyan]{vm.display_name}", total=None) for vm in vms_to_upload}
+                results = client.upload(
+                    vms_to_upload, local_path, remote_path, parallel=parallel,
+                    on_progress=lambda display_name, done, total: progress.update(tasks[display_name], completed=done, total=total)
+                )
         else:
-            # Single VM upload
-            vm_data = storage.get_vm(vm_name)
-            if not vm_data:
-                console.print(f"[red]VM '{vm_name}' not found[/red]")
-                return
-            vms_to_upload = [vm_data]
+            # Upload to every VM at once
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                console=console,
+            ) as progress:
+                progress.add_task(f"[cyan]Uploading {local_path} to {len(vms_to_upload)} VM(s)...", total=None)
+                results = client.upload(vms_to_upload, local_path, remote_path)
         
-        # Upload to each VM
-        success_count = 0
         for vm in vms_to_upload:
-            console.print(f"[cyan]Uploading {local_path} to {vm['display_name']}...[/cyan]")
-            
-            success = gcloud.scp_to_vm(
-                local_path,
-                vm["instance_name"],
-                vm["zone"],
-                remote_path
-            )
-            
-            if success:
-                success_count += 1
-                console.print(f"[green]✓ Upload complete to {vm['display_name']}[/green]")
+            if results[vm.display_name]:
+                console.print(f"[green]✓ Upload complete to {vm.display_name}[/green]")
             else:
-                console.print(f"[red]Upload failed to {vm['display_name']}[/red]")
+                console.print(f"[red]Upload failed to {vm.display_name}[/red]")
         
+        success_count = sum(results.values())
         if len(vms_to_upload) > 1:
             console.print(f"[cyan]Successfully uploaded to {success_count}/{len(vms_to_upload)} VMs[/cyan]")
             
@@ -417,74 +870,58 @@ def upload(vm_name, local_path, remote_path, all):
 
 @cli.command()
 @click.option("--discover", "-d", is_flag=True, help="Discover and claim untracked VMs")
-def sync(discover):
-    """Sync local VM list with actual GCP state"""
+@click.option("--project", "-p", "projects", multiple=True, help="Project to sync and discover in (repeatable, defaults to config projects or the active project)")
+def sync(discover, projects):
+    """Sync local VM list with actual GCP state
+    
+    Each project is read with a single instances list call, and all projects
+    (from --project or ~/.migs/config.json) are read at once.
+    """
     try:
         console.print("[cyan]Syncing VM state with GCP...[/cyan]")
+        # Pick up VMs from detached or interrupted `up` runs that finished meanwhile
+        recovered, dropped, errors = client.recover()
+        for vm in recovered:
+            console.print(f"[green]✓ Recovered {vm.display_name} from an unfinished request[/green]")
+        for request in dropped:
+            console.print(f"[red]Dropped {_request_label(request)}: resize request failed or was cancelled[/red]")
+        for request_id, error in errors.items():
+            console.print(f"[yellow]Could not check request {request_id}: {error}[/yellow]")
+        multi_project = len(client.projects(projects)) > 1
+        result = client.sync(projects, discover)
         
-        # First, sync existing tracked VMs
-        vms = storage.list_vms()
-        tracked_instances = {vm["instance_name"] for vm in vms}
+        for project in result.failed_projects:
+            console.print(f"[red]Could not list instances in {project or 'the active project'}[/red]")
         
-        if vms:
+        # First, show how the tracked VMs were synced
+        if result.updated or result.removed or result.skipped:
             table = Table(title="Tracked VMs Sync Status")
             table.add_column("Name", style="cyan")
             table.add_column("Instance", style="green") 
             table.add_column("Status", style="yellow")
             table.add_column("Action", style="blue")
             
-            for vm in vms:
-                instance_info = gcloud.get_instance_details(vm["instance_name"], vm["zone"])
-                
-                if not instance_info:
-                    storage.remove_vm(vm["display_name"])
-                    ssh_manager.remove_vm_from_config(vm["display_name"])
-                    table.add_row(
-                        vm["display_name"],
-                        vm["instance_name"],
-                        "NOT FOUND",
-                        "Removed from local storage"
-                    )
-                else:
-                    ssh_manager.add_vm_to_config(instance_info, custom_name=vm["display_name"])
-                    table.add_row(
-                        vm["display_name"],
-                        vm["instance_name"],
-                        instance_info["status"],
-                        "Updated" if instance_info.get("external_ip") else "No external IP"
-                    )
+            for vm in result.updated:
+                table.add_row(vm.display_name, vm.instance_name, vm.status, "Updated" if vm.external_ip else "No external IP")
+            for vm in result.removed:
+                table.add_row(vm.display_name, vm.instance_name, "NOT FOUND", "Removed from local storage")
+            for vm in result.skipped:
+                table.add_row(vm.display_name, vm.instance_name, "UNKNOWN", "Skipped (lookup failed)")
             
             console.print(table)
         else:
             console.print("[yellow]No tracked VMs found[/yellow]")
         
-        # Discover untracked VMs if requested
+        # Offer any untracked VMs found
         if discover:
-            console.print("\n[cyan]Discovering untracked VMs...[/cyan]")
-            migs = gcloud.list_migs()
-            untracked_vms = []
-            
-            for mig in migs:
-                if mig["size"] > 0:
-                    instances = gcloud.list_instances(mig["name"], mig["zone"])
-                    for instance in instances:
-                        instance_name = instance.get("name", instance.get("instance", "").split("/")[-1])
-                        if instance_name and instance_name not in tracked_instances:
-                            instance_details = gcloud.get_instance_details(instance_name, mig["zone"])
-                            if instance_details:
-                                untracked_vms.append({
-                                    "instance_name": instance_name,
-                                    "mig_name": mig["name"],
-                                    "zone": mig["zone"],
-                                    "status": instance_details["status"],
-                                    "external_ip": instance_details.get("external_ip", "N/A")
-                                })
-            
+            untracked_vms = result.untracked
             if untracked_vms:
                 table = Table(title="Untracked VMs Found")
                 table.add_column("#", style="dim")
                 table.add_column("Instance", style="green")
                 table.add_column("MIG", style="yellow")
+                if multi_project:
+                    table.add_column("Project", style="magenta")
                 table.add_column("Zone", style="yellow")
                 table.add_column("Status", style="cyan")
                 table.add_column("External IP", style="blue")
@@ -492,11 +929,12 @@ def sync(discover):
                 for idx, vm in enumerate(untracked_vms):
                     table.add_row(
                         str(idx + 1),
-                        vm["instance_name"],
-                        vm["mig_name"],
-                        vm["zone"],
-                        vm["status"],
-                        vm["external_ip"]
+                        vm.instance_name,
+                        vm.mig_name,
+                        *([vm.project] if multi_project else []),
+                        vm.zone,
+                        vm.status,
+                        vm.external_ip or "N/A"
                     )
                 
                 console.print(table)
@@ -510,16 +948,11 @@ def sync(discover):
                             idx = int(num_str.strip()) - 1
                             if 0 <= idx < len(untracked_vms):
                                 vm = untracked_vms[idx]
-                                custom_name = click.prompt(f"Custom name for {vm['instance_name']} (press Enter to skip)", default="", show_default=False)
+                                custom_name = click.prompt(f"Custom name for {vm.instance_name} (press Enter to skip)", default="", show_default=False)
                                 custom_name = custom_name.strip() or None
                                 
-                                # Get full instance details for SSH config
-                                instance_info = gcloud.get_instance_details(vm["instance_name"], vm["zone"])
-                                if instance_info:
-                                    storage.save_vm(vm["instance_name"], vm["mig_name"], vm["zone"], custom_name=custom_name)
-                                    ssh_manager.add_vm_to_config(instance_info, custom_name=custom_name)
-                                    display_name = custom_name or vm["instance_name"]
-                                    console.print(f"[green]✓ Claimed VM: {display_name}[/green]")
+                                claimed = client.claim(vm, custom_name)
+                                console.print(f"[green]✓ Claimed VM: {claimed.display_name}[/green]")
                             else:
                                 console.print(f"[red]Invalid VM number: {num_str}[/red]")
                         except ValueError:
@@ -541,24 +974,25 @@ def sync(discover):
 @click.argument("vm-name")
 @click.argument("remote-path")
 @click.argument("local-path", required=False)
-def download(vm_name, remote_path, local_path):
+@click.option("--parallel", type=int, is_flag=False, flag_value=transfer.DEFAULT_STREAMS, default=None, metavar="[N]", help=f"Fetch a single large file over N SSH streams (default: {transfer.DEFAULT_STREAMS}), checksummed and resumable")
+def download(vm_name, remote_path, local_path, parallel):
     """Download files or directories from a VM"""
     try:
-        vm_data = storage.get_vm(vm_name)
-        if not vm_data:
+        vm = client.get_vm(vm_name)
+        if not vm:
             console.print(f"[red]VM '{vm_name}' not found[/red]")
             return
         
         console.print(f"[cyan]Downloading {remote_path} from {vm_name}...[/cyan]")
         
-        success = gcloud.scp_from_vm(
-            remote_path,
-            vm_data["instance_name"],
-            vm_data["zone"],
-            local_path
-        )
+        if parallel:
+            with _transfer_progress() as progress:
+                task = progress.add_task(f"[cyan]{vm_name}", total=None)
+                ok = client.download(vm, remote_path, local_path, parallel=parallel, on_progress=lambda done, total: progress.update(task, completed=done, total=total))
+        else:
+            ok = client.download(vm, remote_path, local_path)
         
-        if success:
+        if ok:
             console.print(f"[green]✓ Download complete[/green]")
         else:
             console.print(f"[red]Download failed[/red]")
@@ -571,16 +1005,224 @@ def download(vm_name, remote_path, local_path):
         console.print(f"[red]Error: {e}[/red]")
 
 
-@cli.command()
+@cli.command(name="path")
 @click.argument("vm-name")
-def check(vm_name):
-    """Check SSH connectivity to a VM"""
+@click.option("--all", is_flag=True, help="Apply to all VMs in the group (for multi-node setups)")
+@click.option("--use", "use_path", type=click.Choice(["auto"] + netpath.PATHS), help="Pin this path instead of measuring ('auto' goes back to measuring)")
+def ssh_path(vm_name, all, use_path):
+    """Measure the network paths to a VM and point its SSH config at the fastest
+
+    Tries the internal IP, the external IP, the bastion set as "bastion" in
+    ~/.migs/config.json and, when nothing else works, an IAP tunnel.
+    """
     try:
-        vm_data = storage.get_vm(vm_name)
-        if not vm_data:
+        vms_to_route = client.resolve(vm_name, all)
+        if not vms_to_route:
+            console.print(f"[red]VM or cluster '{vm_name}' not found[/red]" if all else f"[red]VM '{vm_name}' not found[/red]")
+            return
+        
+        with console.status(f"[cyan]Measuring paths to {len(vms_to_route)} VM(s)...[/cyan]" if use_path in (None, "auto") else "[cyan]Updating SSH config...[/cyan]"):
+            try:
+                rtts = client.select_paths(vms_to_route, use_path)
+            except ValueError as e:
+                console.print(f"[red]{e}[/red]")
+                return
+        
+        table = Table(title="SSH Paths")
+        table.add_column("VM", style="cyan")
+        for path in netpath.PATHS:
+            table.add_column(f"{path} (ms)", style="yellow")
+        table.add_column("Using", style="green")
+        
+        for vm in sorted(vms_to_route, key=lambda vm: vm.display_name):
+            if vm.display_name not in rtts:
+                table.add_row(vm.display_name, *["-"] * len(netpath.PATHS), f"{vm.ssh_path} [dim](pinned)[/dim]")
+                continue
+            vm_rtts = rtts[vm.display_name]
+            cells = []
+            for path in netpath.PATHS:
+                if path not in vm_rtts:
+                    cells.append("-")
+                elif vm_rtts[path] is None:
+                    cells.append("[red]✗[/red]")
+                else:
+                    cells.append(f"{vm_rtts[path] * 1000:.0f}")
+            if use_path not in (None, "auto"):
+                using = f"{vm.ssh_path} [dim](pinned)[/dim]"
+            else:
+                using = netpath.fastest(vm_rtts) or "[red]none reachable[/red]"
+            table.add_row(vm.display_name, *cells, using)
+        
+        console.print(table)
+    
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+def _wait_for_ssh_ready(vm_infos, timeout):
+    """Probe SSH readiness on many VMs at once and print a per-node table
+    
+    Each entry in vm_infos needs display_name, instance_name, zone and external_ip.
+    Returns True if every node is ready.
+    """
+    done = []
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        console=console,
+    ) as progress:
+        task = progress.add_task(f"[cyan]Waiting for SSH on {len(vm_infos)} VM(s)...", total=None)
+        
+        def on_update(result):
+            if result["state"] in ("ready", "unreachable", "ssh_failed"):
+                done.append(result["name"])
+                progress.update(task, description=f"[cyan]Waiting for SSH on {len(vm_infos)} VM(s)... ({len(done)} done)")
+        
+        results = wait_for_nodes(gcloud, vm_infos, timeout=timeout, on_update=on_update)
+    
+    table = Table(title="SSH Readiness")
+    table.add_column("Name", style="cyan")
+    table.add_column("Host", style="green")
+    table.add_column("State", style="yellow")
+    table.add_column("Port 22", style="blue")
+    table.add_column("SSH Ready", style="blue")
+    table.add_column("Attempts", style="dim")
+    
+    state_styles = {"ready": "green", "unreachable": "red", "ssh_failed": "red"}
+    for result in sorted(results, key=lambda x: x["name"]):
+        style = state_styles.get(result["state"], "yellow")
+        table.add_row(
+            result["name"],
+            result["host"] or "N/A",
+            f"[{style}]{result['state']}[/{style}]",
+            f"{result['port_time']:.1f}s" if result["port_time"] is not None else "-",
+            f"{result['ready_time']:.1f}s" if result["ready_time"] is not None else "-",
+            str(result["attempts"])
+        )
+    
+    console.print(table)
+    return all(result["state"] == "ready" for result in results)
+
+
+def _print_network_check(result):
+    """Print a network check's sender-by-receiver matrix and flag what would hurt a run
+    
+    Returns True if every node could be reached on the port and no link is slow.
+    """
+    slow = set(result.slow_links())
+    unreachable = result.unreachable()
+    
+    table = Table(title=f"Network check ({'ring' if result.ring else 'all pairs'}, RTT / throughput, sender → receiver)")
+    table.add_column("From", style="cyan")
+    for node in result.nodes:
+        table.add_column(f"{node} (head)" if node == result.head else node, justify="right")
+    for sender in result.nodes:
+        cells = []
+        for receiver in result.nodes:
+            link = result.links.get(sender, {}).get(receiver)
+            if sender == receiver or link is None:
+                cells.append("[dim]-[/dim]")
+            elif link.get("rtt_ms") is None:
+                cells.append("[red]✗[/red]")
+            else:
+                gbps = f"{link['gbps']:.1f}G" if link.get("gbps") is not None else "?"
+                cell = f"{link['rtt_ms']:.2f}ms / {gbps}"
+                cells.append(f"[yellow]{cell}[/yellow]" if (sender, receiver) in slow else cell)
+        table.add_row(f"{sender} (head)" if sender == result.head else sender, *cells)
+    console.print(table)
+    
+    if result.median_rtt_ms is not None:
+        gbps = f"{result.median_gbps:.1f} Gbit/s" if result.median_gbps is not None else "unknown"
+        console.print(f"Median RTT {result.median_rtt_ms:.2f}ms, median throughput {gbps}")
+    
+    healthy = True
+    for node, listening in result.listening.items():
+        if listening is None:
+            console.print(f"[red]✗ Could not run the check on {node}[/red]")
+            healthy = False
+        elif not listening:
+            console.print(f"[red]✗ Port {result.port} is already in use on {node}[/red]")
+            healthy = False
+    for node in result.nodes:
+        if node in unreachable:
+            consequence = ", so rendezvous will hang" if node == result.head else ""
+            console.print(f"[red]✗ {node} can't be reached on port {result.port} from {', '.join(unreachable[node])}{consequence}[/red]")
+            healthy = False
+    for sender, receiver in sorted(slow):
+        console.print(f"[yellow]! Slow link {sender} → {receiver}[/yellow]")
+        healthy = False
+    if healthy:
+        console.print(f"[green]✓ Every node is reachable on port {result.port} and no link is slow[/green]")
+    return healthy
+
+
+@cli.command()
+@click.argument("vm-name", required=False)
+@click.option("--all", is_flag=True, help="Check all VMs in the group, or every tracked VM if no name is given")
+@click.option("--timeout", default=30, type=int, help="Seconds to wait for each VM with --all (default: 30)")
+@click.option("--network", is_flag=True, help="Measure latency and throughput between the cluster's nodes over internal IPs")
+@click.option("--ring", is_flag=True, help="With --network, test each node to the next instead of all pairs")
+def check(vm_name, all, timeout, network, ring):
+    """Check SSH connectivity to a VM or, with --all, to many VMs at once
+    
+    With --network, run a pre-flight check of a cluster instead: every node
+    listens on the torchrun rendezvous port and the nodes measure latency and
+    throughput to each other, flagging slow links and nodes that can't be
+    reached.
+    """
+    try:
+        if network:
+            if not vm_name:
+                console.print("[red]Specify a cluster to check[/red]")
+                return
+            vms_to_check = client.resolve(vm_name, True)
+            if len(vms_to_check) < 2:
+                console.print(f"[red]'{vm_name}' is not a cluster of two or more VMs[/red]" if vms_to_check else f"[red]VM or cluster '{vm_name}' not found[/red]")
+                return
+            
+            rounds = len(netcheck.schedule(len(vms_to_check), ring))
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                console=console,
+            ) as progress:
+                progress.add_task(f"[cyan]Testing the network between {len(vms_to_check)} nodes (about {netcheck.START_LEAD + rounds * netcheck.SLOT_SECONDS:.0f}s)...", total=None)
+                result = client.network_check(vms_to_check, ring=ring)
+            
+            _print_network_check(result)
+            return
+        
+        if all:
+            vms_to_check = client.resolve(vm_name, True) if vm_name else client.vms()
+            if not vms_to_check:
+                console.print(f"[red]VM or cluster '{vm_name}' not found[/red]" if vm_name else "[yellow]No personal VMs found[/yellow]")
+                return
+            
+            # Look up current addresses with one call per project, then probe every node at once
+            states = client.instance_states(vms_to_check) or {}
+            vm_infos = []
+            for vm in vms_to_check:
+                vm.external_ip = states.get(vm.instance_name, {}).get("external_ip")
+                vm.internal_ip = states.get(vm.instance_name, {}).get("internal_ip") or vm.internal_ip
+                vm_infos.append(vm.to_dict())
+            
+            _wait_for_ssh_ready(vm_infos, timeout)
+            return
+        
+        if not vm_name:
+            console.print("[red]Specify a VM name, or use --all[/red]")
+            return
+        
+        vm = client.get_vm(vm_name)
+        if not vm:
             console.print(f"[red]VM '{vm_name}' not found[/red]")
             return
         
+        vm_gcloud = client.gcloud_for(vm)
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -588,15 +1230,12 @@ def check(vm_name):
         ) as progress:
             task = progress.add_task(f"[cyan]Checking SSH connectivity to {vm_name}...", total=None)
             
-            connected = gcloud.check_ssh_connectivity(
-                vm_data["instance_name"],
-                vm_data["zone"]
-            )
+            connected = vm_gcloud.check_ssh_connectivity(vm.instance_name, vm.zone)
         
         if connected:
             console.print(f"[green]✓ SSH connection to '{vm_name}' is healthy[/green]")
             
-            instance_info = gcloud.get_instance_details(vm_data["instance_name"], vm_data["zone"])
+            instance_info = vm_gcloud.get_instance_details(vm.instance_name, vm.zone)
             if instance_info and instance_info.get("external_ip"):
                 console.print(f"[cyan]External IP: {instance_info['external_ip']}[/cyan]")
                 console.print(f"[cyan]Status: {instance_info['status']}[/cyan]")
@@ -616,6 +1255,60 @@ def check(vm_name):
         console.print(f"[red]Error: {e}[/red]")
 
 
+def _launch_script(vms_to_run, script_path, script_args, session, torchrun, env_file, refresh=False):
+    """Start a script in a tmux session on each VM, with torchrun env for multi-node runs
+
+    Returns the number of VMs the script was started on.
+    """
+    script_name = os.path.basename(script_path)
+    
+    if torchrun and len(vms_to_run) > 1:
+        console.print(f"[cyan]Setting up torchrun environment for {len(vms_to_run)} nodes...[/cyan]")
+        console.print(f"[cyan]Staging {script_name} on {len(vms_to_run)} VMs, then starting all of them at once...[/cyan]")
+    else:
+        console.print(f"[cyan]Running {script_name} on {len(vms_to_run)} VM(s)...[/cyan]")
+    
+    try:
+        result = client.run(vms_to_run, script_path, script_args, session, torchrun, env_file, refresh)
+    except RuntimeError as e:
+        console.print(f"[red]{e}[/red]")
+        return 0
+    
+    if result.torchrun_env and result.start_at is None:
+        console.print("[red]Not every node could be staged, so the launch was called off on all of them[/red]")
+    elif result.clock_skew is not None and abs(result.clock_skew) >= 1:
+        console.print(f"[dim]This machine's clock is {abs(result.clock_skew):.1f}s off the head node's, the start time was set by the head node[/dim]")
+    
+    if result.torchrun_env:
+        head_vm = min(vms_to_run, key=lambda vm: vm.display_name)
+        console.print(f"[cyan]Head node: {head_vm.display_name} (IP: {result.torchrun_env['HEAD_NODE_IP']})[/cyan]")
+        console.print(f"[cyan]GPUs per node: {result.torchrun_env['NPROC_PER_NODE']}[/cyan]")
+        console.print(f"[cyan]Total nodes: {result.torchrun_env['NNODES']}[/cyan]")
+    
+    for display_name in sorted(result.results):
+        start_time = result.start_times.get(display_name)
+        offset = f" at {(start_time - result.start_at) * 1000:+.0f}ms" if start_time is not None else ""
+        if result.results[display_name]:
+            console.print(f"[green]✓ Script started on {display_name}{offset} in tmux session '{result.session}'[/green]")
+        else:
+            console.print(f"[red]Failed to run script on {display_name}[/red]")
+    
+    if result.start_skew is not None:
+        # Measured with each node's own clock, which GCE keeps NTP-synced to the host
+        style = "green" if result.start_skew < 1 else "yellow"
+        console.print(f"[{style}]Start skew across nodes: {result.start_skew * 1000:.0f}ms[/{style}]")
+    
+    if result.success_count > 0:
+        if len(vms_to_run) == 1:
+            console.print(f"[cyan]To attach: migs ssh {vms_to_run[0].display_name} -- tmux attach -t {result.session}[/cyan]")
+            console.print(f"[cyan]To check status: migs ssh {vms_to_run[0].display_name} -- tmux ls[/cyan]")
+        else:
+            console.print(f"[cyan]Scripts started on {result.success_count}/{len(vms_to_run)} VMs[/cyan]")
+            console.print(f"[cyan]To attach to a specific VM: migs ssh <vm-name> -- tmux attach -t {result.session}[/cyan]")
+    
+    return result.success_count
+
+
 @cli.command()
 @click.argument("vm-name")
 @click.argument("script-path")
@@ -623,7 +1316,8 @@ def check(vm_name):
 @click.option("--session", default=None, help="Tmux session name (defaults to script name)")
 @click.option("--all", is_flag=True, help="Run on all VMs in the group (for multi-node setups)")
 @click.option("--torchrun", is_flag=True, help="Set up torchrun environment variables for distributed training")
-def run(vm_name, script_path, script_args, session, all, torchrun):
+@click.option("--refresh", is_flag=True, help="Re-upload the script and .env even if the VMs already have these versions")
+def run(vm_name, script_path, script_args, session, all, torchrun, refresh):
     """Execute a bash script on a VM in a tmux session
 
     Can pass args, e.g. `migs run my-vm script.sh arg1 arg2 arg3`
@@ -637,118 +1331,241 @@ def run(vm_name, script_path, script_args, session, all, torchrun):
             console.print(f"[red]Script file '{script_path}' not found[/red]")
             return
         
-        script_name = os.path.basename(script_path)
-        
         # Check for .env file in current directory
         env_file = None
         if os.path.exists(".env"):
             env_file = ".env"
             console.print(f"[cyan]Found .env file, will upload and source it[/cyan]")
         
-        # Determine which VMs to run on
-        vms_to_run = []
-        if all:
-            # First try to find cluster VMs
-            cluster_vms = storage.get_cluster_vms(vm_name)
-            if cluster_vms:
-                vms_to_run = cluster_vms
-                console.print(f"[cyan]Running on all {len(cluster_vms)} VMs in cluster '{vm_name}'[/cyan]")
-            else:
-                # Fall back to single VM lookup
-                vm_data = storage.get_vm(vm_name)
-                if not vm_data:
-                    console.print(f"[red]VM or cluster '{vm_name}' not found[/red]")
-                    return
-                
-                if vm_data.get("group_id"):
-                    # Get all VMs in the group
-                    group_vms = storage.get_vms_in_group(vm_data["group_id"])
-                    if group_vms:
-                        vms_to_run = group_vms
-                        console.print(f"[cyan]Running on all {len(group_vms)} VMs in the group[/cyan]")
-                    else:
-                        vms_to_run = [vm_data]
-                else:
-                    vms_to_run = [vm_data]
-        else:
-            # Single VM run
-            vm_data = storage.get_vm(vm_name)
-            if not vm_data:
-                console.print(f"[red]VM '{vm_name}' not found[/red]")
-                return
-            vms_to_run = [vm_data]
-        
-        # Sort VMs by display name to ensure consistent ordering (important for torchrun)
-        vms_to_run.sort(key=lambda x: x["display_name"])
+        vms_to_run = client.resolve(vm_name, all)
+        if not vms_to_run:
+            console.print(f"[red]VM or cluster '{vm_name}' not found[/red]" if all else f"[red]VM '{vm_name}' not found[/red]")
+            return
+        if all and len(vms_to_run) > 1:
+            console.print(f"[cyan]Running on all {len(vms_to_run)} VMs in '{vm_name}'[/cyan]")
         
-        # Get torchrun environment variables if needed
-        torchrun_env = None
-        if torchrun and all and len(vms_to_run) > 1:
-            console.print(f"[cyan]Setting up torchrun environment for {len(vms_to_run)} nodes...[/cyan]")
-            
-            # Get head node (first VM) internal details
-            head_vm = vms_to_run[0]
-            head_details = gcloud.get_instance_internal_details(head_vm["instance_name"], head_vm["zone"])
-            
-            if not head_details:
-                console.print(f"[red]Failed to get internal details for head node '{head_vm['display_name']}'[/red]")
-                return
-            
-            head_node_ip = head_details["internal_ip"]
-            nproc_per_node = head_details["gpu_count"]
-            nnodes = len(vms_to_run)
-            
-            console.print(f"[cyan]Head node: {head_vm['display_name']} (IP: {head_node_ip})[/cyan]")
-            console.print(f"[cyan]GPUs per node: {nproc_per_node}[/cyan]")
-            console.print(f"[cyan]Total nodes: {nnodes}[/cyan]")
-            
-            # Prepare environment for each node
-            torchrun_env = {
-                "HEAD_NODE_IP": head_node_ip,
-                "HEAD_NODE_PORT": "5000",
-                "NNODES": str(nnodes),
-                "NPROC_PER_NODE": str(nproc_per_node)
-            }
-        elif torchrun and not all:
+        if torchrun and not all:
             console.print(f"[yellow]Warning: --torchrun is only effective when used with --all for multi-node setups[/yellow]")
         
-        # Run script on each VM
-        success_count = 0
-        for idx, vm in enumerate(vms_to_run):
-            # Use the same session name for all VMs (they're on different machines)
-            vm_session = session or re.sub(r'[^a-zA-Z0-9_-]', '_', script_name)
-            
-            # Prepare node-specific environment variables for torchrun
-            node_env = None
-            if torchrun_env:
-                node_env = torchrun_env.copy()
-                node_env["NODE_RANK"] = str(idx)  # 0 for head, 1+ for workers
+        _launch_script(vms_to_run, script_path, list(script_args), session, torchrun and all, env_file, refresh)
             
-            console.print(f"[cyan]Running {script_name} on {vm['display_name']} in tmux session '{vm_session}'...[/cyan]")
-            
-            success = gcloud.run_script(
-                script_path,
-                vm["instance_name"],
-                vm["zone"],
-                vm_session,
-                list(script_args),
-                env_file,
-                node_env
-            )
-            
-            if success:
-                success_count += 1
-                console.print(f"[green]✓ Script started on {vm['display_name']} in tmux session '{vm_session}'[/green]")
-            else:
-                console.print(f"[red]Failed to run script on {vm['display_name']}[/red]")
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+@cli.command()
+@click.argument("vm-name")
+@click.argument("script-path")
+@click.argument("script-args", nargs=-1, required=False)
+@click.option("--gpus", "-g", default=1, type=int, help="GPUs the job needs (default: 1)")
+@click.option("--name", "-n", "job_name", help="Label shown in `migs jobs`")
+@click.option("--refresh", is_flag=True, help="Re-upload the script and .env even if the VM already has these versions")
+def submit(vm_name, script_path, script_args, gpus, job_name, refresh):
+    """Queue a script on a VM or cluster to run once enough GPUs are free
+
+    Each node runs its queued jobs side by side, giving every job its own
+    CUDA_VISIBLE_DEVICES slice. On a cluster, the job goes to the node with
+    the most unclaimed GPUs.
+    """
+    try:
+        if not os.path.exists(script_path):
+            console.print(f"[red]Script file '{script_path}' not found[/red]")
+            return
+        if gpus < 0:
+            console.print("[red]--gpus cannot be negative[/red]")
+            return
+        
+        env_file = None
+        if os.path.exists(".env"):
+            env_file = ".env"
+            console.print(f"[cyan]Found .env file, will upload and source it[/cyan]")
+        
+        vms_to_use = client.resolve(vm_name, True)
+        if not vms_to_use:
+            console.print(f"[red]VM or cluster '{vm_name}' not found[/red]")
+            return
+        
+        with console.status(f"[cyan]Submitting {os.path.basename(script_path)}...[/cyan]"):
+            job = client.submit(vms_to_use, script_path, gpus, list(script_args), job_name, env_file, refresh)
+        
+        console.print(f"[green]✓ Queued job {job.id} on {job.node} ({gpus} GPU{'s' if gpus != 1 else ''})[/green]")
+        console.print(f"[cyan]To follow: migs jobs {vm_name}[/cyan]")
+        console.print(f"[cyan]Output: migs ssh {job.node} -- tail -f {jobqueue.QUEUE_DIR.replace('$HOME', '~')}/jobs/{job.id}/log[/cyan]")
+    
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+JOB_STATE_STYLES = {"queued": "yellow", "running": "cyan", "done": "green", "failed": "red", "cancelled": "dim"}
+
+
+@cli.command()
+@click.argument("vm-name")
+@click.option("--cancel", "cancel_id", help="Cancel a queued or running job by ID")
+def jobs(vm_name, cancel_id):
+    """Show the job queue of a VM or cluster"""
+    try:
+        vms_to_show = client.resolve(vm_name, True)
+        if not vms_to_show:
+            console.print(f"[red]VM or cluster '{vm_name}' not found[/red]")
+            return
         
-        if success_count > 0:
-            if len(vms_to_run) == 1:
-                console.print(f"[cyan]To attach: migs ssh {vm_name} -- tmux attach -t {vm_session}[/cyan]")
-                console.print(f"[cyan]To check status: migs ssh {vm_name} -- tmux ls[/cyan]")
+        if cancel_id:
+            results = client.cancel_job(vms_to_show, cancel_id)
+            cancelled = [node for node, ok in results.items() if ok]
+            if cancelled:
+                console.print(f"[green]✓ Cancelled job {cancel_id} on {', '.join(sorted(cancelled))}[/green]")
             else:
-                console.print(f"[cyan]Scripts started on {success_count}/{len(vms_to_run)} VMs[/cyan]")
-                console.print(f"[cyan]To attach to a specific VM: migs ssh <vm-name> -- tmux attach -t {vm_session}[/cyan]")
+                console.print(f"[red]Job '{cancel_id}' not found on '{vm_name}'[/red]")
+            return
+        
+        with console.status("[cyan]Reading job queues...[/cyan]"):
+            queues = client.jobs(vms_to_show)
+        
+        now = int(time.time())
+        table = Table(title=f"Jobs on {vm_name}")
+        table.add_column("Node", style="cyan")
+        table.add_column("Job", style="dim")
+        table.add_column("Name", style="magenta")
+        table.add_column("State")
+        table.add_column("GPUs", style="yellow")
+        table.add_column("Runtime", style="blue")
+        table.add_column("Exit", style="dim")
+        
+        for node in sorted(queues):
+            node_jobs = queues[node]
+            if node_jobs is None:
+                table.add_row(node, "-", "-", "[red]unreachable[/red]", "-", "-", "-")
+                continue
+            for job in node_jobs:
+                style = JOB_STATE_STYLES.get(job.state, "white")
+                gpus = f"{job.gpus} ({job.devices})" if job.devices else str(job.gpus)
+                runtime = (job.finished or now) - job.started if job.started else None
+                exit_code = str(job.exit_code) if job.exit_code is not None else "-"
+                table.add_row(node, job.id, job.name or "-", f"[{style}]{job.state}[/{style}]", gpus, _format_duration(runtime), exit_code)
+        
+        if not any(queues.values()):
+            console.print(f"[yellow]No jobs on '{vm_name}'[/yellow]")
+            return
+        console.print(table)
+        console.print(f"[dim]Logs: migs ssh <node> -- cat {jobqueue.QUEUE_DIR.replace('$HOME', '~')}/jobs/<job>/log[/dim]")
+    
+    except AuthenticationError as e:
+        console.print(f"[red]Authentication required[/red]")
+        console.print(f"[yellow]Please run: gcloud auth login[/yellow]")
+        console.print(f"[yellow]Then try again[/yellow]")
+    except Exception as e:
+        console.print(f"[red]Error: {e}[/red]")
+
+
+def _format_rate(bps):
+    if bps is None:
+        return "-"
+    return f"{bps / 1e6:.1f}"
+
+
+def _top_table(samplers):
+    """Build the utilization dashboard from the latest sample of each node"""
+    summaries = {node: telemetry.summarize(sampler.latest()) for node, sampler in samplers.items()}
+    
+    # A node well below the cluster's median GPU utilization is likely a straggler
+    utils = sorted(summary["gpu_util"] for summary in summaries.values() if "gpu_util" in summary)
+    median_util = utils[len(utils) // 2] if utils else None
+    
+    table = Table(title=f"Cluster Utilization ({time.strftime('%H:%M:%S')})")
+    table.add_column("Node", style="cyan")
+    table.add_column("GPUs", style="dim")
+    table.add_column("GPU Util % (avg/min)")
+    table.add_column("GPU Mem %", style="yellow")
+    table.add_column("Load", style="yellow")
+    table.add_column("RAM %", style="yellow")
+    table.add_column("Disk R/W MB/s", style="blue")
+    table.add_column("Age", style="dim")
+    table.add_column("Flag")
+    
+    for node in sorted(summaries):
+        summary = summaries[node]
+        if not summary:
+            error = samplers[node].error
+            table.add_row(node, "-", "-", "-", "-", "-", "-", "-", f"[red]{error}[/red]" if error else "[yellow]connecting...[/yellow]")
+            continue
+        
+        flag = ""
+        util_cell = "-"
+        if "gpu_util" in summary:
+            util = summary["gpu_util"]
+            style = "green" if util >= 70 else "yellow" if util >= 20 else "red"
+            util_cell = f"[{style}]{util:.0f} / {summary['gpu_util_min']:.0f}[/{style}]"
+            if util < 5:
+                flag = "[red]idle[/red]"
+            elif median_util and median_util > 20 and util < median_util / 2:
+                flag = "[red]straggler?[/red]"
+        
+        age = time.time() - summary["ts"]
+        table.add_row(
+            node,
+            str(summary.get("gpu_count", 0)),
+            util_cell,
+            f"{summary['gpu_mem_pct']:.0f}" if "gpu_mem_pct" in summary else "-",
+            f"{summary['load']:.1f}/{summary['cpus']}" if summary.get("load") is not None else "-",
+            f"{summary['ram_pct']:.0f}" if "ram_pct" in summary else "-",
+            f"{_format_rate(summary.get('disk_read_bps'))} / {_format_rate(summary.get('disk_write_bps'))}",
+            f"[red]{age:.0f}s[/red]" if age > 30 else f"{age:.0f}s",
+            flag
+        )
+    
+    return table
+
+
+@cli.command()
+@click.argument("cluster")
+@click.option("--interval", default=2.0, type=float, help="Seconds between samples (default: 2)")
+@click.option("--history", default=300, type=int, help="Samples kept in memory per node (default: 300)")
+@click.option("--export", "export_path", help="On exit, write all buffered samples to a .csv or .json file")
+def top(cluster, interval, history, export_path):
+    """Live GPU, CPU, RAM and disk utilization for every node in a cluster
+    
+    Opens one long-lived SSH session per node and streams samples from all
+    of them at once. Press Ctrl+C to exit.
+    """
+    try:
+        vms_to_watch = [vm.to_dict() for vm in client.resolve(cluster, True)]
+        if not vms_to_watch:
+            console.print(f"[red]VM or cluster '{cluster}' not found[/red]")
+            return
+        
+        samplers = telemetry.start_samplers(gcloud, vms_to_watch, interval=interval, history=history)
+        try:
+            with Live(_top_table(samplers), console=console, auto_refresh=False) as live:
+                while True:
+                    time.sleep(min(interval, 1))
+                    live.update(_top_table(samplers), refresh=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            telemetry.stop_samplers(samplers)
+        
+        if export_path:
+            telemetry.export_samples(samplers, export_path)
+            console.print(f"[green]✓ Samples written to {export_path}[/green]")
             
     except AuthenticationError as e:
         console.print(f"[red]Authentication required[/red]")
@@ -758,5 +1575,53 @@ def run(vm_name, script_path, script_args, session, all, torchrun):
         console.print(f"[red]Error: {e}[/red]")
 
 
+@cli.group()
+def daemon():
+    """Manage the optional background daemon that keeps state warm"""
+    pass
+
+
+@daemon.command(name="start")
+def daemon_start():
+    """Start the daemon; later migs commands are forwarded to it"""
+    if migs_daemon.start_daemon():
+        console.print(f"[green]✓ migs daemon running ({migs_daemon.SOCKET_PATH})[/green]")
+    else:
+        console.print("[red]Failed to start migs daemon, see ~/.migs/daemon.log[/red]")
+
+
+@daemon.command(name="stop")
+def daemon_stop():
+    """Stop the daemon"""
+    if migs_daemon.request({"op": "shutdown"}, timeout=5):
+        console.print("[green]✓ migs daemon stopped[/green]")
+    else:
+        console.print("[yellow]migs daemon is not running[/yellow]")
+
+
+@daemon.command(name="status")
+def daemon_status():
+    """Show the daemon's warm state"""
+    status = migs_daemon.request({"op": "status"}, timeout=30)
+    if not status:
+        console.print("[yellow]migs daemon is not running[/yellow]")
+        return
+    
+    environment = status.get("environment") or {}
+    table = Table(title="migs daemon")
+    table.add_column("Key", style="cyan")
+    table.add_column("Value", style="green")
+    table.add_row("PID", str(status["pid"]))
+    table.add_row("Uptime", f"{status['uptime']:.0f}s")
+    table.add_row("Requests served", str(status["requests"]))
+    table.add_row("Tracked VMs", str(status["tracked_vms"]))
+    table.add_row("SSH masters", str(status["ssh_masters"]))
+    table.add_row("MIGs cached", str(status["mig_catalog"]))
+    table.add_row("Account", environment.get("account") or "-")
+    table.add_row("Project", environment.get("project") or "-")
+    table.add_row("gcloud beta", "yes" if environment.get("beta") else "no")
+    console.print(table)
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
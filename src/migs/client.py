@@ -0,0 +1,1419 @@
+import asyncio
+import contextlib
+import fcntl
+import functools
+import itertools
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from migs import jobqueue, metrics, netcheck, netpath
+from migs.gcloud import AuthenticationError, GCloudWrapper
+from migs.readiness import probe_any, ssh_hosts, wait_for_node
+from migs.ssh_config import SSHConfigManager
+from migs.storage import BakeStorage, ProvisioningHistory, RequestJournal, VMStorage, load_config
+
+# Seconds between releasing a synchronized launch and its start time, plus a
+# little more per node since releases go out through the shared rate limiter
+LAUNCH_LEAD = 3.0
+LAUNCH_LEAD_PER_NODE = 0.1
+
+# Seconds to wait for a new VM's guest agent to publish its SSH host keys
+HOST_KEY_TIMEOUT = 120
+
+# Seconds a new standby VM gets to accept SSH logins before the pool gives
+# up on it and deletes it
+STANDBY_READY_TIMEOUT = 600
+
+
+@dataclass
+class MIG:
+    """A managed instance group"""
+    name: str
+    zone: str
+    size: int
+    target_size: int
+    project: Optional[str] = None
+
+
+@dataclass
+class VM:
+    """A VM, either tracked in the local inventory or discovered in a MIG"""
+    display_name: str
+    instance_name: str
+    mig_name: str
+    zone: str
+    project: Optional[str] = None
+    group_id: Optional[str] = None
+    created_at: Optional[str] = None
+    status: Optional[str] = None
+    external_ip: Optional[str] = None
+    internal_ip: Optional[str] = None
+    # How the SSH config reaches the VM (see migs.netpath.PATHS)
+    ssh_path: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "VM":
+        """Build a record from an inventory entry, ignoring unknown keys"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class UpRequest:
+    """Resize requests submitted by Client.request_vms, possibly racing several MIGs"""
+    candidates: List[Dict]
+    count: int
+    name: Optional[str]
+    project: Optional[str]
+    skipped: Dict[str, str] = field(default_factory=dict)
+    winner: Optional[Dict] = None
+    submitted_at: Optional[str] = None
+    # Process waiting on the request, None once detached
+    pid: Optional[int] = None
+
+    @property
+    def id(self) -> str:
+        """Journal ID: the first candidate MIG plus the resize request's timestamp"""
+        first = self.candidates[0]
+        return f"{first['mig_name']}-{first['request_id'].rsplit('-', 1)[-1]}"
+
+    @property
+    def used_beta(self) -> bool:
+        return self.candidates[0]["used_beta"]
+
+    @property
+    def instance_names(self) -> List[str]:
+        """Names the VMs will be called by: their exact instance names if the beta API is used, else the names they are mapped to"""
+        candidate = self.winner or self.candidates[0]
+        return candidate.get("display_names") or candidate["instance_names"]
+
+    @property
+    def group_id(self) -> Optional[str]:
+        if self.count <= 1 or not self.winner:
+            return None
+        return f"{self.winner['mig_name']}-{self.winner['request_id']}"
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        for candidate in data["candidates"] + ([data["winner"]] if data["winner"] else []):
+            candidate["initial_instance_names"] = sorted(candidate["initial_instance_names"])
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UpRequest":
+        request = cls(**{key: value for key, value in data.items() if key in {f.name for f in fields(cls)}})
+        for candidate in request.candidates + ([request.winner] if request.winner else []):
+            candidate["initial_instance_names"] = set(candidate["initial_instance_names"])
+        return request
+
+
+@dataclass
+class Pool:
+    """A MIG's warm standby pool"""
+    mig_name: str
+    zone: str
+    project: Optional[str]
+    size: int
+    standby: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Bake:
+    """A set-up VM captured as an image, an instance template and a MIG to provision from"""
+    name: str
+    source_mig: str
+    zone: str
+    project: Optional[str]
+    image: str
+    template: str
+    mig: str
+    source_vm: str
+    created_at: Optional[str] = None
+    current: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Bake":
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+@dataclass
+class Job:
+    """A job in a VM's queue (see Client.submit)"""
+    id: str
+    node: str
+    state: str
+    gpus: int
+    devices: str = ""
+    name: str = ""
+    submitted: Optional[int] = None
+    started: Optional[int] = None
+    finished: Optional[int] = None
+    exit_code: Optional[int] = None
+
+
+@dataclass
+class SyncResult:
+    """Outcome of Client.sync"""
+    updated: List[VM] = field(default_factory=list)
+    removed: List[VM] = field(default_factory=list)
+    skipped: List[VM] = field(default_factory=list)
+    untracked: List[VM] = field(default_factory=list)
+    failed_projects: List[Optional[str]] = field(default_factory=list)
+
+
+@dataclass
+class RunResult:
+    """Outcome of Client.run"""
+    session: str
+    results: Dict[str, bool]
+    torchrun_env: Optional[Dict[str, str]] = None
+    start_at: Optional[float] = None
+    start_times: Dict[str, Optional[float]] = field(default_factory=dict)
+    # Seconds the head node's clock, which start_at is set by, is ahead of this machine's
+    clock_skew: Optional[float] = None
+
+    @property
+    def success_count(self) -> int:
+        return sum(1 for ok in self.results.values() if ok)
+
+    @property
+    def start_skew(self) -> Optional[float]:
+        """Seconds between the first and last node starting the script, for synchronized launches"""
+        times = [t for t in self.start_times.values() if t is not None]
+        return max(times) - min(times) if times else None
+
+
+@dataclass
+class NetworkCheck:
+    """Outcome of Client.network_check
+
+    nodes are in display-name order, so the first is the head node run
+    --torchrun would pick. links maps sender to receiver to {"rtt_ms",
+    "gbps"}, or {"error"} if the receiver couldn't be reached on the port.
+    listening is None for nodes whose probe didn't run at all.
+    """
+    nodes: List[str]
+    port: int
+    ring: bool = False
+    links: Dict[str, Dict[str, Dict]] = field(default_factory=dict)
+    listening: Dict[str, Optional[bool]] = field(default_factory=dict)
+
+    @property
+    def head(self) -> Optional[str]:
+        return self.nodes[0] if self.nodes else None
+
+    def _measured(self, key: str) -> List[float]:
+        return [link[key] for peers in self.links.values() for link in peers.values() if link.get(key) is not None]
+
+    @property
+    def median_rtt_ms(self) -> Optional[float]:
+        return metrics.percentile(self._measured("rtt_ms"), 50)
+
+    @property
+    def median_gbps(self) -> Optional[float]:
+        return metrics.percentile(self._measured("gbps"), 50)
+
+    def unreachable(self) -> Dict[str, List[str]]:
+        """Nodes that peers couldn't connect to on the port, with those peers"""
+        refused = {}
+        for sender, peers in self.links.items():
+            for receiver, link in peers.items():
+                if "error" in link and link.get("rtt_ms") is None:
+                    refused.setdefault(receiver, []).append(sender)
+        return refused
+
+    def slow_links(self) -> List[Tuple[str, str]]:
+        """(sender, receiver) links well below the cluster's median throughput or above its median latency"""
+        median_rtt, median_gbps = self.median_rtt_ms, self.median_gbps
+        slow = []
+        for sender, peers in self.links.items():
+            for receiver, link in peers.items():
+                if (median_gbps and link.get("gbps") is not None and link["gbps"] < median_gbps * netcheck.SLOW_THROUGHPUT_FRACTION) or \
+                        (median_rtt and link.get("rtt_ms") is not None and link["rtt_ms"] > median_rtt * netcheck.SLOW_LATENCY_FACTOR):
+                    slow.append((sender, receiver))
+        return slow
+
+
+class Client:
+    """Python API for migs
+
+    One Client shares a GCloudWrapper (and its caches and rate limiters), the
+    VM inventory and the SSH config across calls, so a long-running process
+    can manage many clusters without paying CLI startup costs. Methods return
+    the records above and raise instead of printing.
+
+        client = Client()
+        vms = client.up("my-mig", count=4, name="train")
+        client.run(vms, "train.sh", torchrun=True)
+        client.down(vms)
+    """
+
+    def __init__(self, gcloud: Optional[GCloudWrapper] = None, storage: Optional[VMStorage] = None, ssh_config: Optional[SSHConfigManager] = None):
+        self.gcloud = gcloud or GCloudWrapper()
+        self.storage = storage or VMStorage()
+        self.ssh_config = ssh_config or SSHConfigManager()
+        self.bake_storage = BakeStorage()
+        self.journal = RequestJournal()
+        self.history = ProvisioningHistory()
+
+    def gcloud_for(self, vm) -> GCloudWrapper:
+        """The gcloud wrapper for the project a VM (record or inventory dict) lives in"""
+        project = vm.project if isinstance(vm, VM) else vm.get("project")
+        return self.gcloud.for_project(project)
+
+    def projects(self, projects: Optional[Sequence[str]] = None) -> List[Optional[str]]:
+        """Projects to scan: those given, else those in ~/.migs/config.json, else the active one (None)"""
+        return list(projects or []) or load_config().get("projects") or [None]
+
+    def for_each_project(self, projects: List[Optional[str]], fn: Callable[[GCloudWrapper], object]) -> Dict:
+        """Call fn(project_gcloud) for every project concurrently, returning {project: result}"""
+        with ThreadPoolExecutor(max_workers=max(len(projects), 1)) as executor:
+            futures = {project: executor.submit(fn, self.gcloud.for_project(project)) for project in projects}
+            return {project: future.result() for project, future in futures.items()}
+
+    @staticmethod
+    def group_by_project(vms: List) -> Dict[Optional[str], List]:
+        """Split VMs (records or inventory dicts) into {project: [vms]}"""
+        groups = {}
+        for vm in vms:
+            groups.setdefault(vm.project if isinstance(vm, VM) else vm.get("project"), []).append(vm)
+        return groups
+
+    # Inventory
+
+    def list_migs(self, projects: Optional[Sequence[str]] = None) -> List[MIG]:
+        """List MIGs in one or more projects, all projects at once"""
+        results = self.for_each_project(self.projects(projects), lambda pg: pg.list_migs())
+        return [
+            MIG(name=mig["name"], zone=mig["zone"], size=mig["size"], target_size=mig["targetSize"], project=mig.get("project"))
+            for project_migs in results.values()
+            for mig in project_migs
+        ]
+
+    def vms(self, projects: Optional[Sequence[str]] = None) -> List[VM]:
+        """List tracked VMs, optionally only those in the given projects"""
+        return [VM.from_dict(vm) for vm in self.storage.list_vms(list(projects) if projects else None)]
+
+    def get_vm(self, name: str) -> Optional[VM]:
+        """Look up a tracked VM by display name or instance name"""
+        vm_data = self.storage.get_vm(name)
+        return VM.from_dict(vm_data) if vm_data else None
+
+    def resolve(self, name: str, all: bool = False) -> List[VM]:
+        """Look up a VM, or with all=True every VM in its cluster or group"""
+        if all:
+            # First try to find cluster VMs
+            cluster_vms = self.storage.get_cluster_vms(name)
+            if cluster_vms:
+                return [VM.from_dict(vm) for vm in cluster_vms]
+
+        vm_data = self.storage.get_vm(name)
+        if not vm_data:
+            return []
+
+        if all and vm_data.get("group_id"):
+            return [VM.from_dict(vm) for vm in self.storage.get_vms_in_group(vm_data["group_id"]) or [vm_data]]
+        return [VM.from_dict(vm_data)]
+
+    def instance_states(self, vms: List) -> Optional[Dict[str, Dict]]:
+        """Live status of VMs, with one API call per project, all projects at once
+
+        Returns None if any project could not be queried.
+        """
+        if not vms:
+            return {}
+        by_project = self.group_by_project([vm.to_dict() if isinstance(vm, VM) else vm for vm in vms])
+        states = {}
+        for project_states in self.for_each_project(list(by_project), lambda pg: pg.list_instance_states(by_project[pg.project])).values():
+            if project_states is None:
+                return None
+            states.update(project_states)
+        return states
+
+    # Provisioning
+
+    def request_vms(self, mig_name: Optional[str] = None, count: int = 1, name: Optional[str] = None, zone: Optional[str] = None, duration: Optional[str] = None, stable: bool = False, project: Optional[str] = None, extra_migs: Sequence[str] = (), journal: bool = True) -> UpRequest:
+        """Submit resize requests for count VMs to one MIG, or to several to race them
+
+        Candidate MIGs whose request fails are recorded in UpRequest.skipped
+        when there are others to fall back on. With journal, the request is
+        written to ~/.migs/requests.json until all of its VMs are tracked, so
+        it can be resumed with wait() if this process goes away.
+        """
+        candidate_migs = ([mig_name] if mig_name else []) + [m for m in extra_migs if m != mig_name]
+        if not candidate_migs:
+            raise ValueError("Specify a MIG, or one or more --mig candidates")
+        if zone and len(candidate_migs) > 1:
+            raise ValueError("--zone can only be used with a single MIG")
+
+        project_gcloud = self.gcloud.for_project(project)
+        project = project_gcloud.project_id()
+
+        # Resolve zones for all candidates with a single MIG listing
+        if zone:
+            zones = {candidate_migs[0]: zone}
+        else:
+            mig_zones = project_gcloud.get_mig_zones()
+            zones = {}
+            for candidate in candidate_migs:
+                # get_mig_zone refreshes the catalog for MIGs created since it was cached
+                zones[candidate] = mig_zones.get(candidate) or project_gcloud.get_mig_zone(candidate)
+
+        username = os.getenv("USER", "user")
+        timestamp = int(time.time())
+
+        def generate_instance_names(candidate_mig):
+            if name:
+                # User provided a name
+                if count > 1:
+                    return [f"{name}{i}" for i in range(1, count + 1)]
+                return [name]
+            # Generate default names: <mig_name>_<username>_<id>
+            if count > 1:
+                return [f"{candidate_mig}-{username}-{timestamp}-{i}" for i in range(1, count + 1)]
+            return [f"{candidate_mig}-{username}-{timestamp}"]
+
+        request = UpRequest(candidates=[], count=count, name=name, project=project)
+        for candidate_mig in candidate_migs:
+            candidate_zone = zones[candidate_mig]
+            display_names = generate_instance_names(candidate_mig)
+            # Instance names are unique per zone, so with --name a second candidate
+            # racing in the same zone creates suffixed instances; its VMs are still
+            # called by the requested names
+            same_zone = sum(1 for candidate in request.candidates if candidate["zone"] == candidate_zone)
+            instance_names = [f"{instance}-r{same_zone + 1}" for instance in display_names] if name and same_zone else display_names
+
+            # Get initial instances before creating resize request (for multi-node detection)
+            initial_instances = project_gcloud.list_instances(candidate_mig, candidate_zone)
+            initial_instance_names = {inst["name"] for inst in initial_instances}
+
+            submitted = time.time()
+            try:
+                request_id, used_beta = project_gcloud.create_resize_request(
+                    candidate_mig, candidate_zone, count,
+                    run_duration=duration,
+                    instance_names=instance_names,
+                    force_mode="stable" if stable else None
+                )
+            except AuthenticationError:
+                raise
+            except Exception as e:
+                rejected = {"mig_name": candidate_mig, "zone": candidate_zone, "request_id": f"{candidate_mig}-rejected-{int(submitted * 1000)}", "submitted": submitted}
+                self._record_attempt(request, rejected, "failed", error=str(e))
+                if len(candidate_migs) == 1:
+                    raise
+                request.skipped[candidate_mig] = str(e)
+                continue
+
+            request.candidates.append({
+                "mig_name": candidate_mig,
+                "zone": candidate_zone,
+                "submitted": submitted,
+                "request_id": request_id,
+                "used_beta": used_beta,
+                "initial_instance_names": initial_instance_names,
+                "target_instance_names": instance_names if used_beta else None,
+                "instance_names": instance_names,
+                "display_names": display_names
+            })
+
+        if not request.candidates:
+            raise RuntimeError("Failed to create any resize request")
+
+        request.submitted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if journal:
+            request.pid = os.getpid()
+            self.journal.write(request.id, request.to_dict())
+        return request
+
+    def await_capacity(self, request: UpRequest, progress_callback: Optional[Callable[[], None]] = None) -> Dict:
+        """Pick the MIG that serves the request, racing the candidates if there are several"""
+        if request.winner is None:
+            if len(request.candidates) > 1:
+                try:
+                    request.winner = self.gcloud.for_project(request.project).race_resize_requests(request.candidates, request.count, progress_callback=progress_callback)
+                except AuthenticationError:
+                    raise
+                except Exception as e:
+                    for candidate in request.candidates:
+                        self._record_attempt(request, candidate, "failed", error=str(e))
+                    raise
+                for candidate in request.candidates:
+                    if candidate["request_id"] != request.winner["request_id"]:
+                        self._record_attempt(request, candidate, "lost")
+            else:
+                request.winner = request.candidates[0]
+            if self.journal.get(request.id):
+                # The losers are cancelled now, so a resumed wait must not race again
+                self.journal.write(request.id, request.to_dict())
+        return request.winner
+
+    def _record_attempt(self, request: UpRequest, candidate: Dict, outcome: str, vms: Sequence[Dict] = (), ready: Optional[List[float]] = None, error: Optional[str] = None):
+        """Add a resize request's outcome and timings to the provisioning history"""
+        submitted = candidate.get("submitted")
+        created = [vm["created"] for vm in vms if vm.get("created")]
+        self.history.record({
+            "id": candidate["request_id"],
+            "mig_name": candidate["mig_name"],
+            "zone": candidate["zone"],
+            "project": request.project,
+            "machine_type": next((vm["machine_type"] for vm in vms if vm.get("machine_type")), None),
+            "count": request.count,
+            "submitted": submitted,
+            "hour": time.localtime(submitted).tm_hour if submitted else None,
+            "outcome": outcome,
+            "capacity_seconds": round(max(created) - submitted, 1) if created and submitted else None,
+            "ready_seconds": ready,
+            "error": error,
+            "finished": time.time()
+        })
+
+    def _track_provisioning(self, request: UpRequest, vms: Iterator[Dict], watched: bool = True) -> Iterator[Dict]:
+        """Pass the winning MIG's VMs through, recording the attempt once all arrived or it failed
+
+        Ready times are only recorded when watched, i.e. someone was waiting
+        on the request since it was submitted.
+        """
+        winner = request.winner
+        seen = []
+        ready = []
+        try:
+            for vm in vms:
+                seen.append(vm)
+                if winner.get("submitted"):
+                    ready.append(round(time.time() - winner["submitted"], 1))
+                yield vm
+        except AuthenticationError:
+            raise
+        except Exception as e:
+            self._record_attempt(request, winner, "failed", seen, error=str(e))
+            raise
+        self._record_attempt(request, winner, "succeeded", seen, ready if watched and ready else None)
+
+    def iter_ready(self, request: UpRequest, progress_callback: Optional[Callable[[], None]] = None, resumed: bool = False) -> Iterator[VM]:
+        """Yield VMs as they become ready, tracking each in the inventory and SSH config right away"""
+        winner = self.await_capacity(request)
+        name = request.name
+        count = request.count
+        instance_names = winner["instance_names"]
+        display_names = dict(zip(instance_names, winner.get("display_names") or instance_names))
+        used_beta = winner["used_beta"]
+
+        vms = self._track_provisioning(request, self.gcloud.for_project(request.project).iter_ready_vms(
+            winner["mig_name"], winner["zone"], winner["request_id"], expected_count=count,
+            progress_callback=progress_callback,
+            initial_instance_names=winner["initial_instance_names"],
+            target_instance_names=winner["target_instance_names"]
+        ), watched=not resumed)
+        tracked = {vm["instance_name"]: vm for vm in self.storage.list_vms()}
+        # Names already given to this request's VMs, when resuming after an interruption
+        used_names = {vm["display_name"] for vm in tracked.values() if request.group_id and vm.get("group_id") == request.group_id}
+        for vm in vms:
+            if vm["name"] in tracked:
+                record = VM.from_dict(tracked[vm["name"]])
+                record.status = vm.get("status")
+                record.external_ip = vm.get("external_ip")
+                record.internal_ip = vm.get("internal_ip")
+                yield record
+                continue
+
+            # When using beta API with instance names, the VM already has the correct name
+            # When using stable API, we need to map custom names in order of arrival
+            if instance_names and used_beta:
+                vm_name = display_names.get(vm["name"], vm["name"])
+            elif name and count > 1:
+                vm_name = next(f"{name}{i}" for i in itertools.count(1) if f"{name}{i}" not in used_names)
+            else:
+                vm_name = name or vm["name"]
+            used_names.add(vm_name)
+
+            self.storage.save_vm(vm["name"], winner["mig_name"], winner["zone"], custom_name=vm_name, group_id=request.group_id, project=request.project)
+            self.ssh_config.add_vm_to_config(vm, custom_name=vm_name)
+            yield VM(
+                display_name=vm_name,
+                instance_name=vm["name"],
+                mig_name=winner["mig_name"],
+                zone=winner["zone"],
+                project=request.project,
+                group_id=request.group_id,
+                created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                status=vm.get("status"),
+                external_ip=vm.get("external_ip"),
+                internal_ip=vm.get("internal_ip")
+            )
+        self.journal.remove(request.id)
+
+    def up(self, mig_name: Optional[str] = None, count: int = 1, name: Optional[str] = None, zone: Optional[str] = None, duration: Optional[str] = None, stable: bool = False, project: Optional[str] = None, extra_migs: Sequence[str] = (), use_pool: bool = True, baked: bool = False, ssh_path: Optional[str] = None, fastest: bool = False, detach: bool = False, progress_callback: Optional[Callable[[str, Dict], None]] = None, on_ready: Optional[Callable[[VM], None]] = None) -> List[VM]:
+        """Create count VMs and wait until they are running
+
+        Standby VMs are claimed from a pool when one can serve the request,
+        unless a duration is given (pooled VMs have no deletion deadline).
+        With baked, the current bake of each MIG is provisioned instead.
+        With fastest, only the candidate MIG with the best recent time to
+        capacity is asked, along with candidates that have no history yet.
+        The SSH config uses the fastest network path unless ssh_path pins one.
+        With detach, the request is left running after it is submitted and
+        nothing is returned; resume it with wait(). Standby VMs claimed from a
+        pool are ready at once, so those are returned as usual.
+
+        progress_callback(event, info) follows the steps: "baked" (migs),
+        "claimed" (vms), "fastest" (best, p50s), "submitted" (request),
+        "racing" and one "race_tick" per poll while candidates race,
+        "capacity" (request), "waiting" per poll while VMs boot, then
+        "ssh_setup" (vms) and "ssh_ready" (host_keys) around the SSH config.
+        on_ready(vm) is called as each VM is tracked, before the rest are up,
+        so callers can start staging it right away.
+        """
+        def emit(event, **info):
+            if progress_callback:
+                progress_callback(event, info)
+
+        if baked:
+            mig_name, extra_migs, zone = self.baked_migs(mig_name, extra_migs, zone, project)
+            emit("baked", migs=([mig_name] if mig_name else []) + list(extra_migs))
+
+        request = None
+        claimed = self.claim_from_pool(mig_name, count, name, zone, project, extra_migs) if use_pool and not duration else []
+        if claimed:
+            emit("claimed", vms=claimed)
+            ready_vms = claimed
+        else:
+            if fastest:
+                candidates = ([mig_name] if mig_name else []) + [m for m in extra_migs if m != mig_name]
+                best, p50s = self.fastest_mig(candidates, project)
+                emit("fastest", best=best, p50s=p50s)
+                mig_name, extra_migs, zone = self.narrow_to_fastest(mig_name, extra_migs, zone, best, p50s)
+            request = self.request_vms(mig_name, count, name, zone, duration, stable, project, extra_migs)
+            emit("submitted", request=request)
+            if detach:
+                self.detach(request)
+                return []
+            if len(request.candidates) > 1:
+                emit("racing", request=request)
+            with self._waiting(request):
+                self.await_capacity(request, progress_callback=lambda: emit("race_tick"))
+            emit("capacity", request=request)
+            ready_vms = self.iter_ready(request, progress_callback=lambda: emit("waiting"))
+
+        vms = []
+        with self._waiting(request):
+            for vm in ready_vms:
+                vms.append(vm)
+                if on_ready:
+                    on_ready(vm)
+        if not vms:
+            return vms
+
+        emit("ssh_setup", vms=vms)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Claimed standby VMs had their host keys recorded when they were claimed
+            trusted = executor.submit(self.trust_host_keys, vms) if request else None
+            paths = executor.submit(self.select_paths, vms, ssh_path)
+            host_keys = trusted.result() if trusted else {vm.display_name: True for vm in vms}
+            paths.result()
+        emit("ssh_ready", host_keys=host_keys)
+        return vms
+
+    def down(self, vms: List[VM]) -> Dict[str, bool]:
+        """Delete VMs, one API call per (MIG, zone) and all projects at once
+
+        Deleted VMs are removed from the inventory and SSH config. Returns a
+        dict of display name to success.
+        """
+        by_project = self.group_by_project([vm.to_dict() for vm in vms])
+        deleted = {}
+        for project_results in self.for_each_project(list(by_project), lambda pg: pg.delete_vms(by_project[pg.project])).values():
+            deleted.update(project_results)
+
+        results = {vm.display_name: bool(deleted.get(vm.instance_name)) for vm in vms}
+        # Clean up storage and SSH config in one write each
+        removed = [display_name for display_name, ok in results.items() if ok]
+        self.storage.remove_vms(removed)
+        self.ssh_config.remove_vms_from_config(removed)
+        return results
+
+    def sync(self, projects: Optional[Sequence[str]] = None, discover: bool = False) -> SyncResult:
+        """Reconcile the inventory with GCP, and optionally find untracked VMs in MIGs
+
+        Each project is read with a single instances list call, and all
+        projects are read at once.
+        """
+        projects = self.projects(projects)
+        vms = self.storage.list_vms()
+        result = SyncResult()
+
+        # One snapshot per project covers both the tracked VMs and discovery
+        snapshot_projects = {vm.get("project") for vm in vms}
+        if discover:
+            snapshot_projects.update(projects)
+        snapshots = self.for_each_project(list(snapshot_projects), lambda pg: pg.snapshot_instances()) if snapshot_projects else {}
+        result.failed_projects = [project for project in snapshot_projects if snapshots.get(project) is None]
+
+        for vm in vms:
+            record = VM.from_dict(vm)
+            snapshot = snapshots.get(vm.get("project"))
+            if snapshot is None:
+                result.skipped.append(record)
+                continue
+
+            instance_info = snapshot.get(vm["instance_name"], vm["zone"])
+            if not instance_info:
+                result.removed.append(record)
+                continue
+
+            if not vm.get("project"):
+                # Tracked before projects were recorded; it was found in the active project
+                record.project = self.gcloud.project_id()
+                self.storage.set_vm_project(vm["display_name"], record.project)
+            self.ssh_config.add_vm_to_config(instance_info, custom_name=vm["display_name"], path=vm.get("ssh_path"))
+            record.status = instance_info["status"]
+            record.external_ip = instance_info.get("external_ip")
+            record.internal_ip = instance_info.get("internal_ip")
+            result.updated.append(record)
+
+        removed = [vm.display_name for vm in result.removed]
+        self.storage.remove_vms(removed)
+        self.ssh_config.remove_vms_from_config(removed)
+
+        if discover:
+            # Standby pool VMs are tracked too, just not claimed yet
+            tracked_instances = {vm["instance_name"] for vm in vms + self.storage.list_pooled_vms()}
+            for project in projects:
+                snapshot = snapshots.get(project)
+                if snapshot is None:
+                    continue
+                project_id = self.gcloud.for_project(project).project_id()
+                for instance in snapshot.managed():
+                    if instance["name"] not in tracked_instances:
+                        result.untracked.append(VM(
+                            display_name=instance["name"],
+                            instance_name=instance["name"],
+                            mig_name=instance["mig_name"],
+                            zone=instance["zone"],
+                            project=project_id,
+                            status=instance["status"],
+                            external_ip=instance.get("external_ip"),
+                            internal_ip=instance.get("internal_ip")
+                        ))
+            result.untracked.sort(key=lambda vm: (vm.project or "", vm.mig_name, vm.zone, vm.instance_name))
+        return result
+
+    def claim(self, vm: VM, custom_name: Optional[str] = None) -> VM:
+        """Start tracking a discovered VM"""
+        self.storage.save_vm(vm.instance_name, vm.mig_name, vm.zone, custom_name=custom_name, project=vm.project)
+        self.ssh_config.add_vm_to_config({
+            "name": vm.instance_name,
+            "zone": vm.zone,
+            "project": vm.project,
+            "external_ip": vm.external_ip,
+            "internal_ip": vm.internal_ip,
+            "username": self.gcloud_for(vm).get_ssh_username()
+        }, custom_name=custom_name)
+        claimed = self.get_vm(custom_name or vm.instance_name)
+        self.trust_host_keys([claimed], timeout=0)
+        return claimed
+
+    def trust_host_keys(self, vms: List[VM], timeout: float = HOST_KEY_TIMEOUT) -> Dict[str, bool]:
+        """Record the SSH host keys of many VMs at once, so plain ssh never prompts for them
+
+        Keys come from each VM's hostkeys guest attributes, fetched for all VMs
+        concurrently (waiting up to timeout seconds for freshly booted ones)
+        and written to the migs known_hosts file in one go. Returns
+        {display_name: whether keys were found}.
+        """
+        keys = self._each_vm(vms, lambda vm: self.gcloud_for(vm).get_host_keys(vm.instance_name, vm.zone, timeout))
+        self.ssh_config.set_host_keys({display_name: host_keys for display_name, host_keys in keys.items() if host_keys})
+        return {display_name: bool(host_keys) for display_name, host_keys in keys.items()}
+
+    def select_paths(self, vms: List[VM], path: Optional[str] = None) -> Dict[str, Dict[str, Optional[float]]]:
+        """Point each VM's SSH config entry at the fastest network path that works
+
+        Every path (internal IP, external IP, the bastion from config.json and,
+        as a last resort, IAP) is timed for all VMs at once. Passing a path
+        pins it instead of measuring, and "auto" unpins. VMs pinned earlier
+        are left alone. Returns the RTTs in seconds measured for each VM.
+        """
+        if path not in (None, "auto") and path not in netpath.PATHS:
+            raise ValueError(f"Unknown path '{path}', expected auto or one of: {', '.join(netpath.PATHS)}")
+        bastion = load_config().get("bastion")
+        if bastion:
+            self.ssh_config.set_bastion(netpath.parse_bastion(bastion))
+        elif path == "bastion":
+            raise ValueError('No bastion configured, set "bastion": "[user@]host[:port]" in ~/.migs/config.json')
+
+        pinned = {vm["display_name"] for vm in self.storage.list_vms() if vm.get("ssh_path_pinned")}
+        if path is None:
+            vms = [vm for vm in vms if vm.display_name not in pinned]
+        states = self.instance_states(vms) or {}
+        for vm in vms:
+            vm.external_ip = states.get(vm.instance_name, {}).get("external_ip", vm.external_ip)
+            vm.internal_ip = states.get(vm.instance_name, {}).get("internal_ip", vm.internal_ip)
+
+        if path in (None, "auto"):
+            rtts = self._each_vm(vms, lambda vm: netpath.measure_paths(vm.to_dict(), bool(bastion)))
+        else:
+            rtts = {vm.display_name: {} for vm in vms}
+        for vm in vms:
+            chosen = netpath.fastest(rtts[vm.display_name]) if path in (None, "auto") else path
+            if chosen is None:
+                continue
+            vm.ssh_path = chosen
+            self.storage.set_vm_ssh_path(vm.display_name, chosen, pinned=path not in (None, "auto"))
+            self.ssh_config.add_vm_to_config({
+                "name": vm.instance_name,
+                "zone": vm.zone,
+                "project": vm.project,
+                "external_ip": vm.external_ip,
+                "internal_ip": vm.internal_ip,
+                "username": self.gcloud_for(vm).get_ssh_username()
+            }, custom_name=vm.display_name, path=chosen)
+        return rtts
+
+    # Standby pools
+
+    def _pool_target(self, mig_name: str, zone: Optional[str], project: Optional[str]) -> Tuple[GCloudWrapper, str, Optional[str]]:
+        """Resolve the gcloud wrapper, zone and project ID a pool is keyed by"""
+        project_gcloud = self.gcloud.for_project(project)
+        zone = zone or project_gcloud.get_mig_zone(mig_name)
+        if not zone:
+            raise ValueError(f"Could not find zone for MIG: {mig_name}")
+        return project_gcloud, zone, project_gcloud.project_id()
+
+    def pools(self) -> List[Pool]:
+        """List standby pools with the VMs currently waiting in each"""
+        standby = self.storage.list_pooled_vms()
+        return [
+            Pool(
+                mig_name=target["mig_name"],
+                zone=target["zone"],
+                project=target["project"],
+                size=target["size"],
+                standby=sorted(
+                    vm["instance_name"] for vm in standby
+                    if (vm["mig_name"], vm["zone"], vm["project"]) == (target["mig_name"], target["zone"], target["project"])
+                )
+            )
+            for target in self.storage.list_pools()
+        ]
+
+    def fill_pool(self, mig_name: str, size: Optional[int] = None, zone: Optional[str] = None, project: Optional[str] = None, stable: bool = False, on_ready: Optional[Callable[[str], None]] = None) -> Pool:
+        """Bring a MIG's standby pool to its target size, deleting any surplus
+
+        With size None the stored target is kept. Standby VMs that stopped or
+        disappeared are dropped first, and each new VM joins the pool once it
+        accepts SSH. Only one fill runs per pool at a time; raises RuntimeError
+        if another is already running.
+        """
+        project_gcloud, zone, project = self._pool_target(mig_name, zone, project)
+        if size is not None:
+            self.storage.set_pool_size(mig_name, zone, project, size)
+
+        lock_name = re.sub(r'[^a-zA-Z0-9_.-]', '_', f"pool-{project}-{zone}-{mig_name}.lock")
+        with open(self.storage.storage_dir / lock_name, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError(f"The pool for {mig_name} is already being filled")
+
+            self._prune_pool(project_gcloud, mig_name, zone, project)
+            # Claims and size changes can happen while VMs boot, so keep going until the pool matches
+            while True:
+                target = self.storage.get_pool_size(mig_name, zone, project)
+                standby = self.storage.list_pooled_vms(mig_name, zone, project)
+                if len(standby) > target:
+                    surplus = self.storage.take_pooled_vms([vm["instance_name"] for vm in standby[target:]])
+                    project_gcloud.delete_vms(surplus)
+                    break
+                if len(standby) == target or not self._add_standby(project_gcloud, mig_name, zone, project, target - len(standby), stable, on_ready):
+                    break
+
+        standby = self.storage.list_pooled_vms(mig_name, zone, project)
+        return Pool(mig_name=mig_name, zone=zone, project=project, size=self.storage.get_pool_size(mig_name, zone, project), standby=sorted(vm["instance_name"] for vm in standby))
+
+    def _prune_pool(self, project_gcloud: GCloudWrapper, mig_name: str, zone: str, project: Optional[str]):
+        """Drop standby VMs that are no longer running, deleting those that still exist"""
+        standby = self.storage.list_pooled_vms(mig_name, zone, project)
+        states = project_gcloud.list_instance_states(standby)
+        if not standby or states is None:
+            return
+        gone = [vm for vm in standby if states.get(vm["instance_name"], {}).get("status") != "RUNNING"]
+        self.storage.take_pooled_vms([vm["instance_name"] for vm in gone])
+        stopped = [vm for vm in gone if vm["instance_name"] in states]
+        if stopped:
+            project_gcloud.delete_vms(stopped)
+
+    def _add_standby(self, project_gcloud: GCloudWrapper, mig_name: str, zone: str, project: Optional[str], count: int, stable: bool, on_ready: Optional[Callable[[str], None]]) -> int:
+        """Create count VMs and pool each one as soon as it accepts SSH; returns how many joined"""
+        request = self.request_vms(mig_name, count, zone=zone, stable=stable, project=project, journal=False)
+        winner = self.await_capacity(request)
+        username = project_gcloud.get_ssh_username()
+        pool_lock = threading.Lock()
+
+        def stage(vm):
+            node = {"display_name": vm["name"], "instance_name": vm["name"], "zone": zone, "external_ip": vm.get("external_ip"), "internal_ip": vm.get("internal_ip"), "project": project}
+            if wait_for_node(project_gcloud, node, timeout=STANDBY_READY_TIMEOUT)["state"] != "ready":
+                # Never hand out a VM that can't be reached within the whole timeout, and don't leave it running either
+                project_gcloud.delete_vms([{"instance_name": vm["name"], "mig_name": mig_name, "zone": zone}])
+                return False
+            with pool_lock:
+                self.storage.add_pooled_vm(vm["name"], mig_name, zone, project, vm.get("external_ip"), vm.get("username") or username, vm.get("internal_ip"))
+            if on_ready:
+                on_ready(vm["name"])
+            return True
+
+        vms = self._track_provisioning(request, project_gcloud.iter_ready_vms(
+            mig_name, zone, winner["request_id"], expected_count=count,
+            initial_instance_names=winner["initial_instance_names"],
+            target_instance_names=winner["target_instance_names"]
+        ))
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(stage, vm) for vm in vms]
+            return sum(1 for future in futures if future.result())
+
+    def claim_from_pool(self, mig_name: Optional[str] = None, count: int = 1, name: Optional[str] = None, zone: Optional[str] = None, project: Optional[str] = None, extra_migs: Sequence[str] = (), refill: bool = True) -> List[VM]:
+        """Claim count standby VMs from the first candidate MIG whose pool has enough
+
+        Claimed VMs are named and grouped the way up() would name them, and are
+        tracked in the inventory and SSH config without waiting on any API
+        call. With refill, a detached process tops the pool back up. Returns
+        [] if no pool can serve the whole request.
+        """
+        standby = self.storage.list_pooled_vms()
+        if not standby:
+            return []
+        project = self.gcloud.for_project(project).project_id()
+
+        for candidate in ([mig_name] if mig_name else []) + [m for m in extra_migs if m != mig_name]:
+            pooled = [vm for vm in standby if vm["mig_name"] == candidate and vm["project"] == project and zone in (None, vm["zone"])]
+            if len(pooled) < count:
+                continue
+
+            # A quick port probe over every known address weeds out VMs that went away since they were pooled
+            with ThreadPoolExecutor(max_workers=min(32, len(pooled))) as executor:
+                reachable = [vm for vm, host in zip(pooled, executor.map(lambda vm: probe_any(ssh_hosts(vm), timeout=2), pooled)) if host]
+            taken = self.storage.take_pooled_vms([vm["instance_name"] for vm in reachable[:count]])
+            if len(taken) < count:
+                # Another claim got there first; put back what we took
+                for vm in taken:
+                    self.storage.add_pooled_vm(vm["instance_name"], vm["mig_name"], vm["zone"], vm["project"], vm["external_ip"], vm["username"], vm.get("internal_ip"))
+                continue
+
+            group_id = f"{candidate}-pool-{int(time.time())}" if count > 1 else None
+            claimed = []
+            for idx, vm in enumerate(sorted(taken, key=lambda vm: vm["instance_name"]), 1):
+                vm_name = f"{name}{idx}" if name and count > 1 else name or vm["instance_name"]
+                self.storage.save_vm(vm["instance_name"], candidate, vm["zone"], custom_name=vm_name, group_id=group_id, project=project)
+                self.ssh_config.add_vm_to_config({
+                    "name": vm["instance_name"],
+                    "zone": vm["zone"],
+                    "project": project,
+                    "external_ip": vm["external_ip"],
+                    "internal_ip": vm.get("internal_ip"),
+                    "username": vm["username"]
+                }, custom_name=vm_name)
+                claimed.append(VM(
+                    display_name=vm_name,
+                    instance_name=vm["instance_name"],
+                    mig_name=candidate,
+                    zone=vm["zone"],
+                    project=project,
+                    group_id=group_id,
+                    created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    status="RUNNING",
+                    external_ip=vm["external_ip"],
+                    internal_ip=vm.get("internal_ip")
+                ))
+            if refill:
+                self.refill_pool_in_background(candidate, taken[0]["zone"], project)
+            # Standby VMs are SSH-ready, so their keys are already published
+            self.trust_host_keys(claimed, timeout=0)
+            return claimed
+        return []
+
+    def refill_pool_in_background(self, mig_name: str, zone: str, project: Optional[str] = None):
+        """Top a pool back up to its target from a detached process, logging to ~/.migs/pool.log"""
+        cmd = [sys.executable, "-m", "migs.cli", "pool", mig_name, "--zone", zone, "--refill"]
+        if project:
+            cmd += ["--project", project]
+        log_file = open(self.storage.storage_dir / "pool.log", "a")
+        subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log_file, stderr=log_file, start_new_session=True)
+        log_file.close()
+
+    # Request journal
+
+    def pending_requests(self) -> List[UpRequest]:
+        """Journaled requests whose VMs are not all tracked yet, oldest first
+
+        Entries that can't be read back, e.g. from a hand-edited journal, are skipped.
+        """
+        requests = []
+        for entry in self.journal.list_entries():
+            try:
+                requests.append(UpRequest.from_dict(entry))
+            except (KeyError, TypeError):
+                continue
+        return requests
+
+    def get_request(self, request_id: str) -> Optional[UpRequest]:
+        entry = self.journal.get(request_id)
+        return UpRequest.from_dict(entry) if entry else None
+
+    def detach(self, request: UpRequest):
+        """Leave a submitted request for a later wait() or recover()"""
+        request.pid = None
+        self.journal.write(request.id, request.to_dict())
+
+    @contextlib.contextmanager
+    def _waiting(self, request: Optional[UpRequest]):
+        """Detach a journaled request if waiting on it stops early
+
+        The recorded waiter PID can outlive the wait, e.g. when the wait ran
+        in the daemon for a client that was interrupted, and would otherwise
+        keep the request from ever being treated as orphaned.
+        """
+        try:
+            yield
+        except BaseException:
+            if request and self.journal.get(request.id):
+                self.detach(request)
+            raise
+
+    @staticmethod
+    def is_orphaned(request: UpRequest) -> bool:
+        """True if no live process is waiting on a journaled request"""
+        if not request.pid:
+            return True
+        try:
+            os.kill(request.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def request_states(self, request: UpRequest) -> Dict[str, Optional[str]]:
+        """Resize request state of the winner, or of every candidate while they race"""
+        candidates = [request.winner] if request.winner else request.candidates
+        project_gcloud = self.gcloud.for_project(request.project)
+        return {
+            candidate["mig_name"]: project_gcloud.get_resize_request_state(candidate["mig_name"], candidate["zone"], candidate["request_id"])
+            for candidate in candidates
+        }
+
+    def wait(self, request: UpRequest, progress_callback: Optional[Callable[[], None]] = None, setup_ssh: bool = True) -> List[VM]:
+        """Resume a journaled request, tracking its VMs as they come up
+
+        Without setup_ssh, only host keys already published are recorded and
+        network paths are not measured, so nothing waits on the VMs' guests.
+        """
+        request.pid = os.getpid()
+        self.journal.write(request.id, request.to_dict())
+        with self._waiting(request):
+            vms = list(self.iter_ready(request, progress_callback=progress_callback, resumed=True))
+        if setup_ssh:
+            self.trust_host_keys(vms)
+            self.select_paths(vms)
+        else:
+            self.trust_host_keys(vms, timeout=0)
+        return vms
+
+    def recover(self) -> Tuple[List[VM], List[UpRequest], Dict[str, str]]:
+        """Finish orphaned requests that have succeeded since, and drop those that failed
+
+        Requests still being provisioned are left alone. Recovered VMs are
+        only tracked (see wait(setup_ssh=False)), since this runs as part of
+        quick commands like sync; `migs path` picks their network paths later.
+        Returns the VMs now tracked, the requests that were dropped, and the
+        error for each request that could not be checked.
+        """
+        recovered = []
+        dropped = []
+        errors = {}
+        for request in self.pending_requests():
+            if not self.is_orphaned(request):
+                continue
+            try:
+                states = self.request_states(request)
+                if "SUCCEEDED" in states.values():
+                    recovered.extend(self.wait(request, setup_ssh=False))
+                elif all(state in ("FAILED", "CANCELLED") for state in states.values()):
+                    self.journal.remove(request.id)
+                    dropped.append(request)
+            except AuthenticationError:
+                raise
+            except Exception as e:
+                errors[request.id] = str(e)
+        return recovered, dropped, errors
+
+    # Provisioning history
+
+    def provisioning_stats(self, by: str = "mig", days: Optional[float] = None) -> List[Dict]:
+        """Time-to-capacity and time-to-ready percentiles per MIG, zone, machine type or hour of day"""
+        if by not in metrics.GROUPINGS:
+            raise ValueError(f"Unknown grouping '{by}', expected one of: {', '.join(metrics.GROUPINGS)}")
+        return metrics.summarize(self.history.list_entries(), by, days)
+
+    def fastest_mig(self, candidates: Sequence[str], project: Optional[str] = None) -> Tuple[Optional[str], Dict[str, Optional[float]]]:
+        """The candidate MIG with the best recent median time to capacity
+
+        Returns the MIG, or None if no candidate has a successful recent
+        history, along with every candidate's recent median (None without
+        history).
+        """
+        project = self.gcloud.for_project(project).project_id()
+        attempts = self.history.list_entries()
+        p50s = {mig: metrics.recent_p50(attempts, mig, project) for mig in candidates}
+        ranked = [mig for mig in candidates if p50s[mig] is not None and p50s[mig] != float("inf")]
+        return (min(ranked, key=lambda mig: p50s[mig]) if ranked else None), p50s
+
+    @staticmethod
+    def narrow_to_fastest(mig_name: Optional[str], extra_migs: Sequence[str], zone: Optional[str], best: Optional[str], p50s: Dict[str, Optional[float]]) -> Tuple[str, List[str], Optional[str]]:
+        """Narrow a set of candidate MIGs to the ranking from fastest_mig
+
+        The fastest MIG is kept, along with candidates that have no history yet,
+        so they still get tried. Everything is kept if there is no history at all.
+        """
+        candidates = ([mig_name] if mig_name else []) + [m for m in extra_migs if m != mig_name]
+        if not best:
+            return mig_name, list(extra_migs), zone
+        untried = [mig for mig in candidates if mig != best and p50s.get(mig) is None]
+        # zone only ever applied to the first candidate
+        return best, untried, zone if best == candidates[0] else None
+
+    # Job queue
+
+    def _queues(self, vms: List[VM]) -> Dict[str, Optional[Dict]]:
+        """Every VM's queue listing at once, None for VMs that couldn't be reached"""
+        return self._each_vm(vms, lambda vm: self.gcloud_for(vm).list_jobs(vm.instance_name, vm.zone))
+
+    def jobs(self, vms: List[VM]) -> Dict[str, Optional[List[Job]]]:
+        """Jobs queued, running and finished on each VM, keyed by display name"""
+        return {
+            node: [Job(node=node, **job) for job in listing["jobs"]] if listing else None
+            for node, listing in self._queues(vms).items()
+        }
+
+    def submit(self, vms: List[VM], script_path: str, gpus: int = 1, script_args: Optional[List[str]] = None, name: Optional[str] = None, env_file: Optional[str] = None, refresh: bool = False) -> Job:
+        """Queue a script on a VM, or on the least loaded VM of a cluster
+
+        Each node runs queued jobs as GPUs free up, giving each job its own
+        CUDA_VISIBLE_DEVICES slice of gpus GPUs.
+        """
+        if not os.path.exists(script_path):
+            raise FileNotFoundError(f"Script file '{script_path}' not found")
+
+        target = vms[0]
+        if len(vms) > 1:
+            queues = self._queues(vms)
+            fits = [vm for vm in vms if queues.get(vm.display_name) and queues[vm.display_name]["gpus"] >= gpus]
+            if not fits:
+                raise RuntimeError(f"No reachable node has {gpus} GPUs")
+            target = max(fits, key=lambda vm: jobqueue.free_gpus(queues[vm.display_name]))
+
+        job_id = self.gcloud_for(target).submit_job(script_path, target.instance_name, target.zone, gpus, script_args, env_file, name, refresh)
+        return Job(id=job_id, node=target.display_name, state="queued", gpus=gpus, name=name or "", submitted=int(time.time()))
+
+    def cancel_job(self, vms: List[VM], job_id: str) -> Dict[str, bool]:
+        """Cancel a queued or running job on whichever of the VMs holds it"""
+        return self._each_vm(vms, lambda vm: self.gcloud_for(vm).cancel_job(vm.instance_name, vm.zone, job_id))
+
+    # Bakes
+
+    def bake(self, vm: VM, name: str, mig_name: Optional[str] = None, on_step: Optional[Callable[[str], None]] = None) -> Bake:
+        """Capture a set-up VM so later nodes boot already provisioned
+
+        Creates an image of the VM's boot disk (named name, in an image family
+        named after the source MIG), an instance template named name with the
+        VM's configuration booting from that image, and an empty MIG (mig_name,
+        default name) in the VM's zone. The bake becomes the current one for
+        the source MIG, which up(baked=True) provisions from.
+        """
+        vm_gcloud = self.gcloud_for(vm)
+        project = vm_gcloud.project_id()
+        mig_name = mig_name or name
+
+        def step(description):
+            if on_step:
+                on_step(description)
+
+        step(f"Flushing disks on {vm.display_name}")
+        vm_gcloud.flush_disks(vm.instance_name, vm.zone)
+        boot_disk = vm_gcloud.get_boot_disk(vm.instance_name, vm.zone)
+        if not boot_disk:
+            raise RuntimeError(f"Could not find the boot disk of {vm.display_name}")
+
+        step(f"Creating image {name}")
+        vm_gcloud.create_image(name, boot_disk["disk_name"], vm.zone, family=vm.mig_name)
+        step(f"Creating instance template {name}")
+        vm_gcloud.create_instance_template(name, vm.instance_name, vm.zone, name, boot_disk["device_name"])
+        step(f"Creating MIG {mig_name}")
+        vm_gcloud.create_mig(mig_name, name, vm.zone, like_mig=vm.mig_name)
+
+        bake = Bake(
+            name=name,
+            source_mig=vm.mig_name,
+            zone=vm.zone,
+            project=project,
+            image=name,
+            template=name,
+            mig=mig_name,
+            source_vm=vm.instance_name,
+            created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            current=True
+        )
+        self.bake_storage.record(asdict(bake))
+        return bake
+
+    def bakes(self) -> List[Bake]:
+        """List bakes, flagging the current one of each source MIG"""
+        return sorted((Bake.from_dict(bake) for bake in self.bake_storage.list_bakes()), key=lambda bake: (bake.source_mig, bake.created_at or ""))
+
+    def use_bake(self, name: str) -> Bake:
+        """Make an earlier bake the current one for its source MIG"""
+        bake = self.bake_storage.set_current(name)
+        if not bake:
+            raise ValueError(f"Bake '{name}' not found")
+        return Bake.from_dict(dict(bake, current=True))
+
+    def baked_migs(self, mig_name: Optional[str], extra_migs: Sequence[str] = (), zone: Optional[str] = None, project: Optional[str] = None) -> Tuple[Optional[str], List[str], Optional[str]]:
+        """Swap each candidate MIG for the MIG of its current bake
+
+        Returns (mig_name, extra_migs, zone), with the zone filled in from the
+        bake for a single MIG. Raises ValueError for a MIG that was never baked.
+        """
+        project = self.gcloud.for_project(project).project_id()
+
+        def baked(source_mig):
+            bake = self.bake_storage.current(source_mig, project)
+            if not bake:
+                raise ValueError(f"MIG '{source_mig}' has no bake, create one with: migs bake <vm> --template NAME")
+            return bake
+
+        baked_mig = baked(mig_name) if mig_name else None
+        baked_extra = [baked(m) for m in extra_migs]
+        if baked_mig and not baked_extra and not zone:
+            zone = baked_mig["zone"]
+        return (baked_mig["mig"] if baked_mig else None), [bake["mig"] for bake in baked_extra], zone
+
+    # Files and scripts
+
+    def _each_vm(self, vms: List[VM], fn: Callable[[VM], bool]) -> Dict[str, bool]:
+        """Run fn on every VM concurrently, returning {display_name: result}"""
+        if not vms:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(32, len(vms))) as executor:
+            futures = {vm.display_name: executor.submit(fn, vm) for vm in vms}
+            return {display_name: future.result() for display_name, future in futures.items()}
+
+    def upload(self, vms: List[VM], local_path: str, remote_path: Optional[str] = None, parallel: Optional[int] = None, on_progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, bool]:
+        """Copy a local file or directory to every VM at once
+
+        With parallel, a single large file is sent over that many SSH streams
+        per VM, checksummed and resumable (see GCloudWrapper.parallel_upload).
+        on_progress(display_name, bytes_done, total_bytes) follows each VM.
+        """
+        if not os.path.exists(local_path):
+            raise FileNotFoundError(f"Local path '{local_path}' not found")
+        if not parallel:
+            return self._each_vm(vms, lambda vm: self.gcloud_for(vm).scp_to_vm(local_path, vm.instance_name, vm.zone, remote_path))
+        if not os.path.isfile(local_path):
+            raise ValueError("Parallel transfers are for single files")
+        return self._each_vm(vms, lambda vm: self.gcloud_for(vm).parallel_upload(
+            local_path, vm.instance_name, vm.zone, remote_path, parallel,
+            functools.partial(on_progress, vm.display_name) if on_progress else None
+        ))
+
+    def download(self, vm: VM, remote_path: str, local_path: Optional[str] = None, parallel: Optional[int] = None, on_progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Copy a file or directory from a VM, or a single large file over parallel SSH streams"""
+        if parallel:
+            return self.gcloud_for(vm).parallel_download(remote_path, vm.instance_name, vm.zone, local_path, parallel, on_progress)
+        return self.gcloud_for(vm).scp_from_vm(remote_path, vm.instance_name, vm.zone, local_path)
+
+    def torchrun_env(self, vms: List[VM]) -> Dict[str, str]:
+        """Shared torchrun rendezvous settings for a multi-node run, with the first VM as head"""
+        head_vm = vms[0]
+        head_details = self.gcloud_for(head_vm).get_instance_internal_details(head_vm.instance_name, head_vm.zone)
+        if not head_details:
+            raise RuntimeError(f"Failed to get internal details for head node '{head_vm.display_name}'")
+        return {
+            "HEAD_NODE_IP": head_details["internal_ip"],
+            "HEAD_NODE_PORT": str(netcheck.RENDEZVOUS_PORT),
+            "NNODES": str(len(vms)),
+            "NPROC_PER_NODE": str(head_details["gpu_count"])
+        }
+
+    def network_check(self, vms: List[VM], ring: bool = False, port: int = netcheck.RENDEZVOUS_PORT) -> NetworkCheck:
+        """Measure latency and throughput between the VMs over their internal IPs
+
+        Every node listens on port (the torchrun rendezvous port by default)
+        and sends to one peer per round at agreed wall-clock times, so pairs
+        never compete for bandwidth. All-pairs takes one round per node; a
+        ring is a single round where each node sends to the next. All probes
+        run at once however many nodes there are, since a node that starts
+        late would miss its rounds.
+        """
+        vms = sorted(vms, key=lambda vm: vm.display_name)
+        if len(vms) < 2:
+            raise ValueError("A network check needs at least two VMs")
+        states = self.instance_states(vms)
+        if states is None:
+            raise RuntimeError("Could not look up the VMs' internal IPs")
+        ips = {vm.display_name: (states.get(vm.instance_name) or {}).get("internal_ip") or vm.internal_ip for vm in vms}
+        missing = [display_name for display_name, ip in ips.items() if not ip]
+        if missing:
+            raise RuntimeError(f"No internal IP for {', '.join(missing)}")
+
+        names = [vm.display_name for vm in vms]
+        rounds = netcheck.schedule(len(vms), ring)
+        start = time.time() + netcheck.START_LEAD + LAUNCH_LEAD_PER_NODE * len(vms)
+
+        def probe(vm):
+            idx = names.index(vm.display_name)
+            sends = [[rnd, names[peers[idx]], ips[names[peers[idx]]]] for rnd, peers in enumerate(rounds) if peers[idx] is not None]
+            return self.gcloud_for(vm).network_probe(vm.instance_name, vm.zone, port, start, len(rounds), sends)
+
+        with ThreadPoolExecutor(max_workers=len(vms)) as executor:
+            futures = {vm.display_name: executor.submit(probe, vm) for vm in vms}
+            probes = {display_name: future.result() for display_name, future in futures.items()}
+        return NetworkCheck(
+            nodes=names,
+            port=port,
+            ring=ring,
+            links={display_name: result["links"] for display_name, result in probes.items() if result},
+            listening={display_name: result["listening"] if result else None for display_name, result in probes.items()}
+        )
+
+    def run(self, vms: List[VM], script_path: str, script_args: Optional[List[str]] = None, session: Optional[str] = None, torchrun: bool = False, env_file: Optional[str] = None, refresh: bool = False) -> RunResult:
+        """Start a script in a tmux session on every VM at once
+
+        VMs are ordered by display name. With torchrun and several VMs, each
+        node gets the rendezvous settings plus its NODE_RANK (0 for the head),
+        and the launch is synchronized: every node is staged first and held at
+        a barrier, then all of them are released to start at the same
+        wall-clock time. If any node fails to stage, none are started, since
+        rendezvous would only hang waiting for it. The start time each node
+        recorded is returned in start_times.
+
+        The start time is set by the head node's clock, read right before the
+        release, since each node compares it with its own clock and GCE VMs
+        are kept in sync while this machine's clock may not be.
+        """
+        if not os.path.exists(script_path):
+            raise FileNotFoundError(f"Script file '{script_path}' not found")
+
+        vms = sorted(vms, key=lambda vm: vm.display_name)
+        # Use the same session name for all VMs (they're on different machines)
+        vm_session = session or re.sub(r'[^a-zA-Z0-9_-]', '_', os.path.basename(script_path))
+        torchrun_env = self.torchrun_env(vms) if torchrun and len(vms) > 1 else None
+        ranks = {vm.display_name: idx for idx, vm in enumerate(vms)}
+
+        def launch(vm):
+            node_env = None
+            if torchrun_env:
+                node_env = dict(torchrun_env, NODE_RANK=str(ranks[vm.display_name]))
+            return self.gcloud_for(vm).run_script(script_path, vm.instance_name, vm.zone, vm_session, script_args, env_file, node_env, refresh, barrier=bool(torchrun_env))
+
+        staged = self._each_vm(vms, launch)
+        if not torchrun_env:
+            return RunResult(session=vm_session, results=staged, torchrun_env=torchrun_env)
+
+        head = vms[0]
+        asked = time.time()
+        head_now = self.gcloud_for(head).remote_time(head.instance_name, head.zone) if all(staged.values()) else None
+        if head_now is None:
+            self._each_vm([vm for vm in vms if staged[vm.display_name]], lambda vm: self.gcloud_for(vm).release_launch(vm.instance_name, vm.zone, vm_session, None))
+            return RunResult(session=vm_session, results={display_name: False for display_name in staged}, torchrun_env=torchrun_env)
+        # How far the head node's clock is ahead of ours, taking the reading as halfway through the round trip
+        skew = head_now - (asked + time.time()) / 2
+
+        # Leave enough time for every release to land first, so no node starts late
+        start_at = time.time() + skew + LAUNCH_LEAD + LAUNCH_LEAD_PER_NODE * len(vms)
+        released = self._each_vm(vms, lambda vm: self.gcloud_for(vm).release_launch(vm.instance_name, vm.zone, vm_session, start_at))
+        start_times = self._each_vm(
+            [vm for vm in vms if released[vm.display_name]],
+            lambda vm: self.gcloud_for(vm).launch_start_time(vm.instance_name, vm.zone, vm_session, timeout=int(start_at - skew - time.time()) + 10)
+        )
+        results = {display_name: start_times.get(display_name) is not None for display_name in staged}
+        return RunResult(session=vm_session, results=results, torchrun_env=torchrun_env, start_at=start_at, start_times=start_times, clock_skew=skew)
+
+
+class AsyncClient:
+    """asyncio version of Client
+
+    Every method runs the matching Client method in a worker thread, so many
+    clusters can be driven concurrently from one event loop.
+
+        client = AsyncClient()
+        a, b = await asyncio.gather(client.up("mig-a", count=2), client.up("mig-b", count=2))
+    """
+
+    def __init__(self, client: Optional[Client] = None, max_workers: Optional[int] = None):
+        self.client = client or Client()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def list_migs(self, projects: Optional[Sequence[str]] = None) -> List[MIG]:
+        return await self._call(self.client.list_migs, projects)
+
+    async def vms(self, projects: Optional[Sequence[str]] = None) -> List[VM]:
+        return await self._call(self.client.vms, projects)
+
+    async def resolve(self, name: str, all: bool = False) -> List[VM]:
+        return await self._call(self.client.resolve, name, all)
+
+    async def up(self, mig_name: Optional[str] = None, count: int = 1, **kwargs) -> List[VM]:
+        return await self._call(self.client.up, mig_name, count, **kwargs)
+
+    async def wait(self, request: UpRequest) -> List[VM]:
+        return await self._call(self.client.wait, request)
+
+    async def network_check(self, vms: List[VM], ring: bool = False, port: int = netcheck.RENDEZVOUS_PORT) -> NetworkCheck:
+        return await self._call(self.client.network_check, vms, ring, port)
+
+    async def submit(self, vms: List[VM], script_path: str, gpus: int = 1, **kwargs) -> Job:
+        return await self._call(self.client.submit, vms, script_path, gpus, **kwargs)
+
+    async def jobs(self, vms: List[VM]) -> Dict[str, Optional[List[Job]]]:
+        return await self._call(self.client.jobs, vms)
+
+    async def bake(self, vm: VM, name: str, mig_name: Optional[str] = None) -> Bake:
+        return await self._call(self.client.bake, vm, name, mig_name)
+
+    async def fill_pool(self, mig_name: str, size: Optional[int] = None, **kwargs) -> Pool:
+        return await self._call(self.client.fill_pool, mig_name, size, **kwargs)
+
+    async def down(self, vms: List[VM]) -> Dict[str, bool]:
+        return await self._call(self.client.down, vms)
+
+    async def sync(self, projects: Optional[Sequence[str]] = None, discover: bool = False) -> SyncResult:
+        return await self._call(self.client.sync, projects, discover)
+
+    async def claim(self, vm: VM, custom_name: Optional[str] = None) -> VM:
+        return await self._call(self.client.claim, vm, custom_name)
+
+    async def upload(self, vms: List[VM], local_path: str, remote_path: Optional[str] = None, **kwargs) -> Dict[str, bool]:
+        return await self._call(self.client.upload, vms, local_path, remote_path, **kwargs)
+
+    async def download(self, vm: VM, remote_path: str, local_path: Optional[str] = None, **kwargs) -> bool:
+        return await self._call(self.client.download, vm, remote_path, local_path, **kwargs)
+
+    async def run(self, vms: List[VM], script_path: str, script_args: Optional[List[str]] = None, **kwargs) -> RunResult:
+        return await self._call(self.client.run, vms, script_path, script_args, **kwargs)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
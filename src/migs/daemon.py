@@ -0,0 +1,386 @@
+import contextlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+SOCKET_PATH = Path.home() / ".migs" / "daemon.sock"
+
+# Commands that are safe to run inside the daemon (no prompts, no interactive terminal)
+FORWARDED_COMMANDS = {"list", "vms", "up", "down", "sync", "check", "upload", "download", "run", "pool", "bake", "wait", "status", "submit", "jobs", "path", "stats"}
+
+MASTER_REFRESH_INTERVAL = 60
+
+
+def _is_forwardable(argv):
+    """Check whether a command line can be handled by the daemon"""
+    if not argv or argv[0] not in FORWARDED_COMMANDS:
+        return False
+    # Discovery asks which VMs to claim, which needs the local terminal
+    if argv[0] == "sync" and any(arg in ("-d", "--discover") for arg in argv[1:]):
+        return False
+    # Tearing down every VM asks for confirmation unless --yes is given
+    if argv[0] == "down" and "--mine" in argv[1:] and not any(arg in ("-y", "--yes") for arg in argv[1:]):
+        return False
+    # Watch mode runs until interrupted and would hold the daemon indefinitely
+    if argv[0] == "vms" and any(arg in ("-w", "--watch") for arg in argv[1:]):
+        return False
+    return True
+
+
+def _send(conn, message):
+    conn.sendall((json.dumps(message) + "\n").encode())
+
+
+def request(message, timeout=None):
+    """Send a single control message to the daemon and return its reply, or None if it is not running"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(str(SOCKET_PATH))
+            _send(conn, message)
+            line = conn.makefile("r").readline()
+            return json.loads(line) if line else None
+    except (OSError, ValueError):
+        return None
+
+
+def forward(argv):
+    """Run a command in the daemon, streaming its output
+
+    Returns the exit code, or None if the command should run in-process instead.
+    """
+    if not SOCKET_PATH.exists():
+        return None
+
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(str(SOCKET_PATH))
+    except OSError:
+        return None
+
+    with conn:
+        _send(conn, {
+            "op": "run",
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "tty": sys.stdout.isatty(),
+            "width": shutil.get_terminal_size().columns
+        })
+        lines = conn.makefile("r")
+        cancelled = False
+        while True:
+            try:
+                line = lines.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("busy"):
+                    return None
+                if "out" in message:
+                    sys.stdout.write(message["out"])
+                    sys.stdout.flush()
+                elif "exit" in message:
+                    return 130 if cancelled else message["exit"]
+            except ValueError:
+                continue
+            except KeyboardInterrupt:
+                # The first Ctrl+C cancels the command in the daemon and shows
+                # how it wound down; a second one stops waiting for it
+                if cancelled:
+                    return 130
+                cancelled = True
+                try:
+                    _send(conn, {"op": "cancel"})
+                except OSError:
+                    return 130
+
+    # The daemon went away mid-command
+    return 130 if cancelled else 1
+
+
+def main():
+    """Entry point for the `migs` command
+
+    Only the standard library is imported here. The command line is forwarded
+    to a running daemon when possible and otherwise runs in-process as usual.
+    """
+    argv = sys.argv[1:]
+    if _is_forwardable(argv):
+        exit_code = forward(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    from migs.cli import cli
+    cli(prog_name="migs")
+
+
+class _SocketWriter:
+    """File-like object that streams text to a client as JSON messages"""
+
+    def __init__(self, conn, tty):
+        self.conn = conn
+        self.tty = tty
+        self.disconnected = False
+
+    def write(self, text):
+        # Once the client is gone, output is dropped so the command only ever
+        # stops through its KeyboardInterrupt handling, not at a random write
+        if text and not self.disconnected:
+            try:
+                _send(self.conn, {"out": text})
+            except OSError:
+                self.disconnected = True
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return self.tty
+
+
+class Daemon:
+    """Serve CLI commands from a long-lived process
+
+    The CLI module is imported once, so its GCloudWrapper, VMStorage and
+    SSHConfigManager keep their caches (inventory, MIG catalog, gcloud
+    environment) between commands. SSH connection masters are kept open for
+    tracked VMs and reused by gcloud ssh/scp calls.
+    """
+
+    def __init__(self):
+        # Importing the CLI is the expensive part of a cold start, so it is done once here
+        from migs import cli as cli_module
+        self.cli_module = cli_module
+        self.started_at = time.time()
+        self.requests_served = 0
+        self.lock = threading.Lock()
+        self.masters = {}
+        self.fingerprint = self._environment_fingerprint()
+        self.stopping = threading.Event()
+
+    def _environment_fingerprint(self):
+        """Modification times of the active gcloud configuration, to notice account/project switches"""
+        config_dir = Path(os.environ.get("CLOUDSDK_CONFIG", Path.home() / ".config" / "gcloud"))
+        paths = [config_dir / "active_config"]
+        try:
+            active = (config_dir / "active_config").read_text().strip() or "default"
+            paths.append(config_dir / "configurations" / f"config_{active}")
+        except OSError:
+            pass
+
+        fingerprint = []
+        for path in paths:
+            try:
+                fingerprint.append(path.stat().st_mtime_ns)
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def _refresh_environment(self):
+        """Drop cached gcloud state if the active configuration changed"""
+        fingerprint = self._environment_fingerprint()
+        if fingerprint != self.fingerprint:
+            self.cli_module.gcloud.reset_cache()
+            self.fingerprint = fingerprint
+
+    def _refresh_masters(self):
+        """Keep an SSH connection master open for every tracked VM"""
+        gcloud = self.cli_module.gcloud
+        tracked = {vm["instance_name"]: vm for vm in self.cli_module.storage.list_vms()}
+
+        for instance_name, process in list(self.masters.items()):
+            if instance_name not in tracked or process.poll() is not None:
+                if process.poll() is None:
+                    process.terminate()
+                del self.masters[instance_name]
+
+        for instance_name, vm in tracked.items():
+            if instance_name not in self.masters:
+                self.masters[instance_name] = gcloud.for_project(vm.get("project")).start_ssh_master(instance_name, vm["zone"])
+
+    def _master_loop(self):
+        while not self.stopping.is_set():
+            try:
+                self._refresh_masters()
+            except Exception:
+                pass
+            self.stopping.wait(MASTER_REFRESH_INTERVAL)
+
+    def status(self):
+        gcloud = self.cli_module.gcloud
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started_at,
+            "requests": self.requests_served,
+            "tracked_vms": len(self.cli_module.storage.list_vms()),
+            "ssh_masters": sum(1 for process in self.masters.values() if process.poll() is None),
+            "environment": gcloud.get_environment(),
+            "mig_catalog": len(gcloud.get_mig_zones())
+        }
+
+    def _watch_cancel(self, lines, cancel):
+        """Cancel the running command when its client asks to, or disconnects"""
+        try:
+            for line in lines:
+                if json.loads(line).get("op") == "cancel":
+                    break
+        except (OSError, ValueError):
+            pass
+        cancel()
+
+    def run_command(self, conn, lines, message):
+        """Run a forwarded command with its output streamed back over the connection
+
+        If the client cancels or goes away, KeyboardInterrupt is raised in the
+        command, as if Ctrl+C had been pressed in-process.
+        """
+        import ctypes
+        import click
+        from rich.console import Console
+
+        if not self.lock.acquire(blocking=False):
+            # Another command is running; let the client run this one in-process
+            _send(conn, {"busy": True})
+            return
+
+        console = self.cli_module.console
+        cwd = os.getcwd()
+        command_thread = threading.get_ident()
+        guard = threading.Lock()
+        state = {"running": True, "cancelled": False}
+
+        def cancel():
+            with guard:
+                if state["running"] and not state["cancelled"]:
+                    state["cancelled"] = True
+                    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(command_thread), ctypes.py_object(KeyboardInterrupt))
+
+        try:
+            self._refresh_environment()
+            writer = _SocketWriter(conn, message.get("tty", False))
+            self.cli_module.console = Console(
+                file=writer,
+                force_terminal=message.get("tty", False),
+                width=message.get("width")
+            )
+            os.chdir(message.get("cwd") or str(Path.home()))
+            threading.Thread(target=self._watch_cancel, args=(lines, cancel), daemon=True).start()
+
+            with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(writer):
+                try:
+                    try:
+                        exit_code = self.cli_module.cli.main(
+                            args=message["argv"],
+                            prog_name="migs",
+                            standalone_mode=False
+                        ) or 0
+                    finally:
+                        with guard:
+                            state["running"] = False
+                except click.ClickException as e:
+                    e.show(file=writer)
+                    exit_code = e.exit_code
+                except click.Abort:
+                    # click turns KeyboardInterrupt into Abort
+                    if not state["cancelled"]:
+                        writer.write("Aborted!\n")
+                    exit_code = 130 if state["cancelled"] else 1
+                except KeyboardInterrupt:
+                    exit_code = 130
+                except SystemExit as e:
+                    exit_code = e.code if isinstance(e.code, int) else 0
+                except Exception as e:
+                    writer.write(f"Error: {e}\n")
+                    exit_code = 1
+
+            self.requests_served += 1
+            _send(conn, {"exit": exit_code if isinstance(exit_code, int) else 0})
+        finally:
+            self.cli_module.console = console
+            os.chdir(cwd)
+            self.lock.release()
+
+    def handle(self, conn):
+        with conn:
+            try:
+                lines = conn.makefile("r")
+                line = lines.readline()
+                if not line:
+                    return
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "run":
+                    self.run_command(conn, lines, message)
+                elif op == "ping":
+                    _send(conn, {"ok": True})
+                elif op == "status":
+                    _send(conn, self.status())
+                elif op == "shutdown":
+                    _send(conn, {"ok": True})
+                    self.stopping.set()
+            except (OSError, ValueError):
+                # The client disconnected or sent garbage
+                pass
+
+    def serve(self):
+        SOCKET_PATH.parent.mkdir(exist_ok=True)
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(SOCKET_PATH))
+        os.chmod(SOCKET_PATH, 0o600)
+        server.listen()
+        server.settimeout(1)
+
+        threading.Thread(target=self._master_loop, daemon=True).start()
+
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            if SOCKET_PATH.exists():
+                SOCKET_PATH.unlink()
+            for process in self.masters.values():
+                if process.poll() is None:
+                    process.terminate()
+
+
+def start_daemon(timeout: float = 10) -> bool:
+    """Start the daemon in the background and wait for it to accept connections"""
+    if request({"op": "ping"}, timeout=2):
+        return True
+
+    SOCKET_PATH.parent.mkdir(exist_ok=True)
+    log_file = open(SOCKET_PATH.parent / "daemon.log", "a")
+    subprocess.Popen(
+        [sys.executable, "-m", "migs.daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=log_file,
+        stderr=log_file,
+        start_new_session=True
+    )
+    log_file.close()
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if request({"op": "ping"}, timeout=2):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+if __name__ == "__main__":
+    Daemon().serve()
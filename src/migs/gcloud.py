@@ -1,8 +1,23 @@
 import json
 import os
+import shlex
 import subprocess
+import threading
 import time
-from typing import Dict, List, Optional, Union, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, List, Optional, Union, Any
+
+from migs import jobqueue, netcheck, query, transfer
+from migs.ratelimit import CommandExecutor, classify_error
+from migs.storage import TransferJournal, UploadCache
+
+# Exit code a remote command uses when a cached upload no longer matches its recorded hash (EX_TEMPFAIL)
+STALE_UPLOAD_EXIT = 75
+
+# Seconds a staged launch waits to be released before giving up
+LAUNCH_BARRIER_TIMEOUT = 600
 
 
 class AuthenticationError(Exception):
@@ -10,11 +25,83 @@ class AuthenticationError(Exception):
     pass
 
 
+class InstanceSnapshot:
+    """Every instance in a project from one instances list call, indexed in memory
+
+    Instances are looked up by (name, zone) and grouped by the (MIG, zone)
+    that manages them, taken from their created-by metadata.
+    """
+    
+    def __init__(self, instances: List[Dict]):
+        self.instances = instances
+        self.by_name = {(instance["name"], instance["zone"]): instance for instance in instances}
+        self.by_mig = {}
+        for instance in instances:
+            if instance["mig_name"]:
+                self.by_mig.setdefault((instance["mig_name"], instance["zone"]), []).append(instance)
+    
+    def get(self, instance_name: str, zone: str) -> Optional[Dict]:
+        return self.by_name.get((instance_name, zone))
+    
+    def in_mig(self, mig_name: str, zone: str) -> List[Dict]:
+        return self.by_mig.get((mig_name, zone), [])
+    
+    def managed(self) -> List[Dict]:
+        """Instances that belong to a MIG"""
+        return [instance for instances in self.by_mig.values() for instance in instances]
+
+
 class GCloudWrapper:
-    """Wrapper for gcloud CLI commands"""
+    """Wrapper for gcloud CLI commands
+
+    Runs against the active gcloud project unless a project is given. Use
+    for_project() to get the wrapper for another project.
+    """
+    
+    def __init__(self, project: Optional[str] = None):
+        self.project = project
+        self._project_wrappers = {}
+        self._beta_available = None
+        self._ssh_username = None
+        self._mig_zones = None
+        self._environment = None
+        self.control_dir = Path.home() / ".migs" / "cm"
+        self.upload_cache = UploadCache()
+        self.transfer_journal = TransferJournal()
+        self.executor = CommandExecutor()
     
-    def __init__(self):
+    def reset_cache(self):
+        """Forget cached account, project, beta and MIG catalog state"""
         self._beta_available = None
+        self._ssh_username = None
+        self._mig_zones = None
+        self._environment = None
+        for wrapper in self._project_wrappers.values():
+            wrapper.reset_cache()
+    
+    def for_project(self, project: Optional[str]) -> "GCloudWrapper":
+        """Get the wrapper for a project (this one for None or its own project)
+
+        Each project gets its own rate limiter, since API quotas are per project.
+        """
+        if not project or project == self.project:
+            return self
+        if project not in self._project_wrappers:
+            self._project_wrappers[project] = GCloudWrapper(project)
+        return self._project_wrappers[project]
+    
+    def project_id(self) -> Optional[str]:
+        """The project this wrapper runs against"""
+        return self.project or self.get_environment()["project"]
+    
+    def with_project(self, cmd: List[str]) -> List[str]:
+        """Pin a gcloud command to this wrapper's project"""
+        # Arguments after "--" go to the remote command, so a --project there doesn't count
+        own_args = cmd[:cmd.index("--")] if "--" in cmd else cmd
+        if not self.project or any(arg.startswith("--project") for arg in own_args):
+            return cmd
+        # Global flags go right after "gcloud", ahead of any "--" passthrough arguments
+        return [cmd[0], f"--project={self.project}", *cmd[1:]]
     
     def check_beta_available(self) -> bool:
         """Check if gcloud beta component is installed"""
@@ -34,35 +121,43 @@ class GCloudWrapper:
             
         return self._beta_available
     
-    def _run_command(self, cmd: List[str], json_output: bool = True) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]], str]]:
-        """Run a gcloud command and return the output"""
-        if json_output and "--format" not in cmd:
-            cmd.extend(["--format", "json"])
+    def _run_command(self, cmd: List[str], json_output: bool = True, fields: Optional[List[str]] = None, filter_expr: Optional[str] = None) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]], str]]:
+        """Run a gcloud command and return the output
+
+        fields projects the JSON output down to the given keys and filter_expr
+        is passed as --filter, so gcloud does the work instead of the client.
+        """
+        if filter_expr:
+            cmd.append(f"--filter={filter_expr}")
+        if json_output and not any(arg == "--format" or arg.startswith("--format=") for arg in cmd):
+            cmd.extend(["--format", query.projection(fields) if fields else "json"])
         
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            if json_output:
-                return json.loads(result.stdout) if result.stdout else None
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            # Check for auth errors
-            error_lower = e.stderr.lower()
-            if any(msg in error_lower for msg in [
-                "not authenticated",
-                "could not find default credentials",
-                "application default credentials",
-                "gcloud auth login"
-            ]):
-                raise AuthenticationError("Not authenticated. Please run: gcloud auth login")
-            
+        result = self._exec(cmd)
+        if result.returncode != 0:
             print(f"Command failed: {' '.join(cmd)}")
-            print(f"Error: {e.stderr}")
+            print(f"Error: {result.stderr}")
             return None
+        if json_output:
+            return json.loads(result.stdout) if result.stdout else None
+        return result.stdout
+    
+    def _exec(self, cmd: List[str], category: str = "read", capture: bool = True, timeout: Optional[float] = None, stdin: Optional[IO] = None, stdout: Optional[IO] = None) -> subprocess.CompletedProcess:
+        """Run a gcloud command through the shared rate limiter
+
+        Every API-facing gcloud call goes through here, so throttled calls are
+        retried with backoff and missing credentials surface the same way
+        everywhere. category is "read" or "mutate". stdin and stdout can be
+        files to stream a command's input from or its output into.
+        """
+        result = self.executor.run(self.with_project(cmd), category, capture=capture, timeout=timeout, stdin=stdin, stdout=stdout)
+        if capture and result.returncode != 0 and classify_error(result.stderr) == "auth":
+            raise AuthenticationError("Not authenticated. Please run: gcloud auth login")
+        return result
     
     def list_migs(self) -> List[Dict]:
         """List all MIGs in the current project"""
         cmd = ["gcloud", "compute", "instance-groups", "managed", "list"]
-        result = self._run_command(cmd)
+        result = self._run_command(cmd, fields=query.MIG_FIELDS, filter_expr=query.NOT_GKE_POOL)
         
         if not result:
             return []
@@ -70,24 +165,55 @@ class GCloudWrapper:
         migs = []
         for mig in result:
             zone = mig["zone"].split("/")[-1] if "/" in mig["zone"] else mig["zone"]
-            if not (mig["name"].startswith("gke-") and "default-pool" in mig["name"]):
-                migs.append({
-                    "name": mig["name"],
-                    "zone": zone,
-                    "size": int(mig.get("size", 0)),
-                    "targetSize": int(mig.get("targetSize", 0))
-                })
+            migs.append({
+                "name": mig["name"],
+                "project": self.project,
+                "zone": zone,
+                "size": int(mig.get("size", 0)),
+                "targetSize": int(mig.get("targetSize", 0))
+            })
             
         return migs
     
+    def get_mig_zones(self) -> Dict[str, str]:
+        """Get a cached mapping of MIG name to zone (zones never change for a MIG)"""
+        if self._mig_zones is None:
+            self._mig_zones = {mig["name"]: mig["zone"] for mig in self.list_migs()}
+        return self._mig_zones
+    
     def get_mig_zone(self, mig_name: str) -> Optional[str]:
         """Get the zone for a specific MIG"""
-        migs = self.list_migs()
-        for mig in migs:
-            if mig["name"] == mig_name:
-                return mig["zone"]
+        zones = self.get_mig_zones()
+        if mig_name not in zones:
+            # The MIG may have been created since the catalog was cached
+            self._mig_zones = None
+            zones = self.get_mig_zones()
+        if mig_name in zones:
+            return zones[mig_name]
         raise ValueError(f"MIG '{mig_name}' not found")
     
+    def get_environment(self) -> Dict[str, Any]:
+        """Get the active gcloud account, project and beta availability"""
+        if self._environment is None:
+            values = {}
+            for key in ("account", "project"):
+                if key == "project" and self.project:
+                    values[key] = self.project
+                    continue
+                try:
+                    result = subprocess.run(
+                        ["gcloud", "config", "get-value", key],
+                        capture_output=True,
+                        text=True,
+                        check=True
+                    )
+                    values[key] = result.stdout.strip() or None
+                except (subprocess.CalledProcessError, FileNotFoundError):
+                    values[key] = None
+            values["beta"] = self.check_beta_available()
+            self._environment = values
+        return self._environment
+    
     def create_resize_request(self, mig_name: str, zone: str, count: int, run_duration: Optional[str] = None, instance_names: Optional[List[str]] = None, force_mode: Optional[str] = None) -> tuple[str, bool]:
         """Create a resize request to add instances with optional custom names
         
@@ -128,85 +254,177 @@ class GCloudWrapper:
         if run_duration:
             cmd.append(f"--requested-run-duration={run_duration}")
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._exec(cmd, "mutate")
         if result.returncode != 0:
-            # Check for auth errors
-            error_lower = result.stderr.lower()
-            if any(msg in error_lower for msg in [
-                "not authenticated",
-                "could not find default credentials",
-                "application default credentials",
-                "gcloud auth login"
-            ]):
-                raise AuthenticationError("Not authenticated. Please run: gcloud auth login")
             raise Exception(f"Failed to create resize request: {result.stderr}")
         
         return request_id, use_beta
     
-    def wait_for_vm(self, mig_name: str, zone: str, request_id: str, expected_count: int = 1, progress_callback=None, initial_instance_names=None, target_instance_names: Optional[List[str]] = None) -> Optional[Union[Dict, List[Dict]]]:
-        """Wait for VM(s) to be created and return their info"""                
+    def get_resize_request_state(self, mig_name: str, zone: str, request_id: str) -> Optional[str]:
+        """Get the state of a resize request (ACCEPTED, CREATING, SUCCEEDED, FAILED, ...)"""
+        cmd = [
+            "gcloud", "compute", "instance-groups", "managed",
+            "resize-requests", "describe", mig_name,
+            f"--resize-request={request_id}",
+            f"--zone={zone}"
+        ]
+
+        result = self._run_command(cmd, fields=query.RESIZE_REQUEST_FIELDS)
+        return result.get("state") if result else None
+
+    def cancel_resize_request(self, mig_name: str, zone: str, request_id: str) -> bool:
+        """Cancel a resize request that has not been fulfilled yet"""
+        cmd = [
+            "gcloud", "compute", "instance-groups", "managed",
+            "resize-requests", "cancel", mig_name,
+            f"--resize-request={request_id}",
+            f"--zone={zone}"
+        ]
+
+        result = self._exec(cmd, "mutate")
+        return result.returncode == 0
+
+    def _find_new_instances(self, current_instances: List[Dict], initial_instance_names, target_instance_names: Optional[List[str]] = None) -> List[Dict]:
+        """Pick the instances created by a resize request, in a stable order"""
+        if target_instance_names:
+            # When using beta API with specific names, look for those exact instances
+            target_set = set(target_instance_names)
+            found_instances = [inst for inst in current_instances if inst["name"] in target_set]
+            # Sort by the order in target_instance_names to maintain user's order
+            name_to_order = {name: i for i, name in enumerate(target_instance_names)}
+            found_instances.sort(key=lambda x: name_to_order.get(x["name"], 999))
+            return found_instances
+
+        # Original behavior: find new instances not in initial set
+        new_instances = [inst for inst in current_instances if inst["name"] not in initial_instance_names]
+        # Sort by instance ID to get consistent ordering
+        new_instances.sort(key=lambda x: int(x.get("id", "0")))
+        return new_instances
+
+    def iter_ready_vms(self, mig_name: str, zone: str, request_id: str, expected_count: int = 1, progress_callback=None, initial_instance_names=None, target_instance_names: Optional[List[str]] = None, poll_interval: float = 5) -> Iterator[Dict]:
+        """Yield each VM's info as soon as it is running, until expected_count VMs are up
+
+        Unlike wait_for_vm, this does not wait for the whole resize request to
+        succeed, so callers can start working on early nodes while the rest boot.
+        Raises if the resize request fails or is cancelled.
+        """
         # Get the list of instances before the resize request
         if initial_instance_names is None:
             initial_instances = self.list_instances(mig_name, zone)
             initial_instance_names = {inst["name"] for inst in initial_instances}
-        
+
+        ready = set()
         while True:
-            cmd = [
-                "gcloud", "compute", "instance-groups", "managed",
-                "resize-requests", "describe", mig_name,
-                f"--resize-request={request_id}",
-                f"--zone={zone}"
-            ]
-            
-            result = self._run_command(cmd)
-            if result and result.get("state") == "SUCCEEDED":
-                # Get current instances
-                current_instances = self.list_instances(mig_name, zone)
-                
-                if target_instance_names:
-                    # When using beta API with specific names, look for those exact instances
-                    target_set = set(target_instance_names)
-                    found_instances = [inst for inst in current_instances if inst["name"] in target_set]
-                    
-                    if len(found_instances) >= expected_count:
-                        # Sort by the order in target_instance_names to maintain user's order
-                        name_to_order = {name: i for i, name in enumerate(target_instance_names)}
-                        found_instances.sort(key=lambda x: name_to_order.get(x["name"], 999))
-                        
-                        # Get details for found instances
-                        instance_details = []
-                        for inst in found_instances[:expected_count]:
-                            details = self.get_instance_details(inst["name"], zone)
-                            if details:
-                                instance_details.append(details)
-                        
-                        # Return single instance for backward compatibility when expected_count=1
-                        if expected_count == 1 and instance_details:
-                            return instance_details[0]
-                        return instance_details
-                else:
-                    # Original behavior: find new instances not in initial set
-                    new_instances = [inst for inst in current_instances if inst["name"] not in initial_instance_names]
-                    
-                    if len(new_instances) >= expected_count:
-                        # Sort by instance ID to get consistent ordering
-                        new_instances.sort(key=lambda x: int(x.get("id", "0")))
-                        # Get details for all new instances
-                        instance_details = []
-                        for inst in new_instances[:expected_count]:
-                            details = self.get_instance_details(inst["name"], zone)
-                            if details:
-                                instance_details.append(details)
-                        
-                        # Return single instance for backward compatibility when expected_count=1
-                        if expected_count == 1 and instance_details:
-                            return instance_details[0]
-                        return instance_details
-            
+            state = self.get_resize_request_state(mig_name, zone, request_id)
+            if state in ("FAILED", "CANCELLED"):
+                raise Exception(f"Resize request {request_id} {state.lower()}")
+
+            current_instances = self.list_instances(mig_name, zone)
+            new_instances = self._find_new_instances(current_instances, initial_instance_names, target_instance_names)
+
+            for inst in new_instances:
+                if inst["name"] in ready or inst.get("instanceStatus") != "RUNNING":
+                    continue
+
+                details = self.get_instance_details(inst["name"], zone)
+                if details and details["status"] == "RUNNING":
+                    ready.add(inst["name"])
+                    yield details
+                    if len(ready) >= expected_count:
+                        return
+
             if progress_callback:
                 progress_callback()
-            
-            time.sleep(5)
+
+            time.sleep(poll_interval)
+
+    def wait_for_vm(self, mig_name: str, zone: str, request_id: str, expected_count: int = 1, progress_callback=None, initial_instance_names=None, target_instance_names: Optional[List[str]] = None) -> Optional[Union[Dict, List[Dict]]]:
+        """Wait for VM(s) to be created and return their info"""
+        instance_details = list(self.iter_ready_vms(
+            mig_name, zone, request_id,
+            expected_count=expected_count,
+            progress_callback=progress_callback,
+            initial_instance_names=initial_instance_names,
+            target_instance_names=target_instance_names
+        ))
+
+        # Return single instance for backward compatibility when expected_count=1
+        if expected_count == 1 and instance_details:
+            return instance_details[0]
+        return instance_details
+
+    def race_resize_requests(self, candidates: List[Dict], expected_count: int, progress_callback=None) -> Dict:
+        """Wait on resize requests in several MIGs and keep the first one to succeed
+
+        Each candidate is a dict with mig_name, zone, request_id, initial_instance_names
+        and target_instance_names. Once a winner has all of its instances, the other
+        requests are cancelled, or scaled back if they succeeded as well.
+
+        Returns: the winning candidate
+        """
+        pending = list(candidates)
+        winner = None
+
+        while winner is None:
+            for candidate in list(pending):
+                state = self.get_resize_request_state(candidate["mig_name"], candidate["zone"], candidate["request_id"])
+                if state in ("FAILED", "CANCELLED"):
+                    pending.remove(candidate)
+                elif state == "SUCCEEDED":
+                    current_instances = self.list_instances(candidate["mig_name"], candidate["zone"])
+                    new_instances = self._find_new_instances(
+                        current_instances,
+                        candidate["initial_instance_names"],
+                        candidate.get("target_instance_names")
+                    )
+                    if len(new_instances) >= expected_count:
+                        winner = candidate
+                        break
+
+            if winner is None:
+                if not pending:
+                    raise Exception("All resize requests failed or were cancelled")
+                if progress_callback:
+                    progress_callback()
+                time.sleep(5)
+
+        for candidate in candidates:
+            if candidate is not winner:
+                self._abandon_resize_request(candidate, expected_count)
+
+        return winner
+
+    def _abandon_resize_request(self, candidate: Dict, expected_count: int):
+        """Cancel a losing resize request, deleting its VMs if it already succeeded
+
+        Only instances the request named itself (beta API) are deleted. A
+        resize-by request's VMs can't be told apart from others created in a
+        shared MIG meanwhile, so they are left running with a warning.
+        """
+        mig_name, zone = candidate["mig_name"], candidate["zone"]
+        state = self.get_resize_request_state(mig_name, zone, candidate["request_id"])
+
+        if state in ("ACCEPTED", "CREATING"):
+            if self.cancel_resize_request(mig_name, zone, candidate["request_id"]):
+                return
+            # The request may have been fulfilled in the meantime
+            state = self.get_resize_request_state(mig_name, zone, candidate["request_id"])
+
+        if state != "SUCCEEDED":
+            return
+        if not candidate.get("target_instance_names"):
+            print(
+                f"Warning: resize request {candidate['request_id']} in {mig_name} ({zone}) also succeeded. "
+                f"Its {expected_count} VM(s) were left running, delete them with: "
+                f"gcloud compute instance-groups managed delete-instances {mig_name} --zone={zone} --instances=..."
+            )
+            return
+        current_instances = self.list_instances(mig_name, zone)
+        new_instances = self._find_new_instances(current_instances, candidate["initial_instance_names"], candidate["target_instance_names"])
+        self.delete_vms([
+            {"instance_name": inst["name"], "zone": zone, "mig_name": mig_name}
+            for inst in new_instances
+        ])
     
     def list_instances(self, mig_name: str, zone: str) -> List[Dict]:
         """List instances in a MIG"""
@@ -216,9 +434,39 @@ class GCloudWrapper:
             f"--zone={zone}"
         ]
         
-        result = self._run_command(cmd)
+        result = self._run_command(cmd, fields=query.MANAGED_INSTANCE_FIELDS)
         return result if isinstance(result, list) else []
-    
+
+    def list_instance_states(self, vms: List[Dict]) -> Optional[Dict[str, Dict]]:
+        """Get status and external IP for many tracked VMs with a single instances list call
+
+        Returns a dict keyed by instance name, or None if the call failed.
+        Instances that no longer exist are missing from the result.
+        """
+        if not vms:
+            return {}
+
+        names = sorted({vm["instance_name"] for vm in vms})
+        zones = sorted({vm["zone"] for vm in vms})
+        cmd = [
+            "gcloud", "compute", "instances", "list",
+            f"--zones={','.join(zones)}"
+        ]
+
+        result = self._run_command(cmd, fields=query.INSTANCE_FIELDS, filter_expr=query.any_of("name", names))
+        if result is None:
+            return None
+
+        states = {}
+        for instance in result:
+            states[instance["name"]] = {
+                "status": instance.get("status"),
+                "external_ip": self._external_ip(instance),
+                "internal_ip": self._internal_ip(instance),
+                "zone": instance.get("zone", "").split("/")[-1]
+            }
+        return states
+
     def get_instance_details(self, instance_name: str, zone: str) -> Optional[Dict]:
         """Get detailed info about an instance"""
         cmd = [
@@ -227,16 +475,115 @@ class GCloudWrapper:
             f"--zone={zone}"
         ]
         
-        result = self._run_command(cmd)
+        result = self._run_command(cmd, fields=query.INSTANCE_FIELDS)
         if not result:
             return None
         
-        external_ip = None
-        for interface in result.get("networkInterfaces", []):
+        username = self.get_ssh_username()
+        
+        return {
+            "name": instance_name,
+            "zone": zone,
+            "project": self.project,
+            "external_ip": self._external_ip(result),
+            "internal_ip": self._internal_ip(result),
+            "username": username,
+            "status": result.get("status"),
+            "machine_type": result.get("machineType", "").split("/")[-1] or None,
+            "created": self._timestamp(result.get("creationTimestamp"))
+        }
+    
+    def get_host_keys(self, instance_name: str, zone: str, timeout: float = 0) -> Optional[List[str]]:
+        """SSH host keys a VM's guest agent published, as "<type> <key>" lines
+
+        The guest agent publishes them shortly after boot, so this polls for up
+        to timeout seconds. Returns None if they never showed up, or right away
+        if the VM has guest attributes disabled.
+        """
+        cmd = [
+            "gcloud", "compute", "instances", "get-guest-attributes",
+            instance_name,
+            f"--zone={zone}",
+            "--query-path=hostkeys/",
+            "--format=json"
+        ]
+        
+        deadline = time.time() + timeout
+        while True:
+            result = self._exec(cmd)
+            if result.returncode == 0:
+                attributes = json.loads(result.stdout) if result.stdout.strip() else []
+                keys = [f"{attr['key']} {attr['value']}" for attr in attributes if attr.get("namespace") == "hostkeys"]
+                if keys:
+                    return keys
+            elif "disabled" in result.stderr.lower():
+                return None
+            if time.time() >= deadline:
+                return None
+            time.sleep(3)
+    
+    @staticmethod
+    def _external_ip(instance: Dict) -> Optional[str]:
+        """First external (NAT) IP of an instance resource"""
+        for interface in instance.get("networkInterfaces", []):
             for config in interface.get("accessConfigs", []):
                 if config.get("natIP"):
-                    external_ip = config["natIP"]
+                    return config["natIP"]
+        return None
+    
+    @staticmethod
+    def _timestamp(value: Optional[str]) -> Optional[float]:
+        """Epoch seconds of an RFC 3339 resource timestamp, e.g. 2024-05-01T09:30:12.345-07:00"""
+        try:
+            return datetime.fromisoformat(value).timestamp() if value else None
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _internal_ip(instance: Dict) -> Optional[str]:
+        """Primary internal (VPC) IP of an instance resource"""
+        for interface in instance.get("networkInterfaces", []):
+            if interface.get("networkIP"):
+                return interface["networkIP"]
+        return None
+    
+    def snapshot_instances(self) -> Optional[InstanceSnapshot]:
+        """Fetch every instance in the project with one instances list call
+
+        Each instance has the same fields as get_instance_details plus
+        mig_name (None if no MIG manages it). Returns None if the call failed.
+        """
+        cmd = ["gcloud", "compute", "instances", "list"]
+        result = self._run_command(cmd, fields=query.SNAPSHOT_FIELDS, filter_expr=query.NOT_GKE_POOL)
+        if result is None:
+            return None
+        
+        username = self.get_ssh_username()
+        instances = []
+        for instance in result:
+            created_by = ""
+            for item in (instance.get("metadata") or {}).get("items", []):
+                if item.get("key") == "created-by":
+                    created_by = item.get("value", "")
                     break
+            # e.g. projects/123/zones/us-central1-a/instanceGroupManagers/my-mig
+            mig_name = created_by.split("/")[-1] if "/instanceGroupManagers/" in created_by else None
+            instances.append({
+                "name": instance["name"],
+                "zone": instance.get("zone", "").split("/")[-1],
+                "project": self.project,
+                "external_ip": self._external_ip(instance),
+                "internal_ip": self._internal_ip(instance),
+                "username": username,
+                "status": instance.get("status"),
+                "mig_name": mig_name
+            })
+        return InstanceSnapshot(instances)
+    
+    def get_ssh_username(self) -> str:
+        """Get the SSH username gcloud uses for the active account"""
+        if self._ssh_username is not None:
+            return self._ssh_username
         
         # Get SSH username from email
         try:
@@ -263,13 +610,8 @@ class GCloudWrapper:
             except subprocess.CalledProcessError:
                 raise RuntimeError("Failed to determine username.")
         
-        return {
-            "name": instance_name,
-            "zone": zone,
-            "external_ip": external_ip,
-            "username": username,
-            "status": result.get("status")
-        }
+        self._ssh_username = username
+        return username
     
     def get_instance_internal_details(self, instance_name: str, zone: str) -> Optional[Dict]:
         """Get internal IP and GPU count for an instance"""
@@ -280,17 +622,11 @@ class GCloudWrapper:
             f"--zone={zone}"
         ]
         
-        result = self._run_command(cmd)
+        result = self._run_command(cmd, fields=query.INSTANCE_FIELDS)
         if not result:
             return None
         
-        # Extract internal IP from network interfaces
-        internal_ip = None
-        for interface in result.get("networkInterfaces", []):
-            if interface.get("networkIP"):
-                internal_ip = interface["networkIP"]
-                break
-        
+        internal_ip = self._internal_ip(result)
         if not internal_ip:
             return None
         
@@ -298,11 +634,12 @@ class GCloudWrapper:
         gpu_cmd = [
             "gcloud", "compute", "ssh", instance_name,
             f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
             "--command", "nvidia-smi -L 2>/dev/null | wc -l || echo 1"
         ]
         
         try:
-            gpu_result = subprocess.run(gpu_cmd, capture_output=True, text=True, timeout=10)
+            gpu_result = self._exec(gpu_cmd, timeout=10)
             if gpu_result.returncode == 0 and gpu_result.stdout.strip():
                 gpu_count = int(gpu_result.stdout.strip())
             else:
@@ -324,31 +661,158 @@ class GCloudWrapper:
             f"--zone={zone}"
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._exec(cmd, "mutate")
+        if result.returncode == 0:
+            self.upload_cache.forget([instance_name])
         return result.returncode == 0
+
+    def delete_vms(self, vms: List[Dict]) -> Dict[str, bool]:
+        """Delete many VMs with one delete-instances call per (MIG, zone)
+
+        The calls for different MIGs run concurrently and are all waited on.
+        Returns a dict of instance name to success.
+        """
+        groups = {}
+        for vm in vms:
+            groups.setdefault((vm["mig_name"], vm["zone"]), []).append(vm["instance_name"])
+
+        def delete_group(mig_name, zone, instance_names):
+            cmd = [
+                "gcloud", "compute", "instance-groups", "managed",
+                "delete-instances", mig_name,
+                f"--instances={','.join(instance_names)}",
+                f"--zone={zone}",
+                # Don't fail the whole group because one instance is already gone
+                "--skip-instances-on-validation-error"
+            ]
+            return self._exec(cmd, "mutate")
+
+        results = {}
+        if not groups:
+            return results
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = {key: executor.submit(delete_group, key[0], key[1], names) for key, names in groups.items()}
+            for key, future in futures.items():
+                result = future.result()
+                if result.returncode != 0 and result.stderr:
+                    print(f"Delete error ({key[0]}): {result.stderr}")
+                for instance_name in groups[key]:
+                    results[instance_name] = result.returncode == 0
+        self.upload_cache.forget([name for name, ok in results.items() if ok])
+        return results
     
-    def ssh_to_vm(self, instance_name: str, zone: str, extra_args: Optional[List[str]] = None, env_file: Optional[str] = None):
+    def flush_disks(self, instance_name: str, zone: str) -> bool:
+        """Flush a VM's filesystem buffers to disk, so an image taken while it runs is consistent"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", "sudo sync"
+        ]
+        try:
+            return self._exec(cmd, timeout=120).returncode == 0
+        except subprocess.TimeoutExpired:
+            return False
+
+    def get_boot_disk(self, instance_name: str, zone: str) -> Optional[Dict]:
+        """Get the disk name and device name of an instance's boot disk"""
+        cmd = [
+            "gcloud", "compute", "instances", "describe",
+            instance_name,
+            f"--zone={zone}"
+        ]
+
+        result = self._run_command(cmd, fields=query.BOOT_DISK_FIELDS)
+        for disk in (result or {}).get("disks", []):
+            if disk.get("boot"):
+                return {"disk_name": disk["source"].split("/")[-1], "device_name": disk.get("deviceName")}
+        return None
+
+    def create_image(self, image_name: str, disk_name: str, zone: str, family: Optional[str] = None):
+        """Create an image from a disk, even while it is attached to a running VM"""
+        cmd = [
+            "gcloud", "compute", "images", "create", image_name,
+            f"--source-disk={disk_name}",
+            f"--source-disk-zone={zone}",
+            "--force"
+        ]
+        if family:
+            cmd.append(f"--family={family}")
+
+        result = self._exec(cmd, "mutate")
+        if result.returncode != 0:
+            raise Exception(f"Failed to create image: {result.stderr}")
+
+    def create_instance_template(self, template_name: str, instance_name: str, zone: str, image_name: str, device_name: str):
+        """Create an instance template with a VM's configuration that boots from an image"""
+        image = f"projects/{self.project_id()}/global/images/{image_name}"
+        cmd = [
+            "gcloud", "compute", "instance-templates", "create", template_name,
+            f"--source-instance={instance_name}",
+            f"--source-instance-zone={zone}",
+            f"--configure-disk=device-name={device_name},instantiate-from=custom-image,custom-image={image}"
+        ]
+
+        result = self._exec(cmd, "mutate")
+        if result.returncode != 0:
+            raise Exception(f"Failed to create instance template: {result.stderr}")
+
+    def create_mig(self, mig_name: str, template_name: str, zone: str, like_mig: Optional[str] = None):
+        """Create an empty MIG from a template, copying like_mig's VM failure policy
+
+        Resize requests need MIGs that don't repair failed VMs, so the policy
+        of the MIG the template was derived from is carried over.
+        """
+        cmd = [
+            "gcloud", "compute", "instance-groups", "managed", "create", mig_name,
+            f"--template={template_name}",
+            "--size=0",
+            f"--zone={zone}"
+        ]
+        if like_mig:
+            policy = self._run_command([
+                "gcloud", "compute", "instance-groups", "managed", "describe", like_mig, f"--zone={zone}"
+            ], fields=query.MIG_POLICY_FIELDS)
+            action = ((policy or {}).get("instanceLifecyclePolicy") or {}).get("defaultActionOnFailure")
+            if action:
+                cmd.append(f"--default-action-on-vm-failure={action.lower().replace('_', '-')}")
+
+        result = self._exec(cmd, "mutate")
+        if result.returncode != 0:
+            raise Exception(f"Failed to create MIG: {result.stderr}")
+        self._mig_zones = None
+
+    def ssh_to_vm(self, instance_name: str, zone: str, extra_args: Optional[List[str]] = None, env_file: Optional[str] = None, force_upload: bool = False):
         """SSH into a VM using gcloud"""
-        # Upload .env file if provided
-        self._upload_env_file(env_file, instance_name, zone)
+        # Upload .env file if provided and changed since the last push
+        skipped = self._upload_env_file(env_file, instance_name, zone, force_upload)
         
         cmd = [
             "gcloud", "compute", "ssh", instance_name,
-            f"--zone={zone}"
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name)
         ]
         
+        # Only a command that starts with the upload check can exit with STALE_UPLOAD_EXIT on its own behalf
+        verified = bool(skipped) and bool(env_file) and not extra_args
+        
         # If we have an env file, modify the command to source it in the shell
         if env_file and not extra_args:
             # Create a command that sources the env file and sets up GitHub auth if GITHUB_TOKEN exists
             cmd.extend([
                 "--",
-                "if [ -f /tmp/.env ]; then set -a; source /tmp/.env; set +a; if [ -n \"$GITHUB_TOKEN\" ]; then echo \"$GITHUB_TOKEN\" | gh auth login --with-token 2>/dev/null || true; fi; fi; exec bash -l"
+                self._verify_uploads(skipped) + "if [ -f /tmp/.env ]; then set -a; source /tmp/.env; set +a; if [ -n \"$GITHUB_TOKEN\" ]; then echo \"$GITHUB_TOKEN\" | gh auth login --with-token 2>/dev/null || true; fi; fi; exec bash -l"
             ])
         elif extra_args:
             cmd.append("--")
             cmd.extend(extra_args)
         
-        subprocess.run(cmd)
+        start = time.time()
+        result = self._exec(cmd, capture=False)
+        # A stale cached .env is detected before the shell starts, so only retry an immediate exit
+        if result.returncode == STALE_UPLOAD_EXIT and verified and time.time() - start < 30:
+            self.upload_cache.forget([instance_name])
+            self.ssh_to_vm(instance_name, zone, extra_args, env_file, force_upload=True)
     
     def scp_to_vm(self, local_path: str, instance_name: str, zone: str, remote_path: Optional[str] = None) -> bool:
         """Upload files to a VM using gcloud scp"""
@@ -365,10 +829,11 @@ class GCloudWrapper:
             "--recurse",
             local_path,
             target,
-            f"--zone={zone}"
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name, "--scp-flag")
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._exec(cmd)
         if result.returncode != 0 and result.stderr:
             print(f"Upload error: {result.stderr}")
         return result.returncode == 0
@@ -388,63 +853,259 @@ class GCloudWrapper:
             "--recurse",
             source,
             local_path,
-            f"--zone={zone}"
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name, "--scp-flag")
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._exec(cmd)
         if result.returncode != 0 and result.stderr:
             print(f"Download error: {result.stderr}")
         return result.returncode == 0
     
+    def _remote(self, instance_name: str, zone: str, command: str, **kwargs) -> subprocess.CompletedProcess:
+        """Run a shell command on a VM over SSH"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", command
+        ]
+        return self._exec(cmd, **kwargs)
+    
+    def _move_chunks(self, key: str, size: int, mtime: float, move: Callable[[int, int], bool], streams: int, on_progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Move a file's missing chunks over several streams at once, recording each that lands
+
+        size and mtime identify the source file, so a transfer only resumes
+        from the same content. move(offset, length) sends one chunk and returns
+        whether it arrived intact; each chunk gets CHUNK_ATTEMPTS tries.
+        """
+        chunks = transfer.chunks(size)
+        done = set(self.transfer_journal.start(key, {"size": size, "mtime": mtime, "chunk_size": transfer.CHUNK_SIZE}))
+        moved = [sum(chunks[index][1] for index in done if index < len(chunks))]
+        progress_lock = threading.Lock()
+        if on_progress:
+            on_progress(moved[0], size)
+        
+        def move_chunk(index):
+            offset, length = chunks[index]
+            for _ in range(transfer.CHUNK_ATTEMPTS):
+                if move(offset, length):
+                    self.transfer_journal.mark_done(key, index)
+                    with progress_lock:
+                        moved[0] += length
+                        if on_progress:
+                            on_progress(moved[0], size)
+                    return True
+            return False
+        
+        pending = [index for index in range(len(chunks)) if index not in done]
+        if not pending:
+            return True
+        with ThreadPoolExecutor(max_workers=max(1, min(streams, len(pending)))) as executor:
+            return all(list(executor.map(move_chunk, pending)))
+    
+    def _verify_transfer(self, local_path: str, instance_name: str, zone: str, remote_path: str) -> bool:
+        """Compare the SHA-256 of both copies of a transferred file, hashing them side by side"""
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            remote = executor.submit(self._remote, instance_name, zone, transfer.digest_command(remote_path))
+            local_digest = UploadCache.file_digest(local_path)
+            return transfer.parse_digest(remote.result().stdout) == local_digest
+    
+    def parallel_upload(self, local_path: str, instance_name: str, zone: str, remote_path: Optional[str] = None, streams: int = transfer.DEFAULT_STREAMS, on_progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Upload one large file over several SSH streams at once
+
+        The file is split into CHUNK_SIZE byte ranges, each written into place
+        on the VM with dd and checked with sha256 on both ends. Verified chunks
+        are recorded in ~/.migs/transfers.json, so rerunning an interrupted
+        upload only sends what is missing. The whole file is checked at the end.
+        """
+        name = os.path.basename(local_path)
+        remote_path = remote_path or f"~/{name}"
+        if remote_path.endswith("/"):
+            remote_path += name
+        stat = os.stat(local_path)
+        
+        prepared = self._remote(instance_name, zone, transfer.prepare_upload_command(remote_path, name, stat.st_size))
+        if prepared.returncode != 0 or not prepared.stdout.strip():
+            print(f"Upload error: {prepared.stderr}")
+            return False
+        target = prepared.stdout.strip().splitlines()[-1]
+        key = TransferJournal.key("upload", instance_name, os.path.abspath(local_path), target)
+        
+        def send(offset, length):
+            expected = transfer.range_digest(local_path, offset, length)
+            with transfer.range_pipe(local_path, offset, length) as chunk:
+                result = self._remote(instance_name, zone, transfer.upload_chunk_command(target, offset, length), stdin=chunk)
+            return result.returncode == 0 and transfer.parse_digest(result.stdout) == expected
+        
+        if not self._move_chunks(key, stat.st_size, stat.st_mtime, send, streams, on_progress):
+            print(f"Upload error: some chunks of {local_path} failed, run the upload again to resume")
+            return False
+        intact = self._verify_transfer(local_path, instance_name, zone, target)
+        self.transfer_journal.finish(key)
+        if not intact:
+            print(f"Upload error: checksum mismatch for {target}, run the upload again to start over")
+        return intact
+    
+    def parallel_download(self, remote_path: str, instance_name: str, zone: str, local_path: Optional[str] = None, streams: int = transfer.DEFAULT_STREAMS, on_progress: Optional[Callable[[int, int], None]] = None) -> bool:
+        """Download one large file over several SSH streams at once
+
+        The counterpart of parallel_upload: byte ranges are read with dd on
+        the VM and written into place locally, and the download resumes from
+        the chunks that already landed intact.
+        """
+        stat = self._remote(instance_name, zone, transfer.stat_command(remote_path))
+        lines = stat.stdout.strip().splitlines()
+        if stat.returncode != 0 or len(lines) < 2:
+            print(f"Download error: {stat.stderr or f'{remote_path} is not a file'}")
+            return False
+        source = lines[-2]
+        size, mtime = (int(value) for value in lines[-1].split())
+        
+        local_path = local_path or "."
+        if os.path.isdir(local_path) or local_path.endswith(os.sep):
+            local_path = os.path.join(local_path, os.path.basename(source))
+        key = TransferJournal.key("download", instance_name, os.path.abspath(local_path), source)
+        if not os.path.exists(local_path) or os.path.getsize(local_path) != size:
+            # Whatever was recorded no longer matches the local copy
+            self.transfer_journal.finish(key)
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            with open(local_path, "ab"):
+                pass
+            os.truncate(local_path, size)
+        
+        def fetch(offset, length):
+            with open(local_path, "r+b") as f:
+                f.seek(offset)
+                result = self._remote(instance_name, zone, transfer.download_chunk_command(source, offset, length), stdout=f)
+            return result.returncode == 0 and transfer.parse_digest(result.stderr) == transfer.range_digest(local_path, offset, length)
+        
+        if not self._move_chunks(key, size, mtime, fetch, streams, on_progress):
+            print(f"Download error: some chunks of {source} failed, run the download again to resume")
+            return False
+        intact = self._verify_transfer(local_path, instance_name, zone, source)
+        self.transfer_journal.finish(key)
+        if not intact:
+            print(f"Download error: checksum mismatch for {local_path}, run the download again to start over")
+        return intact
+    
     def check_ssh_connectivity(self, instance_name: str, zone: str) -> bool:
         """Check if SSH connectivity is available to a VM"""
         cmd = [
             "gcloud", "compute", "ssh", instance_name,
             f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
             "--command", "echo 'Connection successful'"
         ]
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+            result = self._exec(cmd, timeout=10)
             return result.returncode == 0 and "Connection successful" in result.stdout
         except subprocess.TimeoutExpired:
             return False
+
+    def _control_path(self, instance_name: str) -> Path:
+        """Path of the SSH control socket for an instance's connection master"""
+        return self.control_dir / instance_name
     
-    def _upload_env_file(self, env_file: Optional[str], instance_name: str, zone: str) -> bool:
-        """Upload .env file to VM if provided"""
-        if not env_file:
-            return True
-            
+    def ssh_master_flags(self, instance_name: str, flag: str = "--ssh-flag") -> List[str]:
+        """Flags to reuse an open SSH connection master for an instance, if there is one"""
+        control_path = self._control_path(instance_name)
+        if not control_path.exists():
+            return []
+        return [f"{flag}=-oControlPath={control_path}", f"{flag}=-oControlMaster=no"]
+    
+    def start_ssh_master(self, instance_name: str, zone: str) -> subprocess.Popen:
+        """Open a background SSH connection master that later gcloud ssh/scp calls reuse"""
+        self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        control_path = self._control_path(instance_name)
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            f"--ssh-flag=-oControlPath={control_path}",
+            "--ssh-flag=-oControlMaster=yes",
+            "--ssh-flag=-oServerAliveInterval=30",
+            "--ssh-flag=-N"
+        ]
+        self.executor.acquire("read")
+        return subprocess.Popen(
+            self.with_project(cmd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    
+    def _push_file(self, local_path: str, instance_name: str, zone: str, remote_path: str, force: bool = False) -> Optional[tuple[str, bool]]:
+        """Copy a file to a VM unless the VM already has the same content there
+
+        Returns (sha256, skipped), or None if the upload failed. When skipped
+        is True the caller should verify the remote copy with _verify_uploads.
+        """
+        digest = UploadCache.file_digest(local_path)
+        if not force and self.upload_cache.is_current(instance_name, remote_path, digest):
+            return digest, True
+
         cmd = [
             "gcloud", "compute", "scp",
-            env_file,
-            f"{instance_name}:/tmp/.env",
-            f"--zone={zone}"
+            local_path,
+            f"{instance_name}:{remote_path}",
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name, "--scp-flag")
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = self._exec(cmd)
         if result.returncode != 0:
+            return None
+        self.upload_cache.record(instance_name, remote_path, digest)
+        return digest, False
+    
+    @staticmethod
+    def _verify_uploads(skipped: Dict[str, str]) -> str:
+        """Remote shell prefix that exits with STALE_UPLOAD_EXIT unless every skipped upload is intact"""
+        if not skipped:
+            return ""
+        manifest = " ".join(shlex.quote(f"{digest}  {path}") for path, digest in skipped.items())
+        return f"printf '%s\\n' {manifest} | sha256sum -c --status 2>/dev/null || exit {STALE_UPLOAD_EXIT}; "
+    
+    def _upload_env_file(self, env_file: Optional[str], instance_name: str, zone: str, force: bool = False) -> Optional[Dict[str, str]]:
+        """Upload .env file to VM if provided and changed
+
+        Returns {remote_path: sha256} for an upload that was skipped because the
+        VM already had it (empty if nothing was skipped), or None on failure.
+        """
+        if not env_file:
+            return {}
+        
+        pushed = self._push_file(env_file, instance_name, zone, "/tmp/.env", force)
+        if pushed is None:
             print(f"Warning: Failed to upload .env file")
-        return result.returncode == 0
+            return None
+        digest, skipped = pushed
+        return {"/tmp/.env": digest} if skipped else {}
     
-    def run_script(self, script_path: str, instance_name: str, zone: str, session_name: str, script_args: Optional[List[str]] = None, env_file: Optional[str] = None, extra_env: Optional[Dict[str, str]] = None) -> bool:
-        """Upload and run a script on a VM in a tmux session"""
+    def run_script(self, script_path: str, instance_name: str, zone: str, session_name: str, script_args: Optional[List[str]] = None, env_file: Optional[str] = None, extra_env: Optional[Dict[str, str]] = None, force_upload: bool = False, barrier: bool = False) -> bool:
+        """Upload and run a script on a VM in a tmux session
+
+        The script and .env file are only copied when their content changed
+        since the last push to this VM. Skipped copies are checked on the VM
+        before launching, and everything is re-pushed once if they went stale.
+
+        With barrier, the session is staged but holds the script until
+        release_launch gives it a start time (see Client.run).
+        """
         script_name = os.path.basename(script_path)
         
         # First upload the script
         remote_script = f"/tmp/{script_name}"
-        upload_cmd = [
-            "gcloud", "compute", "scp",
-            script_path,
-            f"{instance_name}:{remote_script}",
-            f"--zone={zone}"
-        ]
-        
-        result = subprocess.run(upload_cmd, capture_output=True, text=True)
-        if result.returncode != 0:
+        pushed = self._push_file(script_path, instance_name, zone, remote_script, force_upload)
+        if pushed is None:
             return False
+        skipped = {remote_script: pushed[0]} if pushed[1] else {}
         
         # Upload .env file if provided
-        self._upload_env_file(env_file, instance_name, zone)
+        skipped_env = self._upload_env_file(env_file, instance_name, zone, force_upload)
+        if skipped_env:
+            skipped.update(skipped_env)
         
         # Build the command with arguments
         cmd_with_args = remote_script
@@ -458,19 +1119,164 @@ class GCloudWrapper:
         if extra_env:
             env_exports = " ".join(f"export {k}={v};" for k, v in extra_env.items()) + " "
         
+        stage = ""
+        if barrier:
+            go_file, started_file = self._launch_files(session_name)
+            stage = f"rm -f {go_file} {started_file} && "
+            # Sourcing .env and gh auth happen before the wait, so only the script itself is held
+            env_exports += (
+                f"for i in $(seq {LAUNCH_BARRIER_TIMEOUT * 10}); do [ -s {go_file} ] && break; sleep 0.1; done; "
+                f"T=$(cat {go_file} 2>/dev/null); "
+                f"case $T in \"\"|abort) echo \"migs: launch was not released, not starting\"; exec bash ;; esac; "
+                f"D=$(awk \"BEGIN {{ print $T - $(date +%s.%N) }}\"); "
+                f"case $D in -*) ;; *) sleep $D ;; esac; "
+                f"date +%s.%N > {started_file}; "
+            )
+        
         # Build the full command with optional env sourcing and GitHub auth
         if env_file:
-            full_command = f"chmod +x {remote_script} && tmux new-session -d -s {session_name} bash -c 'set -a; source /tmp/.env; set +a; if [ -n \"$GITHUB_TOKEN\" ]; then echo \"$GITHUB_TOKEN\" | gh auth login --with-token 2>/dev/null || true; fi; {env_exports}{cmd_with_args}; exec bash'"
+            full_command = f"{stage}chmod +x {remote_script} && tmux new-session -d -s {session_name} bash -c 'set -a; source /tmp/.env; set +a; if [ -n \"$GITHUB_TOKEN\" ]; then echo \"$GITHUB_TOKEN\" | gh auth login --with-token 2>/dev/null || true; fi; {env_exports}{cmd_with_args}; exec bash'"
         else:
-            full_command = f"chmod +x {remote_script} && tmux new-session -d -s {session_name} bash -c '{env_exports}{cmd_with_args}; exec bash'"
+            full_command = f"{stage}chmod +x {remote_script} && tmux new-session -d -s {session_name} bash -c '{env_exports}{cmd_with_args}; exec bash'"
         
         # Make script executable and run in tmux
         run_cmd = [
             "gcloud", "compute", "ssh", instance_name,
             f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
             "--command",
-            full_command
+            self._verify_uploads(skipped) + full_command
+        ]
+        
+        result = self._exec(run_cmd)
+        if result.returncode == STALE_UPLOAD_EXIT and skipped and not force_upload:
+            # /tmp was cleared (e.g. reboot) or the files were edited on the VM
+            self.upload_cache.forget([instance_name])
+            return self.run_script(script_path, instance_name, zone, session_name, script_args, env_file, extra_env, force_upload=True, barrier=barrier)
+        return result.returncode == 0
+    
+    @staticmethod
+    def _launch_files(session_name: str) -> tuple[str, str]:
+        """Remote files a staged launch waits on and records its start time in"""
+        return f"/tmp/migs-launch-{session_name}.go", f"/tmp/migs-launch-{session_name}.started"
+    
+    def release_launch(self, instance_name: str, zone: str, session_name: str, start_at: Optional[float]) -> bool:
+        """Tell a staged launch when to start its script (wall-clock time), or to give up if start_at is None"""
+        go_file, _ = self._launch_files(session_name)
+        value = f"{start_at:.3f}" if start_at is not None else "abort"
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", f"echo {value} > {go_file}.tmp && mv {go_file}.tmp {go_file}"
+        ]
+        
+        return self._exec(cmd).returncode == 0
+    
+    def remote_time(self, instance_name: str, zone: str) -> Optional[float]:
+        """A VM's wall-clock time, read over SSH"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", "date +%s.%N"
         ]
         
-        result = subprocess.run(run_cmd, capture_output=True, text=True)
-        return result.returncode == 0
\ No newline at end of file
+        result = self._exec(cmd, capture=True)
+        try:
+            return float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+        except (ValueError, IndexError):
+            return None
+    
+    def launch_start_time(self, instance_name: str, zone: str, session_name: str, timeout: int = 10) -> Optional[float]:
+        """Wall-clock time, by the VM's clock, at which a released launch started its script"""
+        _, started_file = self._launch_files(session_name)
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", f"for i in $(seq {timeout * 10}); do [ -s {started_file} ] && break; sleep 0.1; done; cat {started_file}"
+        ]
+        
+        result = self._exec(cmd, capture=True)
+        try:
+            return float(result.stdout.strip()) if result.returncode == 0 else None
+        except ValueError:
+            return None
+    
+    def submit_job(self, script_path: str, instance_name: str, zone: str, gpus: int, script_args: Optional[List[str]] = None, env_file: Optional[str] = None, name: Optional[str] = None, force_upload: bool = False) -> str:
+        """Queue a script on a VM's job queue, to start once gpus GPUs are free
+
+        The script is pushed to a content-addressed path, so submitting the
+        same script many times only uploads it once. Returns the job ID.
+        """
+        remote_script = f"/tmp/migs-job-{UploadCache.file_digest(script_path)[:16]}.sh"
+        pushed = self._push_file(script_path, instance_name, zone, remote_script, force_upload)
+        if pushed is None:
+            raise Exception(f"Failed to upload {script_path}")
+        skipped = {remote_script: pushed[0]} if pushed[1] else {}
+        
+        skipped_env = self._upload_env_file(env_file, instance_name, zone, force_upload)
+        if skipped_env is None:
+            raise Exception(f"Failed to upload {env_file}")
+        skipped.update(skipped_env)
+        
+        job_id = jobqueue.new_job_id()
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command",
+            self._verify_uploads(skipped) + jobqueue.submit_command(job_id, remote_script, gpus, script_args, "/tmp/.env" if env_file else None, name)
+        ]
+        
+        result = self._exec(cmd)
+        if result.returncode == STALE_UPLOAD_EXIT and skipped and not force_upload:
+            self.upload_cache.forget([instance_name])
+            return self.submit_job(script_path, instance_name, zone, gpus, script_args, env_file, name, force_upload=True)
+        if result.returncode != 0:
+            raise Exception(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "Failed to submit job")
+        return job_id
+    
+    def list_jobs(self, instance_name: str, zone: str) -> Optional[Dict]:
+        """Get a VM's GPU count and job queue as {"gpus": n, "jobs": [...]}, or None on failure"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", jobqueue.LIST_COMMAND
+        ]
+        
+        result = self._exec(cmd)
+        if result.returncode != 0:
+            return None
+        return jobqueue.parse_listing(result.stdout)
+    
+    def cancel_job(self, instance_name: str, zone: str, job_id: str) -> bool:
+        """Cancel a queued or running job on a VM"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", jobqueue.cancel_command(job_id)
+        ]
+        
+        return self._exec(cmd).returncode == 0
+    
+    def network_probe(self, instance_name: str, zone: str, port: int, start: float, rounds: int, sends: List) -> Optional[Dict]:
+        """Run a node's side of a cluster network check, returning its probe result or None on failure"""
+        cmd = [
+            "gcloud", "compute", "ssh", instance_name,
+            f"--zone={zone}",
+            *self.ssh_master_flags(instance_name),
+            "--command", netcheck.probe_command(port, start, rounds, sends)
+        ]
+        
+        timeout = start - time.time() + rounds * netcheck.SLOT_SECONDS + 60
+        try:
+            result = self._exec(cmd, capture=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None
+        if result.returncode != 0:
+            return None
+        return netcheck.parse_probe(result.stdout)
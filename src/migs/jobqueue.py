@@ -0,0 +1,155 @@
+import re
+import secrets
+import shlex
+import time
+from typing import Dict, List, Optional
+
+# Each job is a directory under QUEUE_DIR/jobs holding its script, env, args,
+# GPU count and state files, so the queue survives dropped SSH connections.
+QUEUE_DIR = "$HOME/.migs-queue"
+
+# Runs detached on the node while there is work, starting queued jobs in
+# submission order whenever enough GPUs are free. Smaller jobs may start ahead
+# of a larger one that doesn't fit yet, which keeps GPUs busy.
+SCHEDULER_SCRIPT = r"""#!/bin/bash
+Q="$HOME/.migs-queue"
+exec 9>"$Q/sched.lock"
+flock -n 9 || exit 0
+TOTAL=$(nvidia-smi -L 2>/dev/null | wc -l)
+while true; do
+  busy=" "
+  active=0
+  for d in "$Q"/jobs/*/; do
+    [ "$(cat "$d/state" 2>/dev/null)" = running ] || continue
+    if [ -f "$d/exit_code" ]; then
+      [ "$(cat "$d/exit_code")" = 0 ] && echo done > "$d/state" || echo failed > "$d/state"
+      date +%s > "$d/finished"
+    elif ! kill -0 "$(cat "$d/pid" 2>/dev/null)" 2>/dev/null; then
+      echo failed > "$d/state"
+      date +%s > "$d/finished"
+    else
+      busy="$busy$(tr , ' ' < "$d/devices") "
+      active=1
+    fi
+  done
+  for d in "$Q"/jobs/*/; do
+    [ "$(cat "$d/state" 2>/dev/null)" = queued ] || continue
+    active=1
+    need=$(cat "$d/gpus")
+    free=""
+    for i in $(seq 0 $((TOTAL - 1))); do
+      case "$busy" in *" $i "*) ;; *) free="$free $i" ;; esac
+    done
+    set -- $free
+    [ $# -ge "$need" ] || continue
+    devices=$(echo $free | tr ' ' '\n' | head -n "$need" | paste -sd, -)
+    echo "$devices" > "$d/devices"
+    busy="$busy$(echo "$devices" | tr , ' ') "
+    date +%s > "$d/started"
+    echo running > "$d/state"
+    CUDA_VISIBLE_DEVICES="$devices" JOB_DIR="$d" setsid bash -c '
+      cd "$HOME"
+      set -a; [ -f "$JOB_DIR/env" ] && . "$JOB_DIR/env"; set +a
+      eval "set -- $(cat "$JOB_DIR/args")"
+      bash "$JOB_DIR/script" "$@" > "$JOB_DIR/log" 2>&1
+      echo $? > "$JOB_DIR/exit_code"
+    ' < /dev/null > /dev/null 2>&1 &
+    echo $! > "$d/pid"
+  done
+  if [ "$active" = 0 ]; then
+    # A job queued while this scheduler was about to exit must not be stranded
+    flock -u 9
+    grep -qx queued "$Q"/jobs/*/state 2>/dev/null || exit 0
+    flock -n 9 || exit 0
+  fi
+  sleep 1
+done
+"""
+
+# Prints the node's GPU count, then one line per job
+LIST_COMMAND = f"""
+echo "GPUS $(nvidia-smi -L 2>/dev/null | wc -l)"
+for d in {QUEUE_DIR}/jobs/*/; do
+  [ -f "$d/state" ] || continue
+  printf 'JOB %s|%s|%s|%s|%s|%s|%s|%s|%s\\n' "$(basename "$d")" "$(cat "$d/state")" "$(cat "$d/gpus")" \\
+    "$(cat "$d/devices" 2>/dev/null)" "$(cat "$d/submitted" 2>/dev/null)" "$(cat "$d/started" 2>/dev/null)" \\
+    "$(cat "$d/finished" 2>/dev/null)" "$(cat "$d/exit_code" 2>/dev/null)" "$(cat "$d/name" 2>/dev/null)"
+done
+"""
+
+JOB_FIELDS = ["id", "state", "gpus", "devices", "submitted", "started", "finished", "exit_code", "name"]
+
+
+def new_job_id() -> str:
+    """A job ID that sorts in submission order"""
+    now = time.time()
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{secrets.token_hex(2)}"
+
+
+def submit_command(job_id: str, remote_script: str, gpus: int, script_args: Optional[List[str]] = None, env_path: Optional[str] = None, name: Optional[str] = None) -> str:
+    """Remote shell command that queues a job from an uploaded script and makes sure the scheduler runs
+
+    Exits with 3 if the node has fewer GPUs than the job needs.
+    """
+    job_dir = f"{QUEUE_DIR}/jobs/{job_id}"
+    staging = f"{QUEUE_DIR}/staging/{job_id}"
+    args = " ".join(shlex.quote(arg) for arg in script_args or [])
+    return f"""
+total=$(nvidia-smi -L 2>/dev/null | wc -l)
+if [ {gpus} -gt "$total" ]; then echo "Job needs {gpus} GPUs but the node has $total" >&2; exit 3; fi
+mkdir -p {QUEUE_DIR}/jobs {staging}
+cat > {QUEUE_DIR}/sched.sh.$$ <<'MIGS_SCHEDULER'
+{SCHEDULER_SCRIPT}MIGS_SCHEDULER
+mv {QUEUE_DIR}/sched.sh.$$ {QUEUE_DIR}/sched.sh
+cp {remote_script} {staging}/script
+{f"cp {env_path} {staging}/env" if env_path else ":"}
+printf '%s\\n' {shlex.quote(args)} > {staging}/args
+echo {gpus} > {staging}/gpus
+printf '%s\\n' {shlex.quote(name or "")} > {staging}/name
+date +%s > {staging}/submitted
+echo queued > {staging}/state
+mv {staging} {job_dir}
+nohup setsid bash {QUEUE_DIR}/sched.sh < /dev/null > /dev/null 2>&1 &
+"""
+
+
+def cancel_command(job_id: str) -> str:
+    """Remote shell command that cancels a queued or running job, killing its process group"""
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", job_id):
+        raise ValueError(f"Invalid job ID: {job_id}")
+    job_dir = f"{QUEUE_DIR}/jobs/{job_id}"
+    return f"""
+[ -d {job_dir} ] || exit 3
+state=$(cat {job_dir}/state)
+case "$state" in
+  queued) echo cancelled > {job_dir}/state ;;
+  running) echo cancelled > {job_dir}/state; kill -- -"$(cat {job_dir}/pid)" 2>/dev/null; date +%s > {job_dir}/finished ;;
+esac
+"""
+
+
+def parse_listing(output: str) -> Dict:
+    """Parse LIST_COMMAND output into {"gpus": total, "jobs": [job dicts]}"""
+    listing = {"gpus": 0, "jobs": []}
+    for line in output.splitlines():
+        kind, _, rest = line.strip().partition(" ")
+        if kind == "GPUS":
+            listing["gpus"] = int(rest or 0)
+        elif kind == "JOB":
+            values = rest.split("|", len(JOB_FIELDS) - 1)
+            job = dict(zip(JOB_FIELDS, values + [""] * (len(JOB_FIELDS) - len(values))))
+            job["gpus"] = int(job["gpus"] or 0)
+            for key in ("submitted", "started", "finished"):
+                job[key] = int(job[key]) if job[key].isdigit() else None
+            job["exit_code"] = int(job["exit_code"]) if job["exit_code"].lstrip("-").isdigit() else None
+            if job["state"] == "running" and job["exit_code"] is not None:
+                # Finished since the scheduler last looked
+                job["state"] = "done" if job["exit_code"] == 0 else "failed"
+            listing["jobs"].append(job)
+    listing["jobs"].sort(key=lambda job: job["id"])
+    return listing
+
+
+def free_gpus(listing: Dict) -> int:
+    """GPUs left on a node once everything running and queued has its share"""
+    return listing["gpus"] - sum(job["gpus"] for job in listing["jobs"] if job["state"] in ("queued", "running"))
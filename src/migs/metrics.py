@@ -0,0 +1,81 @@
+import math
+import time
+from typing import Dict, List, Optional, Sequence
+
+# How many of a MIG's latest attempts `up --fastest` ranks it by
+RECENT_ATTEMPTS = 20
+
+GROUPINGS = ["mig", "zone", "machine-type", "hour"]
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of values, None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def group_key(attempt: Dict, by: str) -> str:
+    """Label of the group an attempt falls in for a `migs stats` grouping"""
+    if by == "zone":
+        return attempt["zone"]
+    if by == "machine-type":
+        return attempt.get("machine_type") or "unknown"
+    if by == "hour":
+        return f"{attempt['hour']:02d}:00" if attempt.get("hour") is not None else "unknown"
+    project = f"{attempt['project']}/" if attempt.get("project") else ""
+    return f"{project}{attempt['mig_name']} ({attempt['zone']})"
+
+
+def summarize(attempts: List[Dict], by: str = "mig", days: Optional[float] = None) -> List[Dict]:
+    """Attempt counts and time-to-capacity and time-to-ready percentiles per group
+
+    Capacity is how long the last VM took to be created after the resize
+    request was submitted; ready is how long until it was RUNNING as seen by
+    the waiting client (only recorded when someone was waiting all along).
+    Attempts that lost a race are counted but have no timings.
+    """
+    if days is not None:
+        cutoff = time.time() - days * 86400
+        attempts = [attempt for attempt in attempts if (attempt.get("submitted") or 0) >= cutoff]
+
+    groups = {}
+    for attempt in attempts:
+        groups.setdefault(group_key(attempt, by), []).append(attempt)
+
+    rows = []
+    for key, group in groups.items():
+        capacity = [attempt["capacity_seconds"] for attempt in group if attempt.get("capacity_seconds") is not None]
+        ready = [max(attempt["ready_seconds"]) for attempt in group if attempt.get("ready_seconds")]
+        rows.append({
+            "group": key,
+            "attempts": len(group),
+            "succeeded": sum(1 for attempt in group if attempt["outcome"] == "succeeded"),
+            "failed": sum(1 for attempt in group if attempt["outcome"] == "failed"),
+            "lost": sum(1 for attempt in group if attempt["outcome"] == "lost"),
+            "capacity_p50": percentile(capacity, 50),
+            "capacity_p90": percentile(capacity, 90),
+            "capacity_max": max(capacity) if capacity else None,
+            "ready_p50": percentile(ready, 50),
+            "ready_p90": percentile(ready, 90)
+        })
+    return sorted(rows, key=lambda row: row["group"])
+
+
+def recent_p50(attempts: List[Dict], mig_name: str, project: Optional[str] = None) -> Optional[float]:
+    """Median time to capacity over a MIG's latest attempts, None without history
+
+    Failed attempts count as never getting capacity, so a MIG that keeps
+    failing ranks behind one that is slow but reliable.
+    """
+    own = [
+        attempt for attempt in attempts
+        if attempt["mig_name"] == mig_name and attempt.get("project") == project and attempt["outcome"] != "lost"
+    ][-RECENT_ATTEMPTS:]
+    times = [
+        math.inf if attempt["outcome"] == "failed" else attempt["capacity_seconds"]
+        for attempt in own
+        if attempt["outcome"] == "failed" or attempt.get("capacity_seconds") is not None
+    ]
+    return percentile(times, 50)
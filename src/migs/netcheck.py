@@ -0,0 +1,158 @@
+import json
+import shlex
+from typing import Dict, List, Optional
+
+# Port run --torchrun points every node at for rendezvous on the head node
+RENDEZVOUS_PORT = 5000
+
+# Seconds between starting the probes and the first round, so every node's
+# SSH connection is up before any of them starts sending
+START_LEAD = 8.0
+
+# Each pair of nodes gets a slot of this many seconds: a connect, a burst of
+# ping-pongs for latency, then STREAM_SECONDS of one-way bulk data
+SLOT_SECONDS = 4.0
+STREAM_SECONDS = 2.0
+PINGS = 20
+
+# A link is flagged when its throughput is below this fraction of the
+# cluster's median, or its latency above this multiple of the median
+SLOW_THROUGHPUT_FRACTION = 0.5
+SLOW_LATENCY_FACTOR = 3.0
+
+# Runs on every node with python3. It serves the port for the whole check
+# (echoing pings, counting bulk bytes) while sending to its peer in each
+# round at the agreed wall-clock time, then prints one JSON line.
+PROBE_SCRIPT = r"""
+import json, socket, statistics, sys, threading, time
+cfg = json.loads(sys.argv[1])
+result = {"listening": True, "links": {}}
+
+def serve(conn):
+    try:
+        kind = conn.recv(1)
+        if kind == b"P":
+            while True:
+                byte = conn.recv(1)
+                if not byte:
+                    break
+                conn.sendall(byte)
+        elif kind == b"B":
+            total = 0
+            while True:
+                chunk = conn.recv(1 << 20)
+                if not chunk:
+                    break
+                total += len(chunk)
+            conn.sendall(str(total).encode())
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+def accept(server):
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return
+        conn.settimeout(cfg["slot"] * 2)
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+try:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("0.0.0.0", cfg["port"]))
+    server.listen(64)
+    threading.Thread(target=accept, args=(server,), daemon=True).start()
+except OSError as e:
+    result["listening"] = False
+    result["error"] = str(e)
+
+def connect(ip):
+    sock = socket.create_connection((ip, cfg["port"]), timeout=3)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.settimeout(cfg["slot"])
+    return sock
+
+for rnd, peer, ip in cfg["sends"]:
+    time.sleep(max(0.0, cfg["start"] + rnd * cfg["slot"] - time.time()))
+    link = {}
+    try:
+        with connect(ip) as sock:
+            sock.sendall(b"P")
+            rtts = []
+            for _ in range(cfg["pings"]):
+                sent = time.perf_counter()
+                sock.sendall(b"x")
+                if not sock.recv(1):
+                    raise OSError("connection closed")
+                rtts.append(time.perf_counter() - sent)
+            link["rtt_ms"] = statistics.median(rtts) * 1000
+        with connect(ip) as sock:
+            sock.sendall(b"B")
+            block = b"\0" * (1 << 20)
+            started = time.perf_counter()
+            while time.perf_counter() - started < cfg["stream"]:
+                sock.sendall(block)
+            sock.shutdown(socket.SHUT_WR)
+            reply = b""
+            while True:
+                chunk = sock.recv(64)
+                if not chunk:
+                    break
+                reply += chunk
+            link["gbps"] = int(reply) * 8 / (time.perf_counter() - started) / 1e9
+    except (OSError, ValueError) as e:
+        link["error"] = str(e) or type(e).__name__
+    result["links"][peer] = link
+
+# Keep serving until every peer's last round is over
+time.sleep(max(0.0, cfg["start"] + cfg["rounds"] * cfg["slot"] + 0.5 - time.time()))
+print(json.dumps(result))
+"""
+
+
+def schedule(count: int, ring: bool = False) -> List[List[Optional[int]]]:
+    """Who each node sends to, round by round, as node indices (None sits a round out)
+
+    All-pairs uses the circle method, so every round is a perfect matching:
+    each pair measures both directions at once and no node is in two tests at
+    a time. A ring is a single round where each node sends to the next.
+    """
+    if count < 2:
+        return []
+    if ring:
+        return [[(idx + 1) % count for idx in range(count)]]
+
+    slots = list(range(count)) + ([None] if count % 2 else [])
+    half = len(slots) // 2
+    rounds = []
+    for _ in range(len(slots) - 1):
+        peers = [None] * count
+        for a, b in zip(slots[:half], reversed(slots[half:])):
+            if a is not None and b is not None:
+                peers[a], peers[b] = b, a
+        rounds.append(peers)
+        slots = [slots[0], slots[-1]] + slots[1:-1]
+    return rounds
+
+
+def probe_command(port: int, start: float, rounds: int, sends: List) -> str:
+    """Remote shell command running PROBE_SCRIPT for one node
+
+    sends is a list of [round, peer name, peer IP].
+    """
+    cfg = {"port": port, "start": start, "rounds": rounds, "slot": SLOT_SECONDS, "stream": STREAM_SECONDS, "pings": PINGS, "sends": sends}
+    return f"python3 -c {shlex.quote(PROBE_SCRIPT)} {shlex.quote(json.dumps(cfg))}"
+
+
+def parse_probe(output: str) -> Optional[Dict]:
+    """The JSON result line of a probe, None if it never printed one"""
+    for line in reversed(output.splitlines()):
+        if line.startswith("{"):
+            try:
+                return json.loads(line)
+            except ValueError:
+                return None
+    return None
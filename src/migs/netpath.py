@@ -0,0 +1,94 @@
+import selectors
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from migs.readiness import probe_ssh_port
+
+# Ways SSH can reach a VM, in order of preference when RTTs tie
+PATHS = ["internal", "external", "bastion", "iap"]
+
+# Managed Host block for the bastion in ~/.ssh/config, multiplexed so every
+# VM behind it shares one connection
+BASTION_ALIAS = "migs-bastion"
+
+
+def parse_bastion(spec: str) -> Dict:
+    """Split a [user@]host[:port] bastion spec from config.json"""
+    user, _, host = spec.rpartition("@")
+    host, _, port = host.partition(":")
+    return {"host": host, "user": user or None, "port": int(port) if port else None}
+
+
+def iap_proxy_command(instance_name: str, zone: str, project: Optional[str] = None) -> List[str]:
+    """gcloud command that tunnels a VM's SSH port over stdin/stdout through IAP"""
+    cmd = ["gcloud", "compute", "start-iap-tunnel", instance_name, "22", "--listen-on-stdin", f"--zone={zone}", "--verbosity=warning"]
+    if project:
+        cmd.append(f"--project={project}")
+    return cmd
+
+
+def measure_direct(host: Optional[str], timeout: float) -> Optional[float]:
+    """Seconds until a host's SSH banner arrives over a direct TCP connection, None if it didn't"""
+    if not host:
+        return None
+    start = time.time()
+    return time.time() - start if probe_ssh_port(host, timeout=timeout) else None
+
+
+def measure_proxy(cmd: List[str], timeout: float) -> Optional[float]:
+    """Seconds until an SSH banner arrives through a stdin/stdout proxy command, None if it didn't"""
+    start = time.time()
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+            banner = b""
+            while time.time() - start < timeout:
+                if not selector.select(timeout=max(0.0, timeout - (time.time() - start))):
+                    break
+                chunk = proc.stdout.read1(256)
+                if not chunk:
+                    break
+                banner += chunk
+                if banner.startswith(b"SSH-"):
+                    return time.time() - start
+        return None
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def measure_paths(node: Dict, bastion: bool = False, timeout: float = 2.0) -> Dict[str, Optional[float]]:
+    """Time the SSH banner over every path to a node, all at once
+
+    The node dict needs instance_name, zone and optionally internal_ip,
+    external_ip and project. The bastion path is only tried when a bastion is
+    configured. IAP starts a gcloud process per probe, so it is only tried
+    when no other path works.
+    """
+    probes = {
+        "internal": lambda: measure_direct(node.get("internal_ip"), timeout),
+        "external": lambda: measure_direct(node.get("external_ip"), timeout)
+    }
+    if bastion and node.get("internal_ip"):
+        probes["bastion"] = lambda: measure_proxy(
+            ["ssh", "-o", "BatchMode=yes", "-o", f"ConnectTimeout={int(timeout) + 1}", "-W", f"{node['internal_ip']}:22", BASTION_ALIAS],
+            timeout + 3
+        )
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {path: executor.submit(probe) for path, probe in probes.items()}
+        rtts = {path: future.result() for path, future in futures.items()}
+    if not any(rtt is not None for rtt in rtts.values()):
+        rtts["iap"] = measure_proxy(iap_proxy_command(node["instance_name"], node["zone"], node.get("project")), timeout + 10)
+    return rtts
+
+
+def fastest(rtts: Dict[str, Optional[float]]) -> Optional[str]:
+    """The path with the lowest RTT, None if no path worked"""
+    working = [path for path in PATHS if rtts.get(path) is not None]
+    return min(working, key=lambda path: rtts[path]) if working else None
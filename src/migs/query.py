@@ -0,0 +1,62 @@
+from typing import Iterable, List
+
+
+def _quote(value: str) -> str:
+    """Quote a filter value if it contains characters gcloud treats specially"""
+    if any(c in value for c in " ()\"'"):
+        return '"' + value.replace('"', '\\"') + '"'
+    return value
+
+
+def any_of(key: str, values: Iterable[str]) -> str:
+    """Filter matching resources whose key equals any of the values"""
+    return f"{key}=({' '.join(_quote(v) for v in values)})"
+
+
+def equals(key: str, value: str) -> str:
+    """Filter matching resources whose key equals the value"""
+    return f"{key}={_quote(value)}"
+
+
+def matches(key: str, pattern: str) -> str:
+    """Filter matching resources whose key matches a regular expression"""
+    return f"{key}~{pattern}"
+
+
+def all_of(*exprs: str) -> str:
+    """Combine filter expressions with AND"""
+    return " AND ".join(f"({expr})" for expr in exprs if expr)
+
+
+def negate(expr: str) -> str:
+    """Negate a filter expression"""
+    return f"NOT ({expr})"
+
+
+def projection(fields: List[str]) -> str:
+    """gcloud --format value that returns JSON with only the given fields"""
+    return f"json({','.join(fields)})"
+
+
+# Field projections for the resources migs reads, so gcloud only returns what each call site needs
+MIG_FIELDS = ["name", "zone", "size", "targetSize"]
+MANAGED_INSTANCE_FIELDS = ["name", "id", "instance", "instanceStatus", "currentAction"]
+RESIZE_REQUEST_FIELDS = ["name", "state"]
+INSTANCE_FIELDS = [
+    "name",
+    "zone",
+    "status",
+    "networkInterfaces[].networkIP",
+    "networkInterfaces[].accessConfigs[].natIP",
+    "machineType",
+    "creationTimestamp"
+]
+
+BOOT_DISK_FIELDS = ["disks[].boot", "disks[].deviceName", "disks[].source"]
+MIG_POLICY_FIELDS = ["instanceLifecyclePolicy.defaultActionOnFailure"]
+
+# The created-by metadata entry links an instance to the MIG that manages it
+SNAPSHOT_FIELDS = INSTANCE_FIELDS + ["metadata.items"]
+
+# GKE node pools show up as MIGs but are managed by GKE, not by migs
+NOT_GKE_POOL = negate(all_of(matches("name", "^gke-"), matches("name", "default-pool")))
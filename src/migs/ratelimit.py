@@ -0,0 +1,145 @@
+import random
+import subprocess
+import threading
+import time
+from typing import IO, Dict, List, Optional, Tuple
+
+# Requests per second and burst size for each API category. Compute API quotas
+# are per minute and per project; these stay comfortably below the defaults.
+DEFAULT_LIMITS = {
+    "read": (20.0, 40),
+    "mutate": (5.0, 10)
+}
+
+AUTH_MARKERS = [
+    "not authenticated",
+    "could not find default credentials",
+    "application default credentials",
+    "gcloud auth login"
+]
+
+RATE_LIMIT_MARKERS = [
+    "rate limit exceeded",
+    "ratelimitexceeded",
+    "resource_exhausted",
+    "quota exceeded for quota metric",
+    "too many requests",
+    "httperror 429",
+    "code=429",
+    "code: 429"
+]
+
+TRANSIENT_MARKERS = [
+    "backend error",
+    "backenderror",
+    "internal error",
+    "service unavailable",
+    "httperror 500",
+    "httperror 502",
+    "httperror 503",
+    "code=503",
+    "code: 503"
+]
+
+
+def classify_error(stderr: str) -> Optional[str]:
+    """Classify a failed gcloud call as "auth", "rate_limit", "transient" or None
+
+    Rate limit and transient markers are only looked for in gcloud's own error
+    message, so output from a remote command run over SSH can't trigger retries.
+    """
+    error_lower = (stderr or "").lower()
+    if any(msg in error_lower for msg in AUTH_MARKERS):
+        return "auth"
+
+    start = error_lower.find("error: (gcloud")
+    if start == -1:
+        return None
+    gcloud_error = error_lower[start:]
+    if any(msg in gcloud_error for msg in RATE_LIMIT_MARKERS):
+        return "rate_limit"
+    if any(msg in gcloud_error for msg in TRANSIENT_MARKERS):
+        return "transient"
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep until it is theirs"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            # A negative balance is a queue of reservations, each waiting its turn
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Stop handing out tokens for a while after the API pushed back"""
+        with self.lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class CommandExecutor:
+    """Run gcloud commands under a per-category rate limit, retrying throttled calls
+
+    Reads are retried on rate limiting and transient server errors. Mutations
+    are only retried on rate limiting, where the request was rejected and is
+    safe to repeat.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 32.0):
+        self.buckets = {category: TokenBucket(rate, burst) for category, (rate, burst) in (limits or DEFAULT_LIMITS).items()}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def acquire(self, category: str):
+        """Wait for a token in a category, for calls that are not run through run()"""
+        bucket = self.buckets.get(category)
+        if bucket:
+            bucket.acquire()
+
+    def run(self, cmd: List[str], category: str = "read", capture: bool = True, timeout: Optional[float] = None, stdin: Optional[IO] = None, stdout: Optional[IO] = None) -> subprocess.CompletedProcess:
+        """Run a command once a token is available, retrying with jittered exponential backoff
+
+        Uncaptured (interactive) commands are rate limited but never retried,
+        and neither are commands reading from a stdin file or writing into a
+        stdout file, since their streams can't be replayed. Those still have
+        stderr captured.
+        """
+        retryable = ("rate_limit",) if category == "mutate" else ("rate_limit", "transient")
+        attempt = 0
+        while True:
+            self.acquire(category)
+            if not capture:
+                return subprocess.run(cmd, timeout=timeout)
+            if stdin is not None or stdout is not None:
+                return subprocess.run(cmd, stdin=stdin, stdout=stdout or subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+            if result.returncode == 0 or attempt >= self.max_retries:
+                return result
+
+            kind = classify_error(result.stderr)
+            if kind not in retryable:
+                return result
+
+            delay = min(self.base_delay * 2 ** attempt, self.max_delay) * random.uniform(0.5, 1.5)
+            if kind == "rate_limit" and category in self.buckets:
+                # Slow every caller in this category down, not just this one; the
+                # next acquire() waits out the delay
+                self.buckets[category].penalize(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,114 @@
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from migs.gcloud import GCloudWrapper
+
+
+def probe_ssh_port(host: str, port: int = 22, timeout: float = 3.0) -> bool:
+    """Check that a host accepts TCP connections on the SSH port and sends an SSH banner"""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            return sock.recv(256).startswith(b"SSH-")
+    except OSError:
+        return False
+
+
+def ssh_hosts(node: Dict) -> List[str]:
+    """Addresses a node's SSH port can be probed on, its recorded path's first
+
+    A VM without an external IP is still reachable over its internal IP from
+    inside the VPC, or through a VPN or interconnect.
+    """
+    order = ["internal_ip", "external_ip"] if node.get("ssh_path") == "internal" else ["external_ip", "internal_ip"]
+    return [node[key] for key in order if node.get(key)]
+
+
+def probe_any(hosts: List[str], timeout: float = 3.0) -> Optional[str]:
+    """Probe several addresses of one host at once, returning the first in order that answers"""
+    if not hosts:
+        return None
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        answered = list(executor.map(lambda host: probe_ssh_port(host, timeout=timeout), hosts))
+    return next((host for host, ok in zip(hosts, answered) if ok), None)
+
+
+def wait_for_node(gcloud: GCloudWrapper, node: Dict, timeout: float = 600, on_update: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Wait until a single node is SSH-ready
+
+    Polls the SSH port with a cheap TCP connect plus banner check, backing off
+    between attempts, then confirms with a gcloud SSH command, retried with
+    backoff until timeout since login can lag behind the port opening. The node
+    dict needs display_name, instance_name, zone and optionally external_ip,
+    internal_ip, ssh_path and project; every known address is probed.
+
+    Returns a result dict with state (ready, unreachable or ssh_failed),
+    port_time and ready_time in seconds, and the number of probe attempts.
+    """
+    gcloud = gcloud.for_project(node.get("project"))
+    result = {
+        "name": node["display_name"],
+        "host": None,
+        "state": "probing",
+        "port_time": None,
+        "ready_time": None,
+        "attempts": 0
+    }
+    start = time.time()
+    deadline = start + timeout
+
+    def update(state):
+        result["state"] = state
+        if on_update:
+            on_update(result)
+
+    hosts = ssh_hosts(node)
+    result["host"] = hosts[0] if hosts else None
+    update("probing")
+    if hosts:
+        delay = 0.5
+        while True:
+            result["attempts"] += 1
+            answered = probe_any(hosts)
+            if answered:
+                result["host"] = answered
+                result["port_time"] = time.time() - start
+                break
+            if time.time() + delay > deadline:
+                update("unreachable")
+                return result
+            # Jittered exponential backoff, capped so fresh VMs are picked up quickly
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 10)
+
+    update("confirming")
+    # sshd answering doesn't mean login works yet: the guest agent may still be
+    # adding keys, so keep confirming until the deadline
+    delay = 2.0
+    while True:
+        if gcloud.check_ssh_connectivity(node["instance_name"], node["zone"]):
+            result["ready_time"] = time.time() - start
+            update("ready")
+            return result
+        if time.time() + delay > deadline:
+            update("ssh_failed")
+            return result
+        result["attempts"] += 1
+        time.sleep(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, 15)
+
+
+def wait_for_nodes(gcloud: GCloudWrapper, nodes: List[Dict], timeout: float = 600, on_update: Optional[Callable[[Dict], None]] = None, max_workers: int = 32) -> List[Dict]:
+    """Wait for many nodes to become SSH-ready concurrently
+
+    Returns one result per node (see wait_for_node), in the order given.
+    """
+    if not nodes:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(nodes))) as executor:
+        futures = [executor.submit(wait_for_node, gcloud, node, timeout, on_update) for node in nodes]
+        return [future.result() for future in futures]
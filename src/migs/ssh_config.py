@@ -1,6 +1,8 @@
-import os
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
+
+from migs import netpath
+from migs.storage import atomic_write, locked
 
 
 class SSHConfigManager:
@@ -10,6 +12,8 @@ class SSHConfigManager:
         self.ssh_config_path = Path.home() / ".ssh" / "config"
         self.marker_start = "# BEGIN MIGS MANAGED HOSTS"
         self.marker_end = "# END MIGS MANAGED HOSTS"
+        # Host keys fetched from guest attributes, keyed by the Host alias (see HostKeyAlias)
+        self.known_hosts_path = Path.home() / ".migs" / "known_hosts"
         self._ensure_ssh_dir()
     
     def _ensure_ssh_dir(self):
@@ -29,8 +33,7 @@ class SSHConfigManager:
     
     def _write_config(self, content: str):
         """Write the SSH config"""
-        self.ssh_config_path.write_text(content)
-        os.chmod(self.ssh_config_path, 0o600)
+        atomic_write(self.ssh_config_path, content, 0o600)
     
     def _get_managed_section(self, config: str) -> Tuple[int, int]:
         """Find the managed section in the config"""
@@ -47,78 +50,150 @@ class SSHConfigManager:
         
         return start_idx, end_idx
     
-    def add_vm_to_config(self, vm_info: Dict, custom_name: Optional[str] = None):
-        """Add a VM entry to SSH config"""
-        if not vm_info.get("external_ip") or not vm_info.get("username"):
+    def add_vm_to_config(self, vm_info: Dict, custom_name: Optional[str] = None, path: Optional[str] = None):
+        """Add a VM entry to SSH config
+
+        path picks how ssh reaches the VM (see migs.netpath.PATHS). It defaults
+        to the external IP, or an IAP tunnel for VMs without one.
+        """
+        if not vm_info.get("username"):
             return
         
         host_name = custom_name or vm_info["name"]
+        path = path or ("external" if vm_info.get("external_ip") else "iap")
+        
+        if path == "iap":
+            proxy_command = " ".join(netpath.iap_proxy_command(vm_info["name"], vm_info["zone"], vm_info.get("project")))
+            route = f"HostName {vm_info['name']}\n    ProxyCommand {proxy_command}"
+        elif path == "bastion" and vm_info.get("internal_ip"):
+            route = f"HostName {vm_info['internal_ip']}\n    ProxyJump {netpath.BASTION_ALIAS}"
+        elif vm_info.get(f"{path}_ip"):
+            route = f"HostName {vm_info[f'{path}_ip']}"
+        else:
+            return
         
         entry = f"""
 Host {host_name}
     User {vm_info["username"]}
-    HostName {vm_info["external_ip"]}
+    {route}
     IdentityFile ~/.ssh/google_compute_engine
+    UserKnownHostsFile ~/.migs/known_hosts
+    HostKeyAlias {host_name}
 """
-        
-        config = self._read_config()
-        start_idx, end_idx = self._get_managed_section(config)
-        
-        if start_idx == -1:
-            if config and not config.endswith("\n"):
-                config += "\n"
-            config += f"\n{self.marker_start}\n{entry}\n{self.marker_end}\n"
-        else:
+        self._set_entry(host_name, entry)
+    
+    def set_bastion(self, bastion: Dict):
+        """Add or update the multiplexed bastion entry VMs on the bastion path jump through"""
+        lines = [f"Host {netpath.BASTION_ALIAS}", f"    HostName {bastion['host']}"]
+        if bastion.get("user"):
+            lines.append(f"    User {bastion['user']}")
+        if bastion.get("port"):
+            lines.append(f"    Port {bastion['port']}")
+        lines += [
+            "    ControlMaster auto",
+            "    ControlPath ~/.ssh/migs-bastion-%C",
+            "    ControlPersist 10m"
+        ]
+        self._set_entry(netpath.BASTION_ALIAS, "\n" + "\n".join(lines) + "\n")
+    
+    def _set_entry(self, host_name: str, entry: str):
+        """Replace the managed entry for a host, or add it"""
+        with locked(self.ssh_config_path):
+            config = self._read_config()
+            start_idx, end_idx = self._get_managed_section(config)
+            
+            if start_idx == -1:
+                if config and not config.endswith("\n"):
+                    config += "\n"
+                config += f"\n{self.marker_start}\n{entry}\n{self.marker_end}\n"
+            else:
+                lines = config.split("\n")
+                managed_entries = lines[start_idx+1:end_idx]
+                
+                new_entries = []
+                
+                i = 0
+                while i < len(managed_entries):
+                    line = managed_entries[i]
+                    # Exact match, so replacing "node1" leaves "node10" alone
+                    if line.strip().startswith("Host ") and line.strip()[len("Host "):].strip() == host_name:
+                        # Skip this host entry and all its config lines
+                        i += 1
+                        while i < len(managed_entries) and not managed_entries[i].strip().startswith("Host "):
+                            i += 1
+                        continue
+                    new_entries.append(line)
+                    i += 1
+                
+                new_entries.append(entry.strip())
+                
+                new_lines = lines[:start_idx+1] + new_entries + lines[end_idx:]
+                config = "\n".join(new_lines)
+            
+            self._write_config(config)
+    
+    def _read_known_hosts(self) -> List[str]:
+        try:
+            return self.known_hosts_path.read_text().splitlines()
+        except (FileNotFoundError, PermissionError):
+            return []
+    
+    def _write_known_hosts(self, lines: List[str]):
+        self.known_hosts_path.parent.mkdir(exist_ok=True)
+        atomic_write(self.known_hosts_path, "".join(f"{line}\n" for line in lines), 0o600)
+    
+    def set_host_keys(self, host_keys: Dict[str, List[str]]):
+        """Replace the known host keys of several hosts with a single write
+
+        host_keys maps each Host alias to its "<type> <key>" lines.
+        """
+        if not host_keys:
+            return
+        with locked(self.known_hosts_path):
+            lines = [line for line in self._read_known_hosts() if line.split(" ", 1)[0] not in host_keys]
+            for host_name, keys in host_keys.items():
+                lines.extend(f"{host_name} {key}" for key in keys)
+            self._write_known_hosts(lines)
+    
+    def known_host_names(self) -> Set[str]:
+        """Host aliases that have keys in the migs known_hosts file"""
+        return {line.split(" ", 1)[0] for line in self._read_known_hosts() if line.strip()}
+    
+    def remove_vm_from_config(self, vm_name: str):
+        """Remove a VM entry from SSH config"""
+        self.remove_vms_from_config([vm_name])
+    
+    def remove_vms_from_config(self, vm_names: List[str]):
+        """Remove several VM entries from SSH config with a single write"""
+        with locked(self.ssh_config_path):
+            config = self._read_config()
+            start_idx, end_idx = self._get_managed_section(config)
+            
+            if start_idx == -1:
+                return
+            
+            hosts = set(vm_names)
             lines = config.split("\n")
             managed_entries = lines[start_idx+1:end_idx]
             
             new_entries = []
-            host_found = False
+            skip = False
             
-            i = 0
-            while i < len(managed_entries):
-                line = managed_entries[i]
-                if line.strip().startswith("Host ") and host_name in line:
-                    host_found = True
-                    # Skip this host entry and all its config lines
-                    i += 1
-                    while i < len(managed_entries) and not managed_entries[i].strip().startswith("Host "):
-                        i += 1
-                    continue
-                new_entries.append(line)
-                i += 1
-            
-            new_entries.append(entry.strip())
+            for line in managed_entries:
+                if line.strip().startswith("Host "):
+                    skip = line.strip()[len("Host "):].strip() in hosts
+                
+                if not skip:
+                    new_entries.append(line)
             
             new_lines = lines[:start_idx+1] + new_entries + lines[end_idx:]
             config = "\n".join(new_lines)
-        
-        self._write_config(config)
-    
-    def remove_vm_from_config(self, vm_name: str):
-        """Remove a VM entry from SSH config"""
-        config = self._read_config()
-        start_idx, end_idx = self._get_managed_section(config)
-        
-        if start_idx == -1:
-            return
-        
-        lines = config.split("\n")
-        managed_entries = lines[start_idx+1:end_idx]
-        
-        new_entries = []
-        skip = False
-        
-        for line in managed_entries:
-            if line.strip().startswith("Host ") and vm_name in line:
-                skip = True
-            elif line.strip().startswith("Host "):
-                skip = False
             
-            if not skip:
-                new_entries.append(line)
-        
-        new_lines = lines[:start_idx+1] + new_entries + lines[end_idx:]
-        config = "\n".join(new_lines)
-        
-        self._write_config(config)
\ No newline at end of file
+            self._write_config(config)
+            
+            # A later VM with the same name will have new host keys
+            with locked(self.known_hosts_path):
+                known_hosts = self._read_known_hosts()
+                kept = [line for line in known_hosts if line.split(" ", 1)[0] not in hosts]
+                if len(kept) != len(known_hosts):
+                    self._write_known_hosts(kept)
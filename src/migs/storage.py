@@ -1,36 +1,134 @@
+import copy
+import fcntl
+import functools
+import hashlib
 import json
 import os
+import tempfile
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 
 
+class _FileLock:
+    """Exclusive lock on a file, shared by all processes and threads that use it
+
+    Re-entrant within a thread, so a locked method can call another one.
+    """
+    
+    def __init__(self, path: Path):
+        self.lock_path = path.with_name(f".{path.name}.lock")
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+    
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.lock_path, "a")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self._thread_lock.release()
+
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def locked(path: Path) -> _FileLock:
+    """Lock a file for a read-modify-write, so concurrent migs processes don't drop each other's changes"""
+    path = Path(path).resolve()
+    with _file_locks_guard:
+        if path not in _file_locks:
+            _file_locks[path] = _FileLock(path)
+        return _file_locks[path]
+
+
+def atomic_write(path: Path, content: str, mode: Optional[int] = None):
+    """Replace a file's content in one step, so readers never see it half-written
+
+    Symlinks are followed, so a linked ~/.ssh/config stays a link.
+    """
+    path = Path(path).resolve()
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is None and path.exists():
+            mode = path.stat().st_mode & 0o777
+        os.chmod(tmp_path, mode if mode is not None else 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _transaction(path_attr: str):
+    """Run a read-modify-write method under the lock of the file it modifies
+
+    Every write then lands on top of the latest content, merging with
+    whatever other processes wrote meanwhile.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with locked(getattr(self, path_attr)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
 class VMStorage:
     """Store and manage personal VM information"""
     
     def __init__(self):
         self.storage_dir = Path.home() / ".migs"
         self.storage_file = self.storage_dir / "vms.json"
+        self._cache = None
+        self._cache_key = None
         self._ensure_storage()
     
     def _ensure_storage(self):
         """Ensure storage directory and file exist"""
         self.storage_dir.mkdir(exist_ok=True)
-        if not self.storage_file.exists():
-            self.storage_file.write_text("{}")
+        with locked(self.storage_file):
+            if not self.storage_file.exists():
+                atomic_write(self.storage_file, "{}")
     
     def _load_data(self) -> Dict:
-        """Load VM data from storage"""
+        """Load VM data from storage, reusing the parsed file while it is unchanged"""
         try:
-            return json.loads(self.storage_file.read_text())
+            stat = self.storage_file.stat()
+            key = (stat.st_mtime_ns, stat.st_size)
+            if key != self._cache_key:
+                self._cache = json.loads(self.storage_file.read_text())
+                self._cache_key = key
+            return copy.deepcopy(self._cache)
         except (json.JSONDecodeError, FileNotFoundError, PermissionError):
             return {}
     
     def _save_data(self, data: Dict):
         """Save VM data to storage"""
-        self.storage_file.write_text(json.dumps(data, indent=2))
+        atomic_write(self.storage_file, json.dumps(data, indent=2))
+        self._cache_key = None
     
-    def save_vm(self, instance_name: str, mig_name: str, zone: str, custom_name: Optional[str] = None, group_id: Optional[str] = None):
+    @_transaction("storage_file")
+    def save_vm(self, instance_name: str, mig_name: str, zone: str, custom_name: Optional[str] = None, group_id: Optional[str] = None, project: Optional[str] = None):
         """Save a VM to personal storage"""
         data = self._load_data()
         
@@ -42,7 +140,8 @@ class VMStorage:
             "zone": zone,
             "display_name": display_name,
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "group_id": group_id
+            "group_id": group_id,
+            "project": project
         }
         
         self._save_data(data)
@@ -60,6 +159,7 @@ class VMStorage:
         
         return None
     
+    @_transaction("storage_file")
     def remove_vm(self, name: str):
         """Remove a VM from storage"""
         data = self._load_data()
@@ -74,9 +174,44 @@ class VMStorage:
         
         self._save_data(data)
     
-    def list_vms(self) -> List[Dict]:
-        """List all personal VMs"""
+    @_transaction("storage_file")
+    def remove_vms(self, names: List[str]):
+        """Remove several VMs from storage with a single write"""
         data = self._load_data()
+        
+        for name in names:
+            if name in data:
+                del data[name]
+            else:
+                for key, vm_data in list(data.items()):
+                    if vm_data["instance_name"] == name:
+                        del data[key]
+                        break
+        
+        self._save_data(data)
+    
+    @_transaction("storage_file")
+    def set_vm_project(self, name: str, project: str):
+        """Record the project of a VM saved before projects were tracked"""
+        data = self._load_data()
+        if name in data:
+            data[name]["project"] = project
+            self._save_data(data)
+    
+    @_transaction("storage_file")
+    def set_vm_ssh_path(self, name: str, path: Optional[str], pinned: bool = False):
+        """Record how ssh reaches a VM, and whether it was chosen by hand rather than measured"""
+        data = self._load_data()
+        if name in data:
+            data[name]["ssh_path"] = path
+            data[name]["ssh_path_pinned"] = pinned
+            self._save_data(data)
+    
+    def list_vms(self, projects: Optional[List[str]] = None) -> List[Dict]:
+        """List all personal VMs, optionally only those in the given projects"""
+        data = self._load_data()
+        if projects:
+            return [vm for vm in data.values() if vm.get("project") in projects]
         return list(data.values())
     
     def get_vms_in_group(self, group_id: str) -> List[Dict]:
@@ -113,4 +248,342 @@ class VMStorage:
                 if group_vms:
                     return group_vms
         
-        return []
\ No newline at end of file
+        return []
+    
+    # Standby pools. Unclaimed VMs live in pool.json, apart from the personal
+    # inventory, until `migs up` claims them.
+    
+    def _load_pool(self) -> Dict:
+        """Load pool targets and standby VMs"""
+        try:
+            data = json.loads(self.pool_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            data = {}
+        data.setdefault("targets", {})
+        data.setdefault("standby", {})
+        return data
+    
+    def _save_pool(self, data: Dict):
+        """Save pool targets and standby VMs"""
+        atomic_write(self.pool_file, json.dumps(data, indent=2))
+    
+    @property
+    def pool_file(self) -> Path:
+        return self.storage_dir / "pool.json"
+    
+    @staticmethod
+    def _pool_key(mig_name: str, zone: str, project: Optional[str]) -> str:
+        return f"{project or ''}/{zone}/{mig_name}"
+    
+    @_transaction("pool_file")
+    def set_pool_size(self, mig_name: str, zone: str, project: Optional[str], size: int):
+        """Set how many standby VMs to keep for a MIG; 0 removes the pool"""
+        data = self._load_pool()
+        key = self._pool_key(mig_name, zone, project)
+        if size > 0:
+            data["targets"][key] = {"mig_name": mig_name, "zone": zone, "project": project, "size": size}
+        else:
+            data["targets"].pop(key, None)
+        self._save_pool(data)
+    
+    def get_pool_size(self, mig_name: str, zone: str, project: Optional[str]) -> int:
+        """Target standby count for a MIG, 0 if it has no pool"""
+        target = self._load_pool()["targets"].get(self._pool_key(mig_name, zone, project))
+        return target["size"] if target else 0
+    
+    def list_pools(self) -> List[Dict]:
+        """List pool targets"""
+        return list(self._load_pool()["targets"].values())
+    
+    @_transaction("pool_file")
+    def add_pooled_vm(self, instance_name: str, mig_name: str, zone: str, project: Optional[str], external_ip: Optional[str], username: str, internal_ip: Optional[str] = None):
+        """Add an SSH-ready VM to a MIG's standby pool"""
+        data = self._load_pool()
+        data["standby"][instance_name] = {
+            "instance_name": instance_name,
+            "mig_name": mig_name,
+            "zone": zone,
+            "project": project,
+            "external_ip": external_ip,
+            "internal_ip": internal_ip,
+            "username": username,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        self._save_pool(data)
+    
+    def list_pooled_vms(self, mig_name: Optional[str] = None, zone: Optional[str] = None, project: Optional[str] = None) -> List[Dict]:
+        """List standby VMs, optionally only those of one MIG, zone or project"""
+        return [
+            vm for vm in self._load_pool()["standby"].values()
+            if (mig_name is None or vm["mig_name"] == mig_name)
+            and (zone is None or vm["zone"] == zone)
+            and (project is None or vm["project"] == project)
+        ]
+    
+    @_transaction("pool_file")
+    def take_pooled_vms(self, instance_names: List[str]) -> List[Dict]:
+        """Remove standby VMs from their pool, returning those that were still there"""
+        data = self._load_pool()
+        taken = [data["standby"].pop(name) for name in instance_names if name in data["standby"]]
+        if taken:
+            self._save_pool(data)
+        return taken
+
+
+class UploadCache:
+    """Remember which file contents have been pushed to which VM, keyed by content hash
+    
+    This is the local copy of each node's manifest of side uploads (scripts and
+    .env files). The remote side is verified with sha256sum before the cached
+    copy is used, so stale entries are detected without an extra round trip.
+    """
+    
+    def __init__(self):
+        self.storage_dir = Path.home() / ".migs"
+        self.cache_file = self.storage_dir / "uploads.json"
+        self.storage_dir.mkdir(exist_ok=True)
+    
+    def _load_data(self) -> Dict:
+        """Load the upload manifests"""
+        try:
+            return json.loads(self.cache_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            return {}
+    
+    def _save_data(self, data: Dict):
+        """Save the upload manifests"""
+        atomic_write(self.cache_file, json.dumps(data, indent=2))
+    
+    @staticmethod
+    def file_digest(path: str) -> str:
+        """SHA-256 of a local file's contents"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def is_current(self, instance_name: str, remote_path: str, digest: str) -> bool:
+        """Check whether a VM already has this exact content at remote_path"""
+        return self._load_data().get(instance_name, {}).get(remote_path) == digest
+    
+    @_transaction("cache_file")
+    def record(self, instance_name: str, remote_path: str, digest: str):
+        """Record that a VM now has this content at remote_path"""
+        data = self._load_data()
+        data.setdefault(instance_name, {})[remote_path] = digest
+        self._save_data(data)
+    
+    @_transaction("cache_file")
+    def forget(self, instance_names: List[str]):
+        """Drop the manifests of VMs that were deleted or whose cached files went stale"""
+        data = self._load_data()
+        for instance_name in instance_names:
+            data.pop(instance_name, None)
+        self._save_data(data)
+
+
+class BakeStorage:
+    """Track VMs baked into images, templates and MIGs, and the current bake per source MIG"""
+    
+    def __init__(self):
+        self.storage_dir = Path.home() / ".migs"
+        self.bakes_file = self.storage_dir / "bakes.json"
+        self.storage_dir.mkdir(exist_ok=True)
+    
+    def _load_data(self) -> Dict:
+        """Load bakes, keyed by project and source MIG"""
+        try:
+            return json.loads(self.bakes_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            return {}
+    
+    def _save_data(self, data: Dict):
+        """Save bakes"""
+        atomic_write(self.bakes_file, json.dumps(data, indent=2))
+    
+    @staticmethod
+    def _key(source_mig: str, project: Optional[str]) -> str:
+        return f"{project or ''}/{source_mig}"
+    
+    @_transaction("bakes_file")
+    def record(self, bake: Dict):
+        """Record a new bake of bake["source_mig"] and make it the current one"""
+        data = self._load_data()
+        entry = data.setdefault(self._key(bake["source_mig"], bake.get("project")), {"current": None, "bakes": {}})
+        entry["bakes"][bake["name"]] = bake
+        entry["current"] = bake["name"]
+        self._save_data(data)
+    
+    @_transaction("bakes_file")
+    def set_current(self, name: str) -> Optional[Dict]:
+        """Make an earlier bake current again for its source MIG, returning it"""
+        data = self._load_data()
+        for entry in data.values():
+            if name in entry["bakes"]:
+                entry["current"] = name
+                self._save_data(data)
+                return entry["bakes"][name]
+        return None
+    
+    def current(self, source_mig: str, project: Optional[str]) -> Optional[Dict]:
+        """The current bake of a source MIG, if it has one"""
+        entry = self._load_data().get(self._key(source_mig, project))
+        if not entry or not entry["current"]:
+            return None
+        return entry["bakes"].get(entry["current"])
+    
+    def list_bakes(self) -> List[Dict]:
+        """List all bakes, each with a "current" flag"""
+        bakes = []
+        for entry in self._load_data().values():
+            for name, bake in entry["bakes"].items():
+                bakes.append(dict(bake, current=name == entry["current"]))
+        return bakes
+
+
+class RequestJournal:
+    """Journal of submitted resize requests whose VMs are not all tracked yet
+    
+    Entries outlive the process that submitted them, so detached or
+    interrupted `migs up` runs can be resumed later.
+    """
+    
+    def __init__(self):
+        self.storage_dir = Path.home() / ".migs"
+        self.journal_file = self.storage_dir / "requests.json"
+        self.storage_dir.mkdir(exist_ok=True)
+    
+    def _load_data(self) -> Dict:
+        """Load journal entries, keyed by request ID"""
+        try:
+            return json.loads(self.journal_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            return {}
+    
+    def _save_data(self, data: Dict):
+        """Save journal entries"""
+        atomic_write(self.journal_file, json.dumps(data, indent=2))
+    
+    @_transaction("journal_file")
+    def write(self, request_id: str, entry: Dict):
+        """Add or update a journal entry"""
+        data = self._load_data()
+        data[request_id] = entry
+        self._save_data(data)
+    
+    @_transaction("journal_file")
+    def remove(self, request_id: str):
+        """Drop a request once all of its VMs are tracked, or it failed"""
+        data = self._load_data()
+        if data.pop(request_id, None) is not None:
+            self._save_data(data)
+    
+    def get(self, request_id: str) -> Optional[Dict]:
+        return self._load_data().get(request_id)
+    
+    def list_entries(self) -> List[Dict]:
+        """List journal entries, oldest first"""
+        return sorted(self._load_data().values(), key=lambda entry: entry.get("submitted_at") or "")
+
+
+class ProvisioningHistory:
+    """Outcome and timing of every resize request, for `migs stats` and `up --fastest`
+    
+    Only the most recent MAX_ENTRIES attempts are kept.
+    """
+    
+    MAX_ENTRIES = 2000
+    
+    def __init__(self):
+        self.storage_dir = Path.home() / ".migs"
+        self.history_file = self.storage_dir / "history.json"
+        self.storage_dir.mkdir(exist_ok=True)
+    
+    def _load_data(self) -> Dict:
+        """Load attempts, keyed by resize request ID"""
+        try:
+            return json.loads(self.history_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            return {}
+    
+    def _save_data(self, data: Dict):
+        """Save attempts"""
+        atomic_write(self.history_file, json.dumps(data, indent=2))
+    
+    @_transaction("history_file")
+    def record(self, attempt: Dict):
+        """Add or update an attempt, dropping the oldest ones past MAX_ENTRIES"""
+        data = self._load_data()
+        data[attempt["id"]] = attempt
+        if len(data) > self.MAX_ENTRIES:
+            newest = sorted(data.values(), key=lambda entry: entry.get("submitted") or 0)[-self.MAX_ENTRIES:]
+            data = {entry["id"]: entry for entry in newest}
+        self._save_data(data)
+    
+    def list_entries(self) -> List[Dict]:
+        """List attempts, oldest first"""
+        return sorted(self._load_data().values(), key=lambda entry: entry.get("submitted") or 0)
+
+
+class TransferJournal:
+    """Chunks of parallel large-file transfers that already landed, so an interrupted transfer resumes
+    
+    Each transfer remembers its source file's size and mtime and the chunk
+    size, and starts over when any of them changed.
+    """
+    
+    def __init__(self):
+        self.storage_dir = Path.home() / ".migs"
+        self.transfers_file = self.storage_dir / "transfers.json"
+        self.storage_dir.mkdir(exist_ok=True)
+    
+    def _load_data(self) -> Dict:
+        """Load transfers, keyed by direction, VM and both paths"""
+        try:
+            return json.loads(self.transfers_file.read_text())
+        except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+            return {}
+    
+    def _save_data(self, data: Dict):
+        """Save transfers"""
+        atomic_write(self.transfers_file, json.dumps(data, indent=2))
+    
+    @staticmethod
+    def key(direction: str, instance_name: str, local_path: str, remote_path: str) -> str:
+        return f"{direction}:{instance_name}:{remote_path}:{local_path}"
+    
+    @_transaction("transfers_file")
+    def start(self, key: str, source: Dict) -> List[int]:
+        """Begin or resume a transfer, returning the indices of chunks already done"""
+        data = self._load_data()
+        entry = data.get(key)
+        if entry and entry["source"] == source:
+            return entry["done"]
+        data[key] = {"source": source, "done": []}
+        self._save_data(data)
+        return []
+    
+    @_transaction("transfers_file")
+    def mark_done(self, key: str, index: int):
+        """Record that a chunk landed and was verified"""
+        data = self._load_data()
+        entry = data.get(key)
+        if entry is not None and index not in entry["done"]:
+            entry["done"].append(index)
+            self._save_data(data)
+    
+    @_transaction("transfers_file")
+    def finish(self, key: str):
+        """Forget a transfer that completed, or that has to start over"""
+        data = self._load_data()
+        if data.pop(key, None) is not None:
+            self._save_data(data)
+
+
+def load_config() -> Dict:
+    """Load user settings from ~/.migs/config.json, e.g. {"projects": ["proj-a", "proj-b"]}"""
+    try:
+        return json.loads((Path.home() / ".migs" / "config.json").read_text())
+    except (json.JSONDecodeError, FileNotFoundError, PermissionError):
+        return {}
@@ -0,0 +1,186 @@
+import csv
+import json
+import subprocess
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from migs.gcloud import GCloudWrapper
+
+
+# Runs on the node for the lifetime of the session, printing one block of readings per interval
+SAMPLER_SCRIPT = """
+while true; do
+  echo "TS $(date +%s.%N)"
+  nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total --format=csv,noheader,nounits 2>/dev/null | sed 's/^/GPU /'
+  echo "LOAD $(cut -d' ' -f1 /proc/loadavg) $(nproc)"
+  awk '/^MemTotal/{t=$2} /^MemAvailable/{a=$2} END{print "MEM", t, a}' /proc/meminfo
+  awk '$3 ~ /^(sd[a-z]+|vd[a-z]+|nvme[0-9]+n[0-9]+)$/ {r+=$6; w+=$10} END{print "DISK", r+0, w+0}' /proc/diskstats
+  echo END
+  sleep {interval}
+done
+"""
+
+
+def _parse_block(lines: List[str]) -> Optional[Dict]:
+    """Parse one block of sampler output into a sample dict"""
+    sample = {"gpus": []}
+    for line in lines:
+        kind, _, rest = line.partition(" ")
+        values = rest.replace(",", " ").split()
+        try:
+            if kind == "TS":
+                sample["ts"] = float(values[0])
+            elif kind == "GPU":
+                sample["gpus"].append({
+                    "index": int(values[0]),
+                    "util": float(values[1]),
+                    "mem_used": float(values[2]),
+                    "mem_total": float(values[3])
+                })
+            elif kind == "LOAD":
+                sample["load"] = float(values[0])
+                sample["cpus"] = int(values[1])
+            elif kind == "MEM":
+                sample["mem_total_kb"] = int(values[0])
+                sample["mem_available_kb"] = int(values[1])
+            elif kind == "DISK":
+                sample["disk_read_sectors"] = int(values[0])
+                sample["disk_write_sectors"] = int(values[1])
+        except (IndexError, ValueError):
+            continue
+    return sample if "ts" in sample else None
+
+
+class NodeSampler:
+    """Stream utilization samples from one node over a single long-lived SSH session
+
+    Samples go into a bounded ring buffer, so memory use stays flat however
+    long the session runs.
+    """
+
+    def __init__(self, gcloud: GCloudWrapper, vm: Dict, interval: float = 2, history: int = 300):
+        self.gcloud = gcloud.for_project(vm.get("project"))
+        self.vm = vm
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.error = None
+        self._process = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        cmd = [
+            "gcloud", "compute", "ssh", self.vm["instance_name"],
+            f"--zone={self.vm['zone']}",
+            *self.gcloud.ssh_master_flags(self.vm["instance_name"]),
+            "--command", SAMPLER_SCRIPT.replace("{interval}", str(self.interval))
+        ]
+        self.gcloud.executor.acquire("read")
+        self._process = subprocess.Popen(
+            self.gcloud.with_project(cmd),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        block = []
+        previous = None
+        for line in self._process.stdout:
+            line = line.strip()
+            if line != "END":
+                block.append(line)
+                continue
+
+            sample = _parse_block(block)
+            block = []
+            if not sample:
+                continue
+
+            # Disk counters are cumulative, so turn them into rates between samples
+            if previous and sample["ts"] > previous["ts"] and "disk_read_sectors" in sample and "disk_read_sectors" in previous:
+                elapsed = sample["ts"] - previous["ts"]
+                sample["disk_read_bps"] = (sample["disk_read_sectors"] - previous["disk_read_sectors"]) * 512 / elapsed
+                sample["disk_write_bps"] = (sample["disk_write_sectors"] - previous["disk_write_sectors"]) * 512 / elapsed
+            previous = sample
+
+            with self._lock:
+                self.samples.append(sample)
+
+        self.error = "SSH session ended"
+
+    def latest(self) -> Optional[Dict]:
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def history(self) -> List[Dict]:
+        with self._lock:
+            return list(self.samples)
+
+    def stop(self):
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+
+
+def summarize(sample: Optional[Dict]) -> Dict:
+    """Reduce a sample to the per-node numbers shown on the dashboard"""
+    if not sample:
+        return {}
+
+    summary = {
+        "ts": sample["ts"],
+        "load": sample.get("load"),
+        "cpus": sample.get("cpus"),
+        "disk_read_bps": sample.get("disk_read_bps"),
+        "disk_write_bps": sample.get("disk_write_bps")
+    }
+    gpus = sample["gpus"]
+    if gpus:
+        summary["gpu_count"] = len(gpus)
+        summary["gpu_util"] = sum(gpu["util"] for gpu in gpus) / len(gpus)
+        summary["gpu_util_min"] = min(gpu["util"] for gpu in gpus)
+        summary["gpu_mem_pct"] = 100 * sum(gpu["mem_used"] for gpu in gpus) / max(sum(gpu["mem_total"] for gpu in gpus), 1)
+    if sample.get("mem_total_kb"):
+        summary["ram_pct"] = 100 * (1 - sample["mem_available_kb"] / sample["mem_total_kb"])
+    return summary
+
+
+def export_samples(samplers: Dict[str, NodeSampler], path: str):
+    """Write every buffered sample to a CSV or JSON file (chosen by extension)"""
+    rows = []
+    for node, sampler in samplers.items():
+        for sample in sampler.history():
+            row = {"node": node}
+            row.update(summarize(sample))
+            rows.append(row)
+
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump({node: sampler.history() for node, sampler in samplers.items()}, f, indent=2)
+        return
+
+    fields = ["node", "ts", "gpu_count", "gpu_util", "gpu_util_min", "gpu_mem_pct", "load", "cpus", "ram_pct", "disk_read_bps", "disk_write_bps"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def start_samplers(gcloud: GCloudWrapper, vms: List[Dict], interval: float = 2, history: int = 300) -> Dict[str, NodeSampler]:
+    """Open one sampling session per node, all at once"""
+    samplers = {}
+    for vm in vms:
+        sampler = NodeSampler(gcloud, vm, interval=interval, history=history)
+        sampler.start()
+        samplers[vm["display_name"]] = sampler
+    return samplers
+
+
+def stop_samplers(samplers: Dict[str, NodeSampler]):
+    for sampler in samplers.values():
+        sampler.stop()
+
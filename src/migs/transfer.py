@@ -0,0 +1,125 @@
+import contextlib
+import hashlib
+import os
+import re
+import shlex
+import threading
+from typing import IO, Iterator, List, Optional, Tuple
+
+# Byte range one SSH stream moves at a time, and the unit an interrupted
+# transfer resumes from
+CHUNK_SIZE = 256 << 20
+
+# SSH streams a --parallel transfer opens when no count is given
+DEFAULT_STREAMS = 8
+
+# Times a chunk is sent before the transfer gives up on it
+CHUNK_ATTEMPTS = 3
+
+_DIGEST = re.compile(r"\b([0-9a-f]{64})\b")
+
+
+def chunks(size: int) -> List[Tuple[int, int]]:
+    """(offset, length) of every CHUNK_SIZE chunk of a file"""
+    return [(offset, min(CHUNK_SIZE, size - offset)) for offset in range(0, size, CHUNK_SIZE)]
+
+
+def range_digest(path: str, offset: int, length: int) -> str:
+    """SHA-256 of a byte range of a local file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            block = f.read(min(1 << 20, length))
+            if not block:
+                break
+            digest.update(block)
+            length -= len(block)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def range_pipe(path: str, offset: int, length: int) -> Iterator[IO[bytes]]:
+    """Read end of a pipe carrying exactly one byte range of a local file, for a command's stdin
+
+    A thread feeds the pipe, so the command sees EOF at the end of the range
+    instead of reading on to the end of the file.
+    """
+    read_fd, write_fd = os.pipe()
+
+    def feed():
+        try:
+            with open(write_fd, "wb") as pipe, open(path, "rb") as f:
+                f.seek(offset)
+                remaining = length
+                while remaining > 0:
+                    block = f.read(min(1 << 20, remaining))
+                    if not block:
+                        break
+                    pipe.write(block)
+                    remaining -= len(block)
+        except OSError:
+            # The command exited early or the file went away; the chunk's digest check catches it
+            pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        with open(read_fd, "rb") as reader:
+            yield reader
+    finally:
+        feeder.join()
+
+
+def parse_digest(output: Optional[str]) -> Optional[str]:
+    """The last SHA-256 hex digest printed in a command's output"""
+    found = _DIGEST.findall(output or "")
+    return found[-1] if found else None
+
+
+def remote_path_expr(path: str) -> str:
+    """Shell word for a remote path, with relative and ~/ paths under $HOME"""
+    if path.startswith("/"):
+        return shlex.quote(path)
+    rest = path[2:] if path.startswith("~/") else "" if path == "~" else path
+    return f'"$HOME"/{shlex.quote(rest)}' if rest else '"$HOME"'
+
+
+def _read_range(path: str, offset: int, length: int) -> str:
+    return f"dd if={shlex.quote(path)} bs=4M skip={offset} count={length} iflag=skip_bytes,count_bytes status=none"
+
+
+def prepare_upload_command(remote_path: str, name: str, size: int) -> str:
+    """Remote shell command that creates the target file at its final size and prints its absolute path
+
+    A directory target gets the file inside it. Existing content is kept, so
+    a resumed upload only rewrites the missing chunks.
+    """
+    return (
+        f't={remote_path_expr(remote_path)}; [ -d "$t" ] && t="$t"/{shlex.quote(name)}; '
+        f'mkdir -p "$(dirname "$t")" && touch "$t" && truncate -s {size} "$t" && readlink -f "$t"'
+    )
+
+
+def upload_chunk_command(path: str, offset: int, length: int) -> str:
+    """Remote shell command that writes stdin into a byte range of a file, then prints the range's SHA-256"""
+    return (
+        f"dd of={shlex.quote(path)} bs=4M seek={offset} count={length} "
+        f"oflag=seek_bytes iflag=count_bytes,fullblock conv=notrunc status=none && "
+        f"{_read_range(path, offset, length)} | sha256sum"
+    )
+
+
+def stat_command(remote_path: str) -> str:
+    """Remote shell command that prints a file's absolute path, then its size and mtime"""
+    return f'p={remote_path_expr(remote_path)}; [ -f "$p" ] || exit 3; readlink -f "$p" && stat -c "%s %Y" "$p"'
+
+
+def download_chunk_command(path: str, offset: int, length: int) -> str:
+    """Remote shell command that writes a byte range of a file to stdout and its SHA-256 to stderr"""
+    return f"{_read_range(path, offset, length)} && {_read_range(path, offset, length)} | sha256sum >&2"
+
+
+def digest_command(path: str) -> str:
+    """Remote shell command that prints a file's SHA-256"""
+    return f"sha256sum {shlex.quote(path)}"
@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+import pytest
+
+# migs.cli builds its Client when imported, and every store lives under
+# ~/.migs, so point HOME somewhere disposable before any test imports migs
+os.environ["HOME"] = tempfile.mkdtemp(prefix="migs-tests-")
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """An empty HOME for one test"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,146 @@
+import json
+import subprocess
+import time
+
+import pytest
+from click.testing import CliRunner
+from rich.console import Console
+
+from migs import cli as cli_module, daemon, netpath
+from migs.client import Client, VM
+
+
+@pytest.fixture
+def client(home, monkeypatch):
+    """A Client over an empty HOME, used by every CLI command"""
+    fresh = Client()
+    monkeypatch.setattr(cli_module, "client", fresh)
+    monkeypatch.setattr(cli_module, "gcloud", fresh.gcloud)
+    monkeypatch.setattr(cli_module, "storage", fresh.storage)
+    monkeypatch.setattr(cli_module, "ssh_manager", fresh.ssh_config)
+    monkeypatch.setattr(cli_module, "console", Console(width=200))
+    return fresh
+
+
+def invoke(*args):
+    result = CliRunner().invoke(cli_module.cli, list(args))
+    assert result.exception is None, result.output
+    return result.output
+
+
+def attempt(request_id, mig_name, outcome="succeeded", capacity_seconds=None, zone="us-central1-a"):
+    submitted = time.time() - 3600
+    return {
+        "id": request_id, "mig_name": mig_name, "zone": zone, "project": None, "machine_type": "a2-highgpu-1g",
+        "count": 1, "submitted": submitted, "hour": time.localtime(submitted).tm_hour, "outcome": outcome,
+        "capacity_seconds": capacity_seconds, "ready_seconds": [capacity_seconds + 30] if capacity_seconds else None
+    }
+
+
+def test_stats_without_history(client):
+    assert "No provisioning history yet" in invoke("stats")
+
+
+def test_stats(client, home):
+    history = [
+        attempt("r1", "train", capacity_seconds=60),
+        attempt("r2", "train", capacity_seconds=120),
+        attempt("r3", "train", outcome="failed"),
+        attempt("r4", "eval", outcome="lost", zone="europe-west4-a"),
+    ]
+    (home / ".migs" / "history.json").write_text(json.dumps({entry["id"]: entry for entry in history}))
+
+    output = invoke("stats")
+    assert "train (us-central1-a)" in output and "eval (europe-west4-a)" in output
+    assert "1m00s" in output and "2m00s" in output
+
+    by_zone = invoke("stats", "--by", "zone")
+    assert "europe-west4-a" in by_zone and "train" not in by_zone
+
+
+def test_provisioning_stats_rejects_unknown_grouping(client):
+    with pytest.raises(ValueError):
+        client.provisioning_stats("region")
+
+
+def test_up_detach_served_from_pool(client, monkeypatch):
+    vm = VM(display_name="train", instance_name="train", mig_name="mig", zone="us-central1-a", external_ip="203.0.113.7")
+
+    def up(*args, progress_callback=None, on_ready=None, **kwargs):
+        assert kwargs["detach"]
+        progress_callback("claimed", {"vms": [vm]})
+        on_ready(vm)
+        return [vm]
+
+    monkeypatch.setattr(client, "up", up)
+    output = invoke("up", "mig", "--detach")
+    assert "Error" not in output
+    assert "VM 'train' is ready" in output
+
+
+def test_down_mine(client, monkeypatch):
+    client.storage.save_vm("train-1", "mig", "us-central1-a", custom_name="train1")
+    client.storage.save_vm("train-2", "mig", "us-central1-a", custom_name="train2")
+    calls = []
+    monkeypatch.setattr(client.gcloud, "_exec", lambda cmd, *args, **kwargs: calls.append(cmd) or subprocess.CompletedProcess(cmd, 0, "", ""))
+
+    output = invoke("down", "--mine", "--yes")
+    assert "Successfully shut down 2/2 VMs" in output
+    # Both VMs go in one delete-instances call
+    assert len(calls) == 1 and "--instances=train-1,train-2" in calls[0]
+    assert client.vms() == []
+
+
+def test_jobs(client, monkeypatch):
+    client.storage.save_vm("mig-a", "mig", "us-central1-a", custom_name="train")
+    now = int(time.time())
+    listing = {"gpus": 8, "jobs": [
+        {"id": "j1", "state": "running", "gpus": 4, "devices": "0,1,2,3", "name": "pretrain", "submitted": now - 90, "started": now - 60},
+        {"id": "j2", "state": "queued", "gpus": 8, "submitted": now - 30},
+    ]}
+    monkeypatch.setattr(client.gcloud, "list_jobs", lambda instance_name, zone: listing)
+
+    output = invoke("jobs", "train")
+    assert "pretrain" in output and "4 (0,1,2,3)" in output and "queued" in output
+
+    listing["jobs"] = []
+    assert "No jobs on 'train'" in invoke("jobs", "train")
+    assert "not found" in invoke("jobs", "eval")
+
+
+def test_path(client, monkeypatch):
+    client.storage.save_vm("mig-a", "mig", "us-central1-a", custom_name="train")
+    monkeypatch.setattr(client, "instance_states", lambda vms: {"mig-a": {"external_ip": "203.0.113.7", "internal_ip": "10.0.0.2"}})
+    monkeypatch.setattr(netpath, "measure_paths", lambda node, bastion=False, timeout=2.0: {"internal": None, "external": 0.012})
+    monkeypatch.setattr(client.gcloud, "get_ssh_username", lambda: "me")
+
+    output = invoke("path", "train")
+    assert "12" in output and "external" in output
+    assert client.storage.get_vm("train")["ssh_path"] == "external"
+    assert "HostName 203.0.113.7" in client.ssh_config._read_config()
+
+    assert "No bastion configured" in invoke("path", "train", "--use", "bastion")
+
+
+def test_daemon_status(client, monkeypatch):
+    assert "migs daemon is not running" in invoke("daemon", "status")
+
+    status = {"pid": 4242, "uptime": 90.0, "requests": 3, "tracked_vms": 2, "ssh_masters": 1, "mig_catalog": 5,
+              "environment": {"account": "me@example.com", "project": "proj", "beta": True}}
+    monkeypatch.setattr(daemon, "request", lambda message, timeout=None: status if message == {"op": "status"} else None)
+    output = invoke("daemon", "status")
+    assert "4242" in output and "me@example.com" in output and "90s" in output
+
+
+@pytest.mark.parametrize("argv, forwardable", [
+    (["vms"], True),
+    (["vms", "--watch"], False),
+    (["sync"], True),
+    (["sync", "--discover"], False),
+    (["down", "--mine"], False),
+    (["down", "--mine", "--yes"], True),
+    (["ssh", "train"], False),
+    ([], False),
+])
+def test_forwardable_commands(argv, forwardable):
+    assert daemon._is_forwardable(argv) is forwardable
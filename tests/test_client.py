@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from migs.client import AsyncClient, Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakeMIG(GCloudWrapper):
+    """A MIG that creates every requested VM at once"""
+
+    def project_id(self):
+        return None
+
+    def get_mig_zones(self):
+        return {"mig": "zone-1"}
+
+    def list_instances(self, mig_name, zone):
+        return []
+
+    def create_resize_request(self, mig_name, zone, count, run_duration=None, instance_names=None, force_mode=None):
+        return "migs-resize-100", True
+
+    def iter_ready_vms(self, mig_name, zone, request_id, expected_count=1, progress_callback=None, initial_instance_names=None, target_instance_names=None, poll_interval=5):
+        for name in target_instance_names:
+            yield {"name": name, "zone": zone, "status": "RUNNING", "external_ip": "203.0.113.7", "internal_ip": "10.0.0.2", "username": "me"}
+
+
+@pytest.fixture
+def client(home, monkeypatch):
+    client = Client(gcloud=FakeMIG())
+    monkeypatch.setattr(client, "trust_host_keys", lambda vms, timeout=None: {vm.display_name: True for vm in vms})
+    monkeypatch.setattr(client, "select_paths", lambda vms, path=None: {})
+    return client
+
+
+def test_up_reports_each_step_and_each_vm_as_it_is_ready(client):
+    events = []
+    tracked_when_ready = []
+
+    def on_ready(vm):
+        tracked_when_ready.append([record["display_name"] for record in client.storage.list_vms()])
+
+    vms = client.up("mig", count=2, name="train", progress_callback=lambda event, info: events.append(event), on_ready=on_ready)
+    assert [vm.display_name for vm in vms] == ["train1", "train2"]
+    assert [event for event in events if event != "waiting"] == ["submitted", "capacity", "ssh_setup", "ssh_ready"]
+    # Each VM is tracked by the time on_ready hears about it
+    assert tracked_when_ready == [["train1"], ["train1", "train2"]]
+    assert client.pending_requests() == []
+
+
+def test_up_detach_leaves_the_request_journaled(client):
+    assert client.up("mig", count=2, name="train", detach=True) == []
+    (request,) = client.pending_requests()
+    assert request.pid is None and request.instance_names == ["train1", "train2"]
+    assert client.vms() == []
+
+
+def test_async_client_runs_the_same_calls(client):
+    async def main():
+        async_client = AsyncClient(client)
+        vms = await async_client.up("mig", count=1, name="eval")
+        listed = await async_client.vms()
+        await async_client.close()
+        return vms, listed
+
+    vms, listed = asyncio.run(main())
+    assert [vm.display_name for vm in vms] == [vm.display_name for vm in listed] == ["eval"]
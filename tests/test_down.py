@@ -0,0 +1,51 @@
+import subprocess
+import threading
+
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakeDeletes(GCloudWrapper):
+    """Records delete-instances calls; MIGs listed in failing reject theirs"""
+
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _exec(self, cmd, category="read", capture=True, timeout=None, stdin=None, stdout=None):
+        mig_name = cmd[5]
+        instances = next(arg for arg in cmd if arg.startswith("--instances=")).split("=", 1)[1].split(",")
+        zone = next(arg for arg in cmd if arg.startswith("--zone=")).split("=", 1)[1]
+        with self.lock:
+            self.calls.append((mig_name, zone, sorted(instances)))
+        failed = mig_name in self.failing
+        return subprocess.CompletedProcess(cmd, 1 if failed else 0, "", "quota" if failed else "")
+
+
+def vm(instance_name, mig_name, zone="zone-1"):
+    return {"instance_name": instance_name, "mig_name": mig_name, "zone": zone}
+
+
+def test_one_call_per_mig_and_zone(home):
+    gcloud = FakeDeletes()
+    results = gcloud.delete_vms([vm("a1", "a"), vm("a2", "a"), vm("a3", "a", "zone-2"), vm("b1", "b")])
+    assert sorted(gcloud.calls) == [("a", "zone-1", ["a1", "a2"]), ("a", "zone-2", ["a3"]), ("b", "zone-1", ["b1"])]
+    assert all(results.values()) and len(results) == 4
+
+
+def test_a_failing_group_only_fails_its_own_vms(home, capsys):
+    gcloud = FakeDeletes(failing=["b"])
+    results = gcloud.delete_vms([vm("a1", "a"), vm("b1", "b"), vm("b2", "b")])
+    assert results == {"a1": True, "b1": False, "b2": False}
+    assert "Delete error (b)" in capsys.readouterr().out
+
+
+def test_down_untracks_only_deleted_vms(home):
+    gcloud = FakeDeletes(failing=["b"])
+    client = Client(gcloud=gcloud)
+    client.storage.save_vm("a1", "a", "zone-1", custom_name="train")
+    client.storage.save_vm("b1", "b", "zone-1")
+    assert client.down(client.vms()) == {"train": True, "b1": False}
+    assert [vm.display_name for vm in client.vms()] == ["b1"]
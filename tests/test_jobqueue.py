@@ -0,0 +1,34 @@
+from migs import jobqueue
+
+
+LISTING = """GPUS 8
+JOB b|queued|4||1700000100||||train
+JOB a|running|2|0,1|1700000000|1700000001|||
+JOB c|running|1|2|1700000000|1700000001||1|
+JOB d|done|2|3,4|1700000000|1700000001|1700000050|0|eval|extra
+"""
+
+
+def test_parse_listing():
+    listing = jobqueue.parse_listing(LISTING)
+    assert listing["gpus"] == 8
+    assert [job["id"] for job in listing["jobs"]] == ["a", "b", "c", "d"]
+
+    a, b, c, d = listing["jobs"]
+    assert a["state"] == "running" and a["devices"] == "0,1" and a["exit_code"] is None and a["finished"] is None
+    assert b["gpus"] == 4 and b["started"] is None and b["name"] == "train"
+    # Finished since the scheduler last looked
+    assert c["state"] == "failed" and c["exit_code"] == 1
+    # Only the fields after the last separator are kept together
+    assert d["name"] == "eval|extra" and d["finished"] == 1700000050
+
+
+def test_parse_listing_without_queue():
+    assert jobqueue.parse_listing("GPUS 0\n") == {"gpus": 0, "jobs": []}
+    assert jobqueue.parse_listing("") == {"gpus": 0, "jobs": []}
+
+
+def test_free_gpus():
+    listing = jobqueue.parse_listing(LISTING)
+    # a (running, 2) and b (queued, 4) hold GPUs; c failed and d is done
+    assert jobqueue.free_gpus(listing) == 2
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakeStableMIG(GCloudWrapper):
+    """MIGs taking resize-by requests (no instance names), whose VMs come up as listed in created"""
+
+    def __init__(self, states=None):
+        super().__init__()
+        self.states = states or {}
+        self.created = {}
+
+    def project_id(self):
+        return None
+
+    def list_instances(self, mig_name, zone):
+        return []
+
+    def create_resize_request(self, mig_name, zone, count, run_duration=None, instance_names=None, force_mode=None):
+        return f"migs-resize-{len(self.created) + 100}", False
+
+    def get_resize_request_state(self, mig_name, zone, request_id):
+        state = self.states.get(mig_name, "SUCCEEDED")
+        if isinstance(state, Exception):
+            raise state
+        return state
+
+    def iter_ready_vms(self, mig_name, zone, request_id, expected_count=1, progress_callback=None, initial_instance_names=None, target_instance_names=None, poll_interval=5):
+        for name in self.created.get(mig_name, []):
+            yield {"name": name, "zone": zone, "status": "RUNNING", "external_ip": None, "internal_ip": "10.0.0.2"}
+
+
+@pytest.fixture
+def gcloud():
+    return FakeStableMIG()
+
+
+@pytest.fixture
+def client(home, gcloud, monkeypatch):
+    client = Client(gcloud=gcloud)
+    monkeypatch.setattr(client, "trust_host_keys", lambda vms, timeout=None: {vm.display_name: True for vm in vms})
+    monkeypatch.setattr(client, "select_paths", lambda vms, path=None: {})
+    return client
+
+
+def test_requests_round_trip_through_the_journal(client):
+    request = client.request_vms("mig", count=2, name="train", zone="zone-1")
+    (journaled,) = client.pending_requests()
+    assert journaled == request and journaled.pid == os.getpid()
+    assert isinstance(journaled.candidates[0]["initial_instance_names"], set)
+
+
+def test_resumed_wait_keeps_names_already_given(client, gcloud):
+    request = client.request_vms("mig", count=3, name="train", zone="zone-1")
+    gcloud.created["mig"] = ["mig-a"]
+    # The first run tracks one VM, then stops
+    assert next(client.iter_ready(request)).display_name == "train1"
+
+    gcloud.created["mig"] = ["mig-a", "mig-b", "mig-c"]
+    vms = client.wait(client.get_request(request.id))
+    assert {vm.instance_name: vm.display_name for vm in vms} == {"mig-a": "train1", "mig-b": "train2", "mig-c": "train3"}
+    assert client.pending_requests() == []
+
+
+def test_interrupted_wait_detaches_the_request(client, gcloud):
+    request = client.request_vms("mig", count=2, name="train", zone="zone-1")
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+        yield
+
+    gcloud.iter_ready_vms = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        client.wait(request)
+    (journaled,) = client.pending_requests()
+    assert journaled.pid is None and client.is_orphaned(journaled)
+
+
+def test_live_waiter_is_not_orphaned(client):
+    request = client.request_vms("mig", count=1, zone="zone-1")
+    assert not client.is_orphaned(request)
+
+
+def test_recover_checks_each_orphaned_request_on_its_own(client, gcloud):
+    gcloud.states = {"good": "SUCCEEDED", "failed": "FAILED", "broken": RuntimeError("describe failed")}
+    gcloud.created["good"] = ["good-a"]
+    requests = {mig_name: client.request_vms(mig_name, count=1, name=f"{mig_name}-vm", zone="zone-1") for mig_name in ("good", "failed", "broken")}
+    for request in requests.values():
+        client.detach(request)
+
+    recovered, dropped, errors = client.recover()
+    assert [vm.display_name for vm in recovered] == ["good-vm"]
+    assert [request.id for request in dropped] == [requests["failed"].id]
+    assert errors == {requests["broken"].id: "describe failed"}
+    assert [request.id for request in client.pending_requests()] == [requests["broken"].id]
+
+
+def test_recover_does_not_wait_on_the_guests(client, monkeypatch, gcloud):
+    timeouts = []
+    monkeypatch.setattr(client, "trust_host_keys", lambda vms, timeout=None: timeouts.append(timeout) or {})
+    monkeypatch.setattr(client, "select_paths", lambda vms, path=None: pytest.fail("paths were measured"))
+    gcloud.created["mig"] = ["mig-a"]
+    client.detach(client.request_vms("mig", count=1, zone="zone-1"))
+    recovered, _, _ = client.recover()
+    assert len(recovered) == 1 and timeouts == [0]
+
+
+def test_unreadable_journal_entries_are_skipped(client, home):
+    client.request_vms("mig", count=1, zone="zone-1")
+    client.journal.write("hand-edited", {"count": 1})
+    assert len(client.pending_requests()) == 1
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from migs import client as client_module
+from migs.client import VM, Client
+from migs.gcloud import GCloudWrapper
+
+# The nodes' clocks in these tests, far ahead of this machine's
+NODE_CLOCK_AHEAD = 3600.0
+
+
+class FakeCluster(GCloudWrapper):
+    """Nodes that stage and start whatever they are told to, with their own clock"""
+
+    def __init__(self, staged=True, clock=True):
+        super().__init__()
+        self.staged = staged
+        self.clock = clock
+        self.released = {}
+        self.lock = threading.Lock()
+
+    def get_instance_internal_details(self, instance_name, zone):
+        return {"internal_ip": "10.0.0.2", "gpu_count": 8}
+
+    def run_script(self, script_path, instance_name, zone, session_name, script_args=None, env_file=None, extra_env=None, force_upload=False, barrier=False):
+        return self.staged or instance_name != "node2"
+
+    def remote_time(self, instance_name, zone):
+        return time.time() + NODE_CLOCK_AHEAD if self.clock else None
+
+    def release_launch(self, instance_name, zone, session_name, start_at):
+        with self.lock:
+            self.released[instance_name] = start_at
+        return True
+
+    def launch_start_time(self, instance_name, zone, session_name, timeout=10):
+        return self.released[instance_name] + 0.01
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / "train.sh"
+    path.write_text("torchrun train.py\n")
+    return str(path)
+
+
+def nodes():
+    return [VM(display_name=f"node{idx}", instance_name=f"node{idx}", mig_name="mig", zone="zone") for idx in range(3)]
+
+
+def test_synchronized_launch_uses_the_head_node_clock(home, script):
+    cluster = FakeCluster()
+    result = Client(gcloud=cluster).run(nodes(), script, torchrun=True)
+    assert result.success_count == 3
+    assert set(cluster.released.values()) == {result.start_at}
+    lead = result.start_at - NODE_CLOCK_AHEAD - time.time()
+    assert 0 < lead <= client_module.LAUNCH_LEAD + client_module.LAUNCH_LEAD_PER_NODE * 3
+    assert result.clock_skew == pytest.approx(NODE_CLOCK_AHEAD, abs=1)
+    assert result.start_skew == pytest.approx(0)
+
+
+def test_launch_is_called_off_without_the_head_clock(home, script):
+    cluster = FakeCluster(clock=False)
+    result = Client(gcloud=cluster).run(nodes(), script, torchrun=True)
+    assert result.success_count == 0 and result.start_at is None
+    assert set(cluster.released.values()) == {None}
+
+
+def test_launch_is_called_off_when_a_node_fails_to_stage(home, script):
+    cluster = FakeCluster(staged=False)
+    result = Client(gcloud=cluster).run(nodes(), script, torchrun=True)
+    assert result.success_count == 0
+    assert cluster.released == {"node0": None, "node1": None}
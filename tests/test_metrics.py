@@ -0,0 +1,43 @@
+import math
+
+from migs import metrics
+
+
+def attempt(mig_name, outcome="succeeded", capacity_seconds=None, project=None):
+    return {"mig_name": mig_name, "zone": "us-central1-a", "project": project, "outcome": outcome, "capacity_seconds": capacity_seconds}
+
+
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert metrics.percentile(values, 50) == 3
+    assert metrics.percentile(values, 90) == 5
+    assert metrics.percentile(values, 0) == 1
+    assert metrics.percentile([7], 50) == 7
+
+
+def test_percentile_empty():
+    assert metrics.percentile([], 50) is None
+
+
+def test_recent_p50_without_history():
+    assert metrics.recent_p50([attempt("other", capacity_seconds=10)], "mig") is None
+
+
+def test_recent_p50_ignores_lost_races_and_other_projects():
+    attempts = [
+        attempt("mig", capacity_seconds=10),
+        attempt("mig", capacity_seconds=30),
+        attempt("mig", outcome="lost"),
+        attempt("mig", capacity_seconds=1, project="elsewhere"),
+    ]
+    assert metrics.recent_p50(attempts, "mig") == 10
+
+
+def test_recent_p50_counts_failures_as_never():
+    attempts = [attempt("mig", outcome="failed"), attempt("mig", outcome="failed"), attempt("mig", capacity_seconds=10)]
+    assert metrics.recent_p50(attempts, "mig") == math.inf
+
+
+def test_recent_p50_uses_latest_attempts():
+    attempts = [attempt("mig", capacity_seconds=1000)] * 50 + [attempt("mig", capacity_seconds=10)] * metrics.RECENT_ATTEMPTS
+    assert metrics.recent_p50(attempts, "mig") == 10
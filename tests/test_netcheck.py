@@ -0,0 +1,48 @@
+import itertools
+
+import pytest
+
+from migs import netcheck
+
+
+@pytest.mark.parametrize("count", [2, 3, 4, 5, 8])
+def test_schedule_covers_every_pair_once(count):
+    rounds = netcheck.schedule(count)
+    pairs = [frozenset((node, peer)) for peers in rounds for node, peer in enumerate(peers) if peer is not None]
+    # Each pair shows up once per direction, and never in two rounds
+    assert sorted(map(sorted, set(pairs))) == sorted(map(sorted, itertools.combinations(range(count), 2)))
+    assert len(pairs) == 2 * len(set(pairs))
+
+
+@pytest.mark.parametrize("count", [2, 3, 4, 5, 8])
+def test_schedule_rounds_are_matchings(count):
+    for peers in netcheck.schedule(count):
+        assert len(peers) == count
+        for node, peer in enumerate(peers):
+            if peer is not None:
+                assert peer != node
+                assert peers[peer] == node
+
+
+def test_schedule_odd_count_sits_one_node_out():
+    for peers in netcheck.schedule(5):
+        assert peers.count(None) == 1
+
+
+def test_schedule_ring():
+    assert netcheck.schedule(4, ring=True) == [[1, 2, 3, 0]]
+
+
+def test_schedule_single_node():
+    assert netcheck.schedule(1) == []
+    assert netcheck.schedule(1, ring=True) == []
+
+
+def test_parse_probe_takes_last_json_line():
+    output = 'Warning: something\n{"listening": true, "links": {}}\n'
+    assert netcheck.parse_probe(output) == {"listening": True, "links": {}}
+
+
+def test_parse_probe_without_result():
+    assert netcheck.parse_probe("ssh: connect to host timed out\n") is None
+    assert netcheck.parse_probe("{not json\n") is None
@@ -0,0 +1,67 @@
+import pytest
+
+from migs import netpath
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("jump.example.com", {"host": "jump.example.com", "user": None, "port": None}),
+    ("me@jump.example.com", {"host": "jump.example.com", "user": "me", "port": None}),
+    ("me@10.0.0.1:2222", {"host": "10.0.0.1", "user": "me", "port": 2222}),
+])
+def test_parse_bastion(spec, expected):
+    assert netpath.parse_bastion(spec) == expected
+
+
+def test_fastest():
+    assert netpath.fastest({"internal": 0.004, "external": 0.002, "iap": 0.5}) == "external"
+    assert netpath.fastest({"internal": None, "external": None, "bastion": 0.03}) == "bastion"
+    # Ties go to the preferred path
+    assert netpath.fastest({"iap": 0.01, "external": 0.01, "internal": 0.01}) == "internal"
+    assert netpath.fastest({"internal": None, "external": None}) is None
+    assert netpath.fastest({}) is None
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """RTTs each address or proxy answers with; the proxied commands run are recorded"""
+    rtts = {}
+    proxied = []
+    monkeypatch.setattr(netpath, "measure_direct", lambda host, timeout: rtts.get(host))
+
+    def measure_proxy(cmd, timeout):
+        proxied.append(cmd)
+        return rtts.get(cmd[-1] if cmd[0] == "ssh" else "iap")
+
+    monkeypatch.setattr(netpath, "measure_proxy", measure_proxy)
+    return rtts, proxied
+
+
+NODE = {"instance_name": "mig-a", "zone": "zone-1", "internal_ip": "10.0.0.2", "external_ip": "1.1.1.1"}
+
+
+def test_measure_paths_skips_iap_when_a_path_works(probes):
+    rtts, proxied = probes
+    rtts["10.0.0.2"] = 0.001
+    assert netpath.measure_paths(NODE) == {"internal": 0.001, "external": None}
+    assert proxied == []
+
+
+def test_measure_paths_tries_the_bastion_when_configured(probes):
+    rtts, proxied = probes
+    rtts[netpath.BASTION_ALIAS] = 0.02
+    assert netpath.measure_paths(NODE, bastion=True) == {"internal": None, "external": None, "bastion": 0.02}
+    assert proxied[0][proxied[0].index("-W") + 1] == "10.0.0.2:22"
+
+
+def test_measure_paths_falls_back_to_iap(probes):
+    rtts, proxied = probes
+    rtts["iap"] = 0.3
+    node = {"instance_name": "mig-a", "zone": "zone-1", "project": "proj"}
+    assert netpath.measure_paths(node, bastion=True) == {"internal": None, "external": None, "iap": 0.3}
+    assert proxied == [netpath.iap_proxy_command("mig-a", "zone-1", "proj")]
+
+
+def test_measure_proxy_waits_for_the_banner():
+    assert netpath.measure_proxy(["sh", "-c", "echo SSH-2.0-OpenSSH"], timeout=5) is not None
+    assert netpath.measure_proxy(["sh", "-c", "echo nope"], timeout=5) is None
+    assert netpath.measure_proxy(["/nonexistent/proxy"], timeout=5) is None
@@ -0,0 +1,87 @@
+import pytest
+
+from migs import readiness
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakePoolGCloud(GCloudWrapper):
+    """A MIG that creates the requested VMs at once; SSH logins fail a set number of times first"""
+
+    def __init__(self, login_failures=0):
+        super().__init__("proj")
+        self.login_failures = login_failures
+        self.deleted = []
+
+    def project_id(self):
+        return "proj"
+
+    def list_instances(self, mig_name, zone):
+        return []
+
+    def create_resize_request(self, mig_name, zone, count, run_duration=None, instance_names=None, force_mode=None):
+        self.names = instance_names
+        return "migs-resize-100", True
+
+    def iter_ready_vms(self, mig_name, zone, request_id, expected_count=1, progress_callback=None, initial_instance_names=None, target_instance_names=None, poll_interval=5):
+        for idx, name in enumerate(target_instance_names):
+            yield {"name": name, "zone": zone, "status": "RUNNING", "internal_ip": f"10.0.0.{idx + 2}", "external_ip": None}
+
+    def get_ssh_username(self):
+        return "me"
+
+    def check_ssh_connectivity(self, instance_name, zone):
+        self.login_failures -= 1
+        return self.login_failures < 0
+
+    def get_host_keys(self, instance_name, zone, timeout=0):
+        return ["ssh-ed25519 AAAA"]
+
+    def delete_vms(self, vms):
+        self.deleted.extend(vm["instance_name"] for vm in vms)
+        return {vm["instance_name"]: True for vm in vms}
+
+
+@pytest.fixture
+def network(monkeypatch):
+    """Addresses whose SSH port answers; sleeping is instant"""
+    up = set()
+    monkeypatch.setattr(readiness, "probe_ssh_port", lambda host, port=22, timeout=3.0: host in up)
+    monkeypatch.setattr(readiness.time, "sleep", lambda seconds: None)
+    return up
+
+
+def test_standby_vm_with_slow_login_is_pooled(home, network):
+    network.add("10.0.0.2")
+    gcloud = FakePoolGCloud(login_failures=3)
+    client = Client(gcloud=gcloud)
+    assert client._add_standby(gcloud, "mig", "zone", "proj", 1, False, None) == 1
+    assert gcloud.deleted == []
+    assert [vm["instance_name"] for vm in client.storage.list_pooled_vms("mig")] == gcloud.names
+
+
+def test_unreachable_standby_vm_is_deleted(home, network, monkeypatch):
+    monkeypatch.setattr("migs.client.STANDBY_READY_TIMEOUT", 0)
+    gcloud = FakePoolGCloud()
+    client = Client(gcloud=gcloud)
+    assert client._add_standby(gcloud, "mig", "zone", "proj", 1, False, None) == 0
+    assert gcloud.deleted == gcloud.names
+    assert client.storage.list_pooled_vms() == []
+
+
+def test_claim_probes_internal_addresses(home, network):
+    network.add("10.0.0.2")
+    client = Client(gcloud=FakePoolGCloud())
+    client.storage.add_pooled_vm("mig-a", "mig", "zone", "proj", None, "me", "10.0.0.2")
+    client.storage.add_pooled_vm("mig-b", "mig", "zone", "proj", None, "me", "10.0.0.3")
+    client.storage.add_pooled_vm("mig-c", "mig", "zone", "proj", "1.1.1.1", "me", "10.0.0.4")
+
+    (vm,) = client.claim_from_pool("mig", name="train", refill=False)
+    assert (vm.display_name, vm.instance_name, vm.internal_ip) == ("train", "mig-a", "10.0.0.2")
+    assert client.storage.get_vm("train")["instance_name"] == "mig-a"
+    assert client.ssh_config.known_host_names() == {"train"}
+    assert sorted(vm["instance_name"] for vm in client.storage.list_pooled_vms()) == ["mig-b", "mig-c"]
+
+    # Nothing left that answers
+    assert client.claim_from_pool("mig", name="eval", refill=False) == []
+    assert len(client.storage.list_pooled_vms()) == 2
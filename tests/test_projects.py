@@ -0,0 +1,58 @@
+import json
+import subprocess
+
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+def test_commands_are_pinned_to_the_wrapper_project(home):
+    cmd = ["gcloud", "compute", "ssh", "vm", "--", "echo", "--project=x"]
+    assert GCloudWrapper("proj-a").with_project(cmd) == ["gcloud", "--project=proj-a", *cmd[1:]]
+    assert GCloudWrapper().with_project(cmd) == cmd
+    pinned = ["gcloud", "--project=proj-b", "compute", "instances", "list"]
+    assert GCloudWrapper("proj-a").with_project(pinned) == pinned
+
+
+def test_one_wrapper_and_rate_limiter_per_project(home):
+    gcloud = GCloudWrapper()
+    assert gcloud.for_project(None) is gcloud
+    proj_a = gcloud.for_project("proj-a")
+    assert proj_a.project == "proj-a" and gcloud.for_project("proj-a") is proj_a
+    assert proj_a.for_project("proj-a") is proj_a
+    assert proj_a.executor is not gcloud.for_project("proj-b").executor is not gcloud.executor
+
+
+def test_projects_default_to_the_config_then_the_active_one(home):
+    client = Client()
+    assert client.projects() == [None]
+    (home / ".migs" / "config.json").write_text(json.dumps({"projects": ["proj-a", "proj-b"]}))
+    assert client.projects() == ["proj-a", "proj-b"]
+    assert client.projects(["proj-c"]) == ["proj-c"]
+
+
+def test_migs_are_listed_across_projects(home, monkeypatch):
+    listings = {
+        "proj-a": [{"name": "train", "zone": "zones/us-central1-a", "size": 1, "targetSize": 2}],
+        "proj-b": [{"name": "eval", "zone": "europe-west4-a", "size": 0, "targetSize": 0}],
+    }
+
+    def exec_(self, cmd, *args, **kwargs):
+        project = next(arg for arg in self.with_project(cmd) if arg.startswith("--project=")).split("=", 1)[1]
+        return subprocess.CompletedProcess(cmd, 0, json.dumps(listings[project]), "")
+
+    monkeypatch.setattr(GCloudWrapper, "_exec", exec_)
+    migs = Client().list_migs(["proj-a", "proj-b"])
+    assert [(mig.name, mig.project, mig.zone, mig.target_size) for mig in migs] == [
+        ("train", "proj-a", "us-central1-a", 2),
+        ("eval", "proj-b", "europe-west4-a", 0),
+    ]
+
+
+def test_tracked_vms_by_project(home):
+    client = Client()
+    client.storage.save_vm("a1", "mig", "zone", project="proj-a")
+    client.storage.save_vm("b1", "mig", "zone", project="proj-b")
+    assert [vm.instance_name for vm in client.vms(["proj-b"])] == ["b1"]
+    assert sorted(vm.instance_name for vm in client.vms()) == ["a1", "b1"]
+    groups = Client.group_by_project(client.vms())
+    assert {project: [vm.instance_name for vm in vms] for project, vms in groups.items()} == {"proj-a": ["a1"], "proj-b": ["b1"]}
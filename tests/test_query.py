@@ -0,0 +1,25 @@
+from migs import query
+
+
+def test_equals_quotes_special_values():
+    assert query.equals("name", "vm-1") == "name=vm-1"
+    assert query.equals("name", "my vm") == 'name="my vm"'
+    assert query.equals("name", 'a"b') == 'name="a\\"b"'
+
+
+def test_any_of():
+    assert query.any_of("name", ["a", "b c"]) == 'name=(a "b c")'
+
+
+def test_all_of_skips_empty_expressions():
+    assert query.all_of("a=1", "", "b=2") == "(a=1) AND (b=2)"
+    assert query.all_of("a=1") == "(a=1)"
+
+
+def test_negate_and_matches():
+    assert query.negate(query.matches("name", "^gke-")) == "NOT (name~^gke-)"
+    assert query.NOT_GKE_POOL == "NOT ((name~^gke-) AND (name~default-pool))"
+
+
+def test_projection():
+    assert query.projection(["name", "zone"]) == "json(name,zone)"
@@ -0,0 +1,86 @@
+import pytest
+
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakeRaceGCloud(GCloudWrapper):
+    """Resize requests whose states and instances are set by the test, with every mutation recorded"""
+
+    def __init__(self, states, instances, beta=True):
+        super().__init__()
+        self.states = states
+        self.instances = instances
+        self.beta = beta
+        self.created = []
+        self.cancelled = []
+        self.deleted = []
+
+    def project_id(self):
+        return "proj"
+
+    def get_mig_zones(self):
+        return {"a": "zone-1", "b": "zone-1", "c": "zone-2"}
+
+    def list_instances(self, mig_name, zone):
+        return [{"name": name, "id": str(idx)} for idx, name in enumerate(self.instances.get(mig_name, []))]
+
+    def create_resize_request(self, mig_name, zone, count, run_duration=None, instance_names=None, force_mode=None):
+        self.created.append((mig_name, instance_names))
+        return f"migs-resize-{mig_name}-100", self.beta
+
+    def get_resize_request_state(self, mig_name, zone, request_id):
+        return self.states[mig_name]
+
+    def cancel_resize_request(self, mig_name, zone, request_id):
+        self.cancelled.append(mig_name)
+        return self.states[mig_name] != "SUCCEEDED"
+
+    def delete_vms(self, vms):
+        self.deleted.extend(vm["instance_name"] for vm in vms)
+        return {vm["instance_name"]: True for vm in vms}
+
+
+def candidate(mig_name, target_instance_names=None, initial=()):
+    return {"mig_name": mig_name, "zone": "zone-1", "request_id": f"r-{mig_name}", "initial_instance_names": set(initial), "target_instance_names": target_instance_names}
+
+
+def test_race_keeps_the_first_to_succeed_and_cancels_the_rest(home):
+    gcloud = FakeRaceGCloud({"a": "CREATING", "b": "SUCCEEDED"}, {"b": ["vm-b"]})
+    winner = gcloud.race_resize_requests([candidate("a", ["vm-a"]), candidate("b", ["vm-b"])], 1)
+    assert winner["mig_name"] == "b"
+    assert gcloud.cancelled == ["a"] and gcloud.deleted == []
+
+
+def test_race_deletes_only_named_instances_of_a_loser_that_succeeded(home):
+    gcloud = FakeRaceGCloud({"a": "SUCCEEDED", "b": "SUCCEEDED"}, {"a": ["vm-a"], "b": ["teammate", "vm-b"]})
+    winner = gcloud.race_resize_requests([candidate("a", ["vm-a"]), candidate("b", ["vm-b"])], 1)
+    assert winner["mig_name"] == "a"
+    assert gcloud.deleted == ["vm-b"]
+
+
+def test_race_leaves_resize_by_losers_running(home, capsys):
+    # Without instance names, the loser's VMs can't be told apart from a teammate's
+    gcloud = FakeRaceGCloud({"a": "SUCCEEDED", "b": "SUCCEEDED"}, {"a": ["vm-a"], "b": ["teammate", "vm-b"]})
+    gcloud.race_resize_requests([candidate("a"), candidate("b", initial=["old"])], 1)
+    assert gcloud.deleted == []
+    assert "left running" in capsys.readouterr().out
+
+
+def test_race_fails_when_every_request_fails(home):
+    gcloud = FakeRaceGCloud({"a": "FAILED", "b": "CANCELLED"}, {})
+    with pytest.raises(Exception, match="All resize requests failed"):
+        gcloud.race_resize_requests([candidate("a"), candidate("b")], 1)
+
+
+def test_named_candidates_in_the_same_zone_get_distinct_instance_names(home):
+    gcloud = FakeRaceGCloud({}, {})
+    request = Client(gcloud=gcloud).request_vms("a", count=2, name="train", extra_migs=["b", "c"], journal=False)
+    assert gcloud.created == [
+        ("a", ["train1", "train2"]),
+        ("b", ["train1-r2", "train2-r2"]),
+        ("c", ["train1", "train2"]),
+    ]
+    # The VMs are called by the requested names whichever candidate wins
+    request.winner = request.candidates[1]
+    assert request.instance_names == ["train1", "train2"]
@@ -0,0 +1,83 @@
+import sys
+
+import pytest
+
+from migs.ratelimit import CommandExecutor, TokenBucket, classify_error
+
+RATE_LIMITED = "ERROR: (gcloud.compute.instances.list) Rate Limit Exceeded"
+BACKEND = "ERROR: (gcloud.compute.instances.list) Backend Error"
+
+
+@pytest.mark.parametrize("stderr, kind", [
+    (RATE_LIMITED, "rate_limit"),
+    ("ERROR: (gcloud.compute.ssh) HTTPError 429: Too Many Requests", "rate_limit"),
+    ("ERROR: (gcloud.compute.instances.describe) HTTPError 503: Service Unavailable", "transient"),
+    ("ERROR: (gcloud.compute.ssh) You do not currently have an active account selected. Please run: gcloud auth login", "auth"),
+    ("ERROR: (gcloud.compute.instances.describe) The resource 'vm' was not found", None),
+    # Output of a remote command run over SSH is not gcloud's error
+    ("Traceback: rate limit exceeded while downloading weights", None),
+    ("", None),
+    (None, None),
+])
+def test_classify_error(stderr, kind):
+    assert classify_error(stderr) == kind
+
+
+def flaky(tmp_path, failures, stderr):
+    """Command that fails with stderr the first failures times it runs"""
+    counter = tmp_path / "runs"
+    script = (
+        "import pathlib, sys\n"
+        f"p = pathlib.Path({str(counter)!r})\n"
+        "runs = int(p.read_text()) if p.exists() else 0\n"
+        "p.write_text(str(runs + 1))\n"
+        f"if runs < {failures}:\n"
+        f"    sys.stderr.write({stderr!r})\n"
+        "    sys.exit(1)\n"
+        "print('ok')\n"
+    )
+    return [sys.executable, "-c", script], lambda: int(counter.read_text())
+
+
+@pytest.fixture
+def executor():
+    return CommandExecutor(max_retries=3, base_delay=0.001, max_delay=0.001)
+
+
+def test_reads_are_retried_on_transient_errors(tmp_path, executor):
+    cmd, runs = flaky(tmp_path, 2, BACKEND)
+    result = executor.run(cmd, "read")
+    assert result.returncode == 0 and result.stdout == "ok\n" and runs() == 3
+
+
+def test_mutations_are_not_retried_on_transient_errors(tmp_path, executor):
+    cmd, runs = flaky(tmp_path, 2, BACKEND)
+    assert executor.run(cmd, "mutate").returncode == 1 and runs() == 1
+
+
+def test_mutations_are_retried_when_rate_limited(tmp_path, executor):
+    cmd, runs = flaky(tmp_path, 2, RATE_LIMITED)
+    assert executor.run(cmd, "mutate").returncode == 0 and runs() == 3
+
+
+def test_retries_give_up_after_max_retries(tmp_path, executor):
+    cmd, runs = flaky(tmp_path, 10, RATE_LIMITED)
+    assert executor.run(cmd, "read").returncode == 1 and runs() == 4
+
+
+def test_streamed_commands_are_never_retried(tmp_path, executor):
+    cmd, runs = flaky(tmp_path, 2, BACKEND)
+    with open(tmp_path / "out", "w") as out:
+        assert executor.run(cmd, "read", stdout=out).returncode == 1
+    assert runs() == 1
+
+
+def test_token_bucket_spaces_out_calls_past_the_burst(monkeypatch):
+    slept = []
+    monkeypatch.setattr("migs.ratelimit.time.sleep", slept.append)
+    bucket = TokenBucket(rate=10.0, burst=2)
+    for _ in range(4):
+        bucket.acquire()
+    # Two calls fit in the burst, the next two queue up 0.1s apart
+    assert len(slept) == 2
+    assert slept[0] == pytest.approx(0.1, abs=0.02) and slept[1] == pytest.approx(0.2, abs=0.02)
@@ -0,0 +1,63 @@
+import pytest
+
+from migs import readiness
+
+
+class FakeGCloud:
+    """gcloud SSH confirm that fails a set number of times first"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.confirms = 0
+
+    def for_project(self, project):
+        return self
+
+    def check_ssh_connectivity(self, instance_name, zone):
+        self.confirms += 1
+        return self.confirms > self.failures
+
+
+@pytest.fixture
+def network(monkeypatch):
+    """Addresses whose SSH port answers; sleeping is instant"""
+    up = set()
+    monkeypatch.setattr(readiness, "probe_ssh_port", lambda host, port=22, timeout=3.0: host in up)
+    monkeypatch.setattr(readiness.time, "sleep", lambda seconds: None)
+    return up
+
+
+def node(**addresses):
+    return dict({"display_name": "vm", "instance_name": "vm", "zone": "zone"}, **addresses)
+
+
+def test_ssh_hosts_puts_the_recorded_path_first():
+    assert readiness.ssh_hosts(node(external_ip="203.0.113.7", internal_ip="10.0.0.2")) == ["203.0.113.7", "10.0.0.2"]
+    assert readiness.ssh_hosts(node(external_ip="203.0.113.7", internal_ip="10.0.0.2", ssh_path="internal")) == ["10.0.0.2", "203.0.113.7"]
+    assert readiness.ssh_hosts(node(internal_ip="10.0.0.2")) == ["10.0.0.2"]
+
+
+def test_probe_any_returns_the_first_address_that_answers(network):
+    network.add("10.0.0.2")
+    assert readiness.probe_any(["203.0.113.7", "10.0.0.2"]) == "10.0.0.2"
+    assert readiness.probe_any(["203.0.113.7"]) is None
+    assert readiness.probe_any([]) is None
+
+
+def test_wait_for_node_over_internal_ip(network):
+    network.add("10.0.0.2")
+    result = readiness.wait_for_node(FakeGCloud(0), node(internal_ip="10.0.0.2"))
+    assert result["state"] == "ready" and result["host"] == "10.0.0.2"
+
+
+def test_wait_for_node_keeps_confirming_until_login_works(network):
+    network.add("203.0.113.7")
+    gcloud = FakeGCloud(failures=3)
+    result = readiness.wait_for_node(gcloud, node(external_ip="203.0.113.7"), timeout=600)
+    assert result["state"] == "ready" and gcloud.confirms == 4
+
+
+def test_wait_for_node_gives_up_at_the_deadline(network):
+    network.add("203.0.113.7")
+    assert readiness.wait_for_node(FakeGCloud(failures=1), node(external_ip="203.0.113.7"), timeout=0)["state"] == "ssh_failed"
+    assert readiness.wait_for_node(FakeGCloud(0), node(internal_ip="10.0.0.2"), timeout=0)["state"] == "unreachable"
@@ -0,0 +1,54 @@
+from migs.ssh_config import SSHConfigManager
+
+
+def vm(name, ip):
+    return {"name": f"mig-{name}", "zone": "zone-1", "username": "me", "external_ip": ip}
+
+
+def hosts(manager):
+    return [line.split()[1] for line in manager._read_config().splitlines() if line.startswith("Host ")]
+
+
+def test_entries_are_replaced_by_exact_host_name(home):
+    manager = SSHConfigManager()
+    manager.add_vm_to_config(vm("a", "1.1.1.1"), "node1")
+    manager.add_vm_to_config(vm("b", "1.1.1.10"), "node10")
+    manager.add_vm_to_config(vm("c", "2.2.2.2"), "node1")
+
+    config = manager._read_config()
+    assert sorted(hosts(manager)) == ["node1", "node10"]
+    assert "HostName 1.1.1.10" in config and "HostName 2.2.2.2" in config
+    assert "HostName 1.1.1.1\n" not in config
+
+
+def test_removal_leaves_prefixed_hosts_and_user_entries(home):
+    (home / ".ssh").mkdir(mode=0o700)
+    (home / ".ssh" / "config").write_text("Host node1-personal\n    User me\n")
+    manager = SSHConfigManager()
+    manager.add_vm_to_config(vm("a", "1.1.1.1"), "node1")
+    manager.add_vm_to_config(vm("b", "1.1.1.10"), "node10")
+
+    manager.remove_vm_from_config("node1")
+    assert hosts(manager) == ["node1-personal", "node10"]
+
+
+def test_removal_drops_the_hosts_keys(home):
+    manager = SSHConfigManager()
+    manager.add_vm_to_config(vm("a", "1.1.1.1"), "node1")
+    manager.add_vm_to_config(vm("b", "1.1.1.10"), "node10")
+    manager.set_host_keys({"node1": ["ssh-ed25519 AAAA1"], "node10": ["ssh-ed25519 AAAA10", "ssh-rsa BBBB10"]})
+    assert manager.known_host_names() == {"node1", "node10"}
+
+    # New keys replace the old ones instead of piling up
+    manager.set_host_keys({"node1": ["ssh-ed25519 CCCC1"]})
+    assert manager._read_known_hosts().count("node1 ssh-ed25519 CCCC1") == 1
+    assert "node1 ssh-ed25519 AAAA1" not in manager._read_known_hosts()
+
+    manager.remove_vms_from_config(["node1"])
+    assert manager._read_known_hosts() == ["node10 ssh-ed25519 AAAA10", "node10 ssh-rsa BBBB10"]
+
+
+def test_vms_without_a_route_are_not_added(home):
+    manager = SSHConfigManager()
+    manager.add_vm_to_config({"name": "mig-a", "zone": "zone-1", "username": "me"}, "node1", path="internal")
+    assert hosts(manager) == []
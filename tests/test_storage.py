@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from migs.storage import VMStorage, atomic_write, locked
+
+
+def test_lock_is_reentrant_and_exclusive(tmp_path):
+    path = tmp_path / "data.json"
+    lock = locked(path)
+    assert locked(path) is lock
+
+    acquired = threading.Event()
+
+    def acquire():
+        with lock:
+            acquired.set()
+
+    with lock:
+        with locked(path):
+            pass
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        # Still held by the outer block
+        assert not acquired.wait(0.2)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def test_atomic_write_keeps_mode_and_symlinks(tmp_path):
+    target = tmp_path / "dotfiles" / "config"
+    target.parent.mkdir()
+    target.write_text("old")
+    os.chmod(target, 0o600)
+    link = tmp_path / "config"
+    link.symlink_to(target)
+
+    atomic_write(link, "new")
+    assert link.is_symlink() and target.read_text() == "new"
+    assert target.stat().st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in target.parent.iterdir()) == ["config"]
+
+
+def test_atomic_write_leaves_the_file_alone_on_failure(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text("{}")
+    with pytest.raises(TypeError):
+        atomic_write(path, None)
+    assert path.read_text() == "{}"
+    assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_concurrent_writers_in_threads_all_land(home):
+    stores = [VMStorage() for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: stores[i % 4].save_vm(f"mig-{i}", "mig", "zone-1", custom_name=f"vm{i}"), range(40)))
+    assert len(VMStorage().list_vms()) == 40
+
+
+def _save_vms(worker):
+    storage = VMStorage()
+    for i in range(10):
+        storage.save_vm(f"mig-{worker}-{i}", "mig", "zone-1", custom_name=f"vm{worker}-{i}")
+
+
+def test_concurrent_writers_in_processes_all_land(home):
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_save_vms, args=(worker,)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    assert len(VMStorage().list_vms()) == 40
@@ -0,0 +1,63 @@
+import pytest
+
+from migs.client import Client
+from migs.gcloud import GCloudWrapper
+
+
+class FakeBootingMIG(GCloudWrapper):
+    """A MIG whose instance listing advances one poll at a time"""
+
+    def __init__(self, polls, states=None):
+        super().__init__()
+        self.polls = polls
+        self.states = states or []
+        self.listed = 0
+
+    def get_resize_request_state(self, mig_name, zone, request_id):
+        return self.states.pop(0) if self.states else "CREATING"
+
+    def list_instances(self, mig_name, zone):
+        poll = self.polls[min(self.listed, len(self.polls) - 1)]
+        self.listed += 1
+        return [{"name": name, "id": str(idx), "instanceStatus": status} for idx, (name, status) in enumerate(poll)]
+
+    def get_instance_details(self, instance_name, zone):
+        return {"name": instance_name, "zone": zone, "status": "RUNNING", "external_ip": None, "internal_ip": "10.0.0.2"}
+
+
+def test_vms_are_yielded_as_each_comes_up(home):
+    gcloud = FakeBootingMIG([
+        [("old", "RUNNING"), ("vm-a", "STAGING"), ("vm-b", "PROVISIONING")],
+        [("old", "RUNNING"), ("vm-a", "RUNNING"), ("vm-b", "STAGING")],
+        [("old", "RUNNING"), ("vm-a", "RUNNING"), ("vm-b", "RUNNING")],
+    ])
+    vms = gcloud.iter_ready_vms("mig", "zone", "r", expected_count=2, initial_instance_names={"old"}, poll_interval=0)
+    assert next(vms)["name"] == "vm-a"
+    # The second VM was still booting when the first one was handed out
+    assert gcloud.listed == 2
+    assert [vm["name"] for vm in vms] == ["vm-b"]
+
+
+def test_failed_request_stops_the_stream(home):
+    gcloud = FakeBootingMIG([[("vm-a", "STAGING")]], states=["CREATING", "FAILED"])
+    with pytest.raises(Exception, match="failed"):
+        list(gcloud.iter_ready_vms("mig", "zone", "r", expected_count=1, initial_instance_names=set(), poll_interval=0))
+
+
+def test_each_vm_is_tracked_before_the_next_is_up(home, monkeypatch):
+    monkeypatch.setattr("migs.gcloud.time.sleep", lambda seconds: None)
+    gcloud = FakeBootingMIG([
+        [("train1", "RUNNING"), ("train2", "STAGING")],
+        [("train1", "RUNNING"), ("train2", "RUNNING")],
+    ])
+    gcloud.create_resize_request = lambda mig_name, zone, count, run_duration=None, instance_names=None, force_mode=None: ("migs-resize-100", True)
+    gcloud.project_id = lambda: None
+    client = Client(gcloud=gcloud)
+    request = client.request_vms("mig", count=2, name="train", zone="zone", journal=False)
+    gcloud.listed = 0
+
+    vms = client.iter_ready(request)
+    assert next(vms).display_name == "train1"
+    assert [vm["display_name"] for vm in client.storage.list_vms()] == ["train1"]
+    assert next(vms).display_name == "train2"
+    assert sorted(vm["display_name"] for vm in client.storage.list_vms()) == ["train1", "train2"]
@@ -0,0 +1,56 @@
+from migs.client import Client
+from migs.gcloud import GCloudWrapper, InstanceSnapshot
+
+
+def instance(name, mig_name=None, zone="zone-1", project="proj-a", status="RUNNING"):
+    return {"name": name, "zone": zone, "project": project, "external_ip": None, "internal_ip": "10.0.0.2", "username": "me", "status": status, "mig_name": mig_name}
+
+
+def test_snapshot_reads_the_managing_mig_from_metadata(home, monkeypatch):
+    listing = [
+        {
+            "name": "train-1", "zone": "https://www.googleapis.com/compute/v1/projects/p/zones/zone-1", "status": "RUNNING",
+            "networkInterfaces": [{"networkIP": "10.0.0.2", "accessConfigs": [{"natIP": "203.0.113.7"}]}],
+            "metadata": {"items": [{"key": "created-by", "value": "projects/123/zones/zone-1/instanceGroupManagers/train"}]},
+        },
+        {"name": "standalone", "zone": "zone-1", "status": "TERMINATED", "networkInterfaces": [{"networkIP": "10.0.0.3"}]},
+    ]
+    gcloud = GCloudWrapper("proj-a")
+    monkeypatch.setattr(gcloud, "_run_command", lambda cmd, **kwargs: listing)
+    monkeypatch.setattr(gcloud, "get_ssh_username", lambda: "me")
+
+    snapshot = gcloud.snapshot_instances()
+    train = snapshot.get("train-1", "zone-1")
+    assert train["mig_name"] == "train" and train["external_ip"] == "203.0.113.7" and train["internal_ip"] == "10.0.0.2"
+    assert snapshot.get("standalone", "zone-1")["mig_name"] is None
+    assert [vm["name"] for vm in snapshot.managed()] == ["train-1"]
+    assert snapshot.in_mig("train", "zone-1") == [train] and snapshot.in_mig("train", "zone-2") == []
+
+
+def test_sync_reconciles_from_one_snapshot_per_project(home, monkeypatch):
+    snapshots = {
+        "proj-a": InstanceSnapshot([instance("a1", "mig"), instance("a-untracked", "mig"), instance("a-pooled", "mig"), instance("a-standalone")]),
+        "proj-b": None,
+    }
+    listed = []
+
+    def snapshot_instances(self):
+        listed.append(self.project)
+        return snapshots[self.project]
+
+    monkeypatch.setattr(GCloudWrapper, "snapshot_instances", snapshot_instances)
+    monkeypatch.setattr(GCloudWrapper, "get_ssh_username", lambda self: "me")
+    client = Client()
+    client.storage.save_vm("a1", "mig", "zone-1", project="proj-a")
+    client.storage.save_vm("a-gone", "mig", "zone-1", project="proj-a")
+    client.storage.save_vm("b1", "mig", "zone-1", project="proj-b")
+    client.storage.add_pooled_vm("a-pooled", "mig", "zone-1", "proj-a", None, "me")
+
+    result = client.sync(["proj-a"], discover=True)
+    assert sorted(listed) == ["proj-a", "proj-b"]
+    assert [vm.instance_name for vm in result.updated] == ["a1"] and result.updated[0].status == "RUNNING"
+    assert [vm.instance_name for vm in result.removed] == ["a-gone"]
+    # A project that couldn't be listed leaves its VMs alone
+    assert [vm.instance_name for vm in result.skipped] == ["b1"] and result.failed_projects == ["proj-b"]
+    assert [vm.instance_name for vm in result.untracked] == ["a-untracked"]
+    assert sorted(vm.instance_name for vm in client.vms()) == ["a1", "b1"]
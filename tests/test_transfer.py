@@ -0,0 +1,82 @@
+import hashlib
+import subprocess
+
+import pytest
+
+from migs import transfer
+from migs.gcloud import GCloudWrapper
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(transfer, "CHUNK_SIZE", 10)
+
+
+def test_chunks_cover_the_file(small_chunks):
+    assert transfer.chunks(25) == [(0, 10), (10, 10), (20, 5)]
+    assert transfer.chunks(20) == [(0, 10), (10, 10)]
+
+
+def test_chunks_empty_file(small_chunks):
+    assert transfer.chunks(0) == []
+
+
+def test_range_digest(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(b"0123456789")
+    assert transfer.range_digest(str(path), 2, 5) == hashlib.sha256(b"23456").hexdigest()
+    # A range past the end stops at the end of the file
+    assert transfer.range_digest(str(path), 8, 5) == hashlib.sha256(b"89").hexdigest()
+
+
+def test_parse_digest():
+    first, last = "a" * 64, "b" * 64
+    assert transfer.parse_digest(f"{first}  -\n{last}  /tmp/file\n") == last
+    assert transfer.parse_digest("sha256sum: no such file") is None
+    assert transfer.parse_digest(None) is None
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/data/file", "/data/file"),
+    ("/data/my file", "'/data/my file'"),
+    ("~", '"$HOME"'),
+    ("~/data", '"$HOME"/data'),
+    ("data/it's", '"$HOME"/\'data/it\'"\'"\'s\''),
+])
+def test_remote_path_expr(path, expected):
+    assert transfer.remote_path_expr(path) == expected
+
+
+def test_range_pipe_carries_exactly_the_range(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(bytes(range(256)) * 8192)
+    length = (1 << 20) + 7
+    with transfer.range_pipe(str(path), 1000, length) as chunk:
+        assert chunk.read() == path.read_bytes()[1000:1000 + length]
+
+
+def test_range_pipe_survives_a_reader_that_stops_early(tmp_path):
+    path = tmp_path / "data"
+    path.write_bytes(bytes(4 << 20))
+    with transfer.range_pipe(str(path), 0, 4 << 20) as chunk:
+        assert chunk.read(10) == bytes(10)
+
+
+def test_parallel_upload_sends_each_chunk_once(home, tmp_path, small_chunks):
+    path = tmp_path / "data"
+    path.write_bytes(bytes(range(35)))
+    received = []
+
+    class FakeVM(GCloudWrapper):
+        def _remote(self, instance_name, zone, command, stdin=None, **kwargs):
+            if stdin is not None:
+                received.append(stdin.read())
+                output = f"{hashlib.sha256(received[-1]).hexdigest()}  -\n"
+            elif "truncate" in command:
+                output = "/home/me/data\n"
+            else:
+                output = f"{hashlib.sha256(path.read_bytes()).hexdigest()}  /home/me/data\n"
+            return subprocess.CompletedProcess(command, 0, output, "")
+
+    assert FakeVM().parallel_upload(str(path), "vm", "zone", streams=2)
+    assert sorted(received) == sorted([bytes(range(0, 10)), bytes(range(10, 20)), bytes(range(20, 30)), bytes(range(30, 35))])
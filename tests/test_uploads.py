@@ -0,0 +1,70 @@
+import shutil
+import subprocess
+
+import pytest
+
+from migs.gcloud import STALE_UPLOAD_EXIT, GCloudWrapper
+from migs.storage import UploadCache
+
+
+class FakeSSH(GCloudWrapper):
+    """Records every gcloud command; ssh exits with the queued return codes"""
+
+    def __init__(self, ssh_exits=()):
+        super().__init__()
+        self.commands = []
+        self.ssh_exits = list(ssh_exits)
+
+    def _exec(self, cmd, category="read", capture=True, timeout=None, stdin=None, stdout=None):
+        self.commands.append(cmd)
+        returncode = self.ssh_exits.pop(0) if cmd[2] == "ssh" and self.ssh_exits else 0
+        return subprocess.CompletedProcess(cmd, returncode, "", "")
+
+    def copies(self):
+        return [cmd for cmd in self.commands if cmd[2] == "scp"]
+
+
+@pytest.fixture
+def env_file(tmp_path):
+    path = tmp_path / ".env"
+    path.write_text("TOKEN=x\n")
+    return str(path)
+
+
+def test_unchanged_file_is_pushed_once(home, env_file):
+    gcloud = FakeSSH()
+    assert gcloud._push_file(env_file, "vm", "zone", "/tmp/.env") == (gcloud.upload_cache.file_digest(env_file), False)
+    assert gcloud._push_file(env_file, "vm", "zone", "/tmp/.env")[1] is True
+    assert len(gcloud.copies()) == 1
+
+    gcloud.upload_cache.forget(["vm"])
+    assert gcloud._push_file(env_file, "vm", "zone", "/tmp/.env")[1] is False
+
+
+def test_ssh_repushes_a_stale_env_file(home, env_file):
+    gcloud = FakeSSH(ssh_exits=[0, STALE_UPLOAD_EXIT, 0])
+    gcloud.ssh_to_vm("vm", "zone", env_file=env_file)
+    gcloud.ssh_to_vm("vm", "zone", env_file=env_file)
+    # First session pushes, second skips, finds the copy gone and pushes again
+    assert len(gcloud.copies()) == 2
+    assert [cmd[2] for cmd in gcloud.commands] == ["scp", "ssh", "ssh", "scp", "ssh"]
+
+
+def test_ssh_does_not_rerun_a_user_command_that_exits_75(home, env_file):
+    gcloud = FakeSSH(ssh_exits=[0, STALE_UPLOAD_EXIT])
+    gcloud.ssh_to_vm("vm", "zone", env_file=env_file)
+    gcloud.ssh_to_vm("vm", "zone", extra_args=["./train.sh"], env_file=env_file)
+    assert [cmd[2] for cmd in gcloud.commands] == ["scp", "ssh", "ssh"]
+
+
+@pytest.mark.skipif(not shutil.which("sha256sum"), reason="needs sha256sum")
+def test_verify_uploads_handles_odd_paths(tmp_path):
+    path = tmp_path / "it's 100%.env"
+    path.write_text("TOKEN=x\n")
+    digest = UploadCache.file_digest(str(path))
+
+    intact = subprocess.run(["sh", "-c", GCloudWrapper._verify_uploads({str(path): digest}) + "echo ok"], capture_output=True, text=True)
+    assert intact.returncode == 0 and intact.stdout == "ok\n"
+
+    stale = subprocess.run(["sh", "-c", GCloudWrapper._verify_uploads({str(path): "0" * 64}) + "echo ok"], capture_output=True, text=True)
+    assert stale.returncode == STALE_UPLOAD_EXIT and stale.stdout == ""